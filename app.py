@@ -1,20 +1,36 @@
-import os
-import datetime as dt
 from dataclasses import dataclass
-from functools import lru_cache
-from typing import Dict, Optional, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
-
-# =========================
-# 0) CACHE / VERSIONING
-# =========================
-CACHE_VERSION = "2026-01-05.dashboard.v6-final-fixes"
-CACHE_TTL_SECONDS = 3600  # 1 hour
+from engine import (
+    CACHE_VERSION,
+    FILE_PATH,
+    FUNNEL_STAGE_ORDER,
+    MONTH_SERIES,
+    Bundle,
+    CourseSearchIndex,
+    SqlCourseSearch,
+    budget_cache,
+    bundle_store,
+    compute_course_funnels,
+    compute_funnel,
+    compute_retention,
+    get_metric_value,
+    has_cols,
+    is_valid_df,
+    key_insights,
+    percent_delta,
+    period_to_month_end_ts,
+    previous_period_window,
+    to_num_series,
+    window_kpis,
+    source_stamp,
+    workbook_watcher,
+)
 
 
 # =========================
@@ -141,7 +157,9 @@ div[data-testid="stMetricValue"] { color: var(--accent) !important; }
 # =========================
 # 2) CONSTANTS
 # =========================
-FILE_PATH = "ManageEngine User Academy Stats - Single Source of Truth.xlsx"
+# "lazy": a view switcher that builds only the selected view. "tabs": st.tabs, which runs
+# every tab body (and ships every figure) on each rerun.
+NAV_MODE = "lazy"
 
 ACCENT = "#ff6600"
 BLUE = "#3B82F6"
@@ -154,16 +172,15 @@ MID_GRAY_2 = "#999"
 DARK_LAYOUT = dict(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)")
 CHART_CONFIG = {"scrollZoom": True, "displayModeBar": True}
 
-SHORTNAME_MAX_LEN = 35
 DEFAULT_RANGE_MONTHS = 12
 DEFAULT_PAGE_SIZE = 50
 
-FUNNEL_STAGE_ORDER = ["Enrolled", "Started", "In Progress", "Completed"]
-
 TOOLTIPS = {
     "mau": "Monthly Active Users: unique users who engaged with the academy in a given month.",
     "activation": "D30 Activation: % of new signups who hit an activation event within 30 days.",
+    "retention": "Cohort retention: % of each signup cohort active in each later month (M0 = the signup month). Built from activity events.",
     "funnel": "Drop-off Funnel: shows how users progress through key stages (and where they drop).",
+    "course_funnel": "Per-course funnel: users reaching each stage (Enrolled → Started → In Progress → Completed), from the course drop-off sheet. Courses are ranked by their worst stage-to-stage drop.",
     "enrollment_trend": "Enrollments over time (monthly).",
     "signup_trend": "Unique sign-ups over time (monthly).",
     "geo": "Global distribution of users by country.",
@@ -174,21 +191,6 @@ TOOLTIPS = {
     "compare": "Compare Mode overlays the previous period (same length) to show directionality and magnitude.",
 }
 
-SHEET_MAP = {
-    "Monthly_Enroll": "Monthly Enrollments",
-    "Monthly_Unique": "Monthly User Sign-Ups",
-    "Country": "Country Breakdown",
-    "Course": "Course Sign-Up Sheet",
-    "Completion": "Completion Percentage",
-    "MAU": "MAU",
-    "Activation": "Activation Rate (D30)",
-    "DropOff_Split": "Drop-off Stage Split",
-    "Course_DropOff": "Course Drop-off (All)",
-    "User_Engagement": "User and Course Engagement",
-    "Badges_Issued": "Badges Issued",
-    "User_Segmentation": "User Segmentation",
-}
-
 PRESETS = {
     "Default": dict(months_back=12, segment="All", compare=False, top_countries=10, top_courses=15),
     "Executive Summary": dict(months_back=6, segment="All", compare=True, top_countries=10, top_courses=10),
@@ -201,65 +203,10 @@ PRESETS = {
 # =========================
 # 3) UTILS
 # =========================
-def is_valid_df(df: Optional[pd.DataFrame]) -> bool:
-    return df is not None and isinstance(df, pd.DataFrame) and not df.empty
-
-def has_cols(df: pd.DataFrame, cols: List[str]) -> bool:
-    return all(c in df.columns for c in cols)
-
-def to_num_series(s: pd.Series, default: float = 0.0) -> pd.Series:
-    out = pd.to_numeric(s, errors="coerce")
-    return out.fillna(default)
-
-def to_int_safe(x, default: int = 0) -> int:
-    try:
-        if pd.isna(x):
-            return default
-        return int(float(x))
-    except (ValueError, TypeError, OverflowError):
-        return default
-
-def month_end_from_mmm_yyyy(series: pd.Series) -> pd.Series:
-    dt0 = pd.to_datetime(series, format="%b %Y", errors="coerce")
-    return dt0 + pd.offsets.MonthEnd(0)
-
-def build_shortname(course_series: pd.Series, max_len: int = SHORTNAME_MAX_LEN) -> pd.Series:
-    s = course_series.astype(str).fillna("")
-    return s.where(s.str.len().le(max_len), s.str.slice(0, max_len) + "...")
-
-def file_mtime_seconds(path: str) -> int:
-    try:
-        return int(os.path.getmtime(path))
-    except OSError:
-        return 0
-
-def mtime_rounded_minute(mtime_sec: int) -> int:
-    return (mtime_sec // 60) * 60 if mtime_sec > 0 else 0
-
 def info_expander(title: str, body: str):
     with st.expander(f"ⓘ {title}", expanded=False):
         st.write(body)
 
-def percent_delta(curr: float, prev: float) -> str:
-    if prev == 0:
-        return "—"
-    return f"{((curr - prev) / prev) * 100:.1f}%"
-
-@lru_cache(maxsize=2048)
-def period_to_month_end_ts(p: pd.Period) -> pd.Timestamp:
-    return (p.to_timestamp(how="end")).normalize() + pd.offsets.MonthEnd(0)
-
-def get_metric_value(df: Optional[pd.DataFrame], metric_name, col_name="Metric", value_col="Count") -> int:
-    if not is_valid_df(df) or col_name not in df.columns or value_col not in df.columns:
-        return 0
-    try:
-        row = df.loc[df[col_name].eq(metric_name), value_col]
-        if row.empty:
-            return 0
-        return to_int_safe(row.iloc[0], 0)
-    except (KeyError, IndexError, ValueError, TypeError):
-        return 0
-
 
 # =========================
 # 4) AUTH
@@ -284,225 +231,8 @@ def check_password() -> bool:
 
 
 # =========================
-# 5) DATA MODEL
-# =========================
-@dataclass
-class Bundle:
-    data: Dict[str, Optional[pd.DataFrame]]
-    month_periods: List[pd.Period]
-    updated_str: str
-
-    total_enrolls: int
-    total_unique: int
-    total_badges: int
-    current_mau: int
-
-
-# =========================
-# 6) LOAD RAW (CHEAP + CACHED)
-# =========================
-@st.cache_data(show_spinner=False, ttl=CACHE_TTL_SECONDS)
-def load_raw(file_path: str, mtime_key_minute: int, cache_version: str) -> Optional[Bundle]:
-    if not os.path.exists(file_path):
-        return None
-
-    xls = pd.ExcelFile(file_path)
-    sheet_names = set(xls.sheet_names)
-
-    data: Dict[str, Optional[pd.DataFrame]] = {}
-    missing = []
-    for key, sheet_name in SHEET_MAP.items():
-        if sheet_name in sheet_names:
-            data[key] = pd.read_excel(xls, sheet_name=sheet_name)
-        else:
-            data[key] = None
-            missing.append(sheet_name)
-
-    if missing:
-        st.warning("Missing sheets in workbook: " + ", ".join(missing))
-
-    if is_valid_df(data.get("Monthly_Enroll")):
-        df = data["Monthly_Enroll"]
-        df.rename(columns={"Number of enrollments": "Enrollments"}, inplace=True)
-        if "Month" in df.columns:
-            df["Month_dt"] = month_end_from_mmm_yyyy(df["Month"])
-
-    if is_valid_df(data.get("Monthly_Unique")):
-        df = data["Monthly_Unique"]
-        df.rename(columns={"Number of Sign Ups": "Unique User Signups"}, inplace=True)
-        if "Month" in df.columns:
-            df["Month_dt"] = month_end_from_mmm_yyyy(df["Month"])
-
-    if is_valid_df(data.get("MAU")):
-        df = data["MAU"]
-        if "Month" in df.columns:
-            df["Month_dt"] = month_end_from_mmm_yyyy(df["Month"])
-
-    if is_valid_df(data.get("Activation")):
-        df = data["Activation"]
-        if "Cohort" in df.columns:
-            df["Cohort_dt"] = month_end_from_mmm_yyyy(df["Cohort"])
-
-    if is_valid_df(data.get("Course")):
-        df = data["Course"]
-        df.rename(columns={"Course Name": "Course", "Course Sign-Ups": "Sign Ups"}, inplace=True)
-        if "Course" in df.columns:
-            df["ShortName"] = build_shortname(df["Course"])
-
-    if is_valid_df(data.get("Completion")):
-        df = data["Completion"]
-        df.rename(columns={"Avg %": "Avg Completion %"}, inplace=True)
-        if "Avg Completion %" in df.columns:
-            df["Avg Completion %"] = to_num_series(df["Avg Completion %"], 0.0)
-
-    month_periods: List[pd.Period] = []
-    for key, col in [
-        ("Monthly_Unique", "Month_dt"),
-        ("Monthly_Enroll", "Month_dt"),
-        ("MAU", "Month_dt"),
-        ("Activation", "Cohort_dt"),
-    ]:
-        df = data.get(key)
-        if is_valid_df(df) and col in df.columns:
-            s = df[col].dropna()
-            if not s.empty:
-                month_periods = s.dt.to_period("M").sort_values().unique().tolist()
-                break
-
-    total_enrolls = 0
-    if is_valid_df(data.get("Course")) and "Sign Ups" in data["Course"].columns:
-        total_enrolls = to_int_safe(to_num_series(data["Course"]["Sign Ups"], 0).sum(), 0)
-
-    total_unique = get_metric_value(data.get("User_Segmentation"), "Total Users")
-    if total_unique == 0 and is_valid_df(data.get("Monthly_Unique")) and "Unique User Signups" in data["Monthly_Unique"].columns:
-        total_unique = to_int_safe(to_num_series(data["Monthly_Unique"]["Unique User Signups"], 0).sum(), 0)
-
-    current_mau = 0
-    if is_valid_df(data.get("MAU")) and "MAU" in data["MAU"].columns:
-        current_mau = to_int_safe(data["MAU"].iloc[-1]["MAU"], 0)
-
-    total_badges = 0
-    df_b = data.get("Badges_Issued")
-    if is_valid_df(df_b):
-        if has_cols(df_b, ["Metric", "Count"]):
-            total_badges = get_metric_value(df_b, "Total Sent")
-        else:
-            try:
-                c0, c1 = df_b.columns[0], df_b.columns[1]
-                match = df_b.loc[df_b[c0].astype(str).eq("Total Sent"), c1]
-                if not match.empty:
-                    total_badges = to_int_safe(match.iloc[0], 0)
-            except (IndexError, KeyError, ValueError, TypeError):
-                total_badges = 0
-
-    updated_str = (
-        dt.datetime.fromtimestamp(mtime_key_minute).strftime("%Y-%m-%d %H:%M")
-        if mtime_key_minute
-        else dt.datetime.now().strftime("%Y-%m-%d %H:%M")
-    )
-
-    return Bundle(
-        data=data,
-        month_periods=month_periods,
-        updated_str=updated_str,
-        total_enrolls=total_enrolls,
-        total_unique=total_unique,
-        total_badges=total_badges,
-        current_mau=current_mau,
-    )
-
-
-# =========================
-# 7) LAZY COMPUTES (TAB-SCOPED CACHE)
+# 5) CHART BUILDERS
 # =========================
-@st.cache_data(show_spinner=False, ttl=CACHE_TTL_SECONDS)
-def compute_geo_top(df_country: pd.DataFrame, top_n: int, cache_version: str) -> Optional[pd.DataFrame]:
-    if not is_valid_df(df_country) or not has_cols(df_country, ["Country", "Total Course Signups"]):
-        return None
-    out = df_country[["Country", "Total Course Signups"]].copy()
-    out["Total Course Signups"] = to_num_series(out["Total Course Signups"], 0)
-    return out.nlargest(top_n, "Total Course Signups")
-
-@st.cache_data(show_spinner=False, ttl=CACHE_TTL_SECONDS)
-def compute_course_top(df_course: pd.DataFrame, top_n: int, cache_version: str) -> Optional[pd.DataFrame]:
-    if not is_valid_df(df_course) or not has_cols(df_course, ["Course", "ShortName", "Sign Ups"]):
-        return None
-    out = df_course[["Course", "ShortName", "Sign Ups"]].copy()
-    out["Sign Ups"] = to_num_series(out["Sign Ups"], 0)
-    return out.nlargest(top_n, "Sign Ups")
-
-@st.cache_data(show_spinner=False, ttl=CACHE_TTL_SECONDS)
-def compute_course_perf(df_course: pd.DataFrame, df_completion: pd.DataFrame, cache_version: str) -> Optional[pd.DataFrame]:
-    if not is_valid_df(df_course) or not is_valid_df(df_completion):
-        return None
-    if "Course" not in df_course.columns or "Course" not in df_completion.columns:
-        return None
-    left_cols = [c for c in ["Course", "ShortName", "Sign Ups"] if c in df_course.columns]
-    right_cols = ["Course"]
-    if "Avg Completion %" in df_completion.columns:
-        right_cols.append("Avg Completion %")
-    perf = pd.merge(df_course[left_cols], df_completion[right_cols], on="Course", how="left")
-    if "Sign Ups" in perf.columns:
-        perf["Sign Ups"] = to_num_series(perf["Sign Ups"], 0)
-    if "Avg Completion %" in perf.columns:
-        perf["Avg Completion %"] = to_num_series(perf["Avg Completion %"], 0.0)
-    return perf
-
-@st.cache_data(show_spinner=False, ttl=CACHE_TTL_SECONDS)
-def compute_funnel(df_split: pd.DataFrame, stage_order: Tuple[str, ...], cache_version: str) -> Tuple[Optional[pd.DataFrame], Optional[str], Optional[pd.DataFrame]]:
-    if not is_valid_df(df_split) or not has_cols(df_split, ["Stage", "All Count"]):
-        return None, None, None
-
-    df_f = df_split[["Stage", "All Count"]].copy()
-    df_f["All Count"] = to_num_series(df_f["All Count"], 0)
-
-    stage_lower = df_f["Stage"].astype(str).str.lower()
-    stage_map = {s.lower(): i for i, s in enumerate(stage_order)}
-    warning = None
-
-    if stage_lower.isin(stage_map.keys()).all():
-        df_f["_ord"] = stage_lower.map(stage_map)
-        df_f.sort_values("_ord", inplace=True)
-        df_f.drop(columns=["_ord"], inplace=True)
-    else:
-        warning = "Funnel stages don't fully match configured order; using sheet order."
-
-    base = to_int_safe(df_f["All Count"].iloc[0], 0)
-    if base <= 0:
-        base = to_int_safe(df_f["All Count"].max(), 0)
-
-    if base > 0:
-        df_f["pct_of_base"] = (df_f["All Count"] / base * 100).round(1)
-    else:
-        df_f["pct_of_base"] = 0.0
-
-    counts_str = df_f["All Count"].round(0).astype(int).map(str)
-    pct_str = df_f["pct_of_base"].map(lambda v: f"{v:g}")
-    df_f["text_label"] = counts_str + " (" + pct_str + "%)"
-
-    drops = []
-    for i in range(1, len(df_f)):
-        prev_stage = str(df_f.iloc[i - 1]["Stage"])
-        curr_stage = str(df_f.iloc[i]["Stage"])
-        prev_val = float(df_f.iloc[i - 1]["All Count"])
-        curr_val = float(df_f.iloc[i]["All Count"])
-        drop_abs = prev_val - curr_val
-        drop_pct = (drop_abs / prev_val * 100) if prev_val > 0 else 0.0
-        drops.append({"From → To": f"{prev_stage} → {curr_stage}", "Drop (users)": int(round(drop_abs)), "Drop (%)": round(drop_pct, 1)})
-    df_drop = pd.DataFrame(drops) if drops else None
-
-    return df_f, warning, df_drop
-
-
-# =========================
-# 8) CHART BUILDERS
-# =========================
-def filter_range(df: pd.DataFrame, dt_col: str, start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> pd.DataFrame:
-    if not is_valid_df(df) or dt_col not in df.columns:
-        return df
-    m = df[dt_col].notna() & (df[dt_col] >= start_dt) & (df[dt_col] <= end_dt)
-    return df.loc[m].sort_values(dt_col)
-
 def create_line_compare_chart(
     df_cur: pd.DataFrame,
     x_col: str,
@@ -527,6 +257,18 @@ def create_line_compare_chart(
     )
     return fig
 
+def create_multi_line_chart(df: pd.DataFrame, x_col: str, series: List[Tuple[str, str]], height: int) -> go.Figure:
+    fig = go.Figure()
+    for y_col, color in series:
+        fig.add_trace(go.Scatter(x=df[x_col], y=df[y_col], mode="lines+markers", name=y_col, line=dict(color=color, width=3)))
+    fig.update_layout(
+        **DARK_LAYOUT,
+        height=height,
+        dragmode="pan",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="left", x=0),
+    )
+    return fig
+
 def create_sparkline(df: pd.DataFrame, x_col: str, y_col: str, color: str) -> go.Figure:
     """
     Revised sparkline: Taller (130px) and filled area to make it more visible.
@@ -560,32 +302,128 @@ def create_bar_chart(df: pd.DataFrame, x_col: str, y_col: str, color: str, text_
     )
     return fig
 
+def create_choropleth(df_geo: pd.DataFrame, height: int) -> go.Figure:
+    geo_map = df_geo.loc[df_geo["ISO3"].notna(), ["ISO3", "Country", "Total Course Signups"]]
+    fig = px.choropleth(
+        geo_map,
+        locations="ISO3",
+        locationmode="ISO-3",
+        hover_name="Country",
+        color="Total Course Signups",
+        color_continuous_scale=["#1e1e1e", ACCENT],
+    )
+    fig.update_layout(**DARK_LAYOUT, geo=dict(bgcolor="rgba(0,0,0,0)"), height=height)
+    return fig
+
+def create_funnel_chart(funnel_df: pd.DataFrame, height: int, count_col: str = "All Count") -> go.Figure:
+    fig = go.Figure(
+        go.Bar(
+            x=funnel_df[count_col],
+            y=funnel_df["Stage"],
+            orientation="h",
+            text=funnel_df["text_label"],
+            textposition="auto",
+            marker={"color": [DARK, MID_GRAY_1, MID_GRAY_2, ACCENT]},
+        )
+    )
+    fig.update_layout(**DARK_LAYOUT, height=height, yaxis=dict(autorange="reversed"))
+    return fig
+
+def create_retention_heatmap(matrix: pd.DataFrame, height: int) -> go.Figure:
+    month_cols = [c for c in matrix.columns if c.startswith("M") and c[1:].isdigit()]
+    z = matrix[month_cols].to_numpy() * 100
+    fig = go.Figure(
+        go.Heatmap(
+            z=z,
+            x=month_cols,
+            y=matrix["Cohort"],
+            colorscale=[[0, DARK], [1, ACCENT]],
+            zmin=0,
+            zmax=100,
+            text=[[f"{v:.0f}%" if v == v else "" for v in row] for row in z],
+            texttemplate="%{text}",
+            customdata=matrix[["Cohort Size"]].to_numpy().repeat(len(month_cols), axis=1),
+            hovertemplate="%{y} • %{x}: %{z:.1f}% of %{customdata:,} users<extra></extra>",
+            colorbar=dict(ticksuffix="%"),
+        )
+    )
+    fig.update_layout(**DARK_LAYOUT, height=height, yaxis=dict(autorange="reversed"), xaxis=dict(title="Months since signup"))
+    return fig
+
+def create_donut_chart(labels: List[str], values: List[int], colors: List[str], height: int) -> go.Figure:
+    fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=0.5, marker=dict(colors=colors))])
+    fig.update_layout(**DARK_LAYOUT, height=height)
+    return fig
+
+def create_column_chart(df: pd.DataFrame, x_col: str, y_col: str, height: int) -> go.Figure:
+    fig = px.bar(df, x=x_col, y=y_col, color=x_col)
+    fig.update_layout(**DARK_LAYOUT, showlegend=False, height=height)
+    return fig
+
+
+# =========================
+# 5b) FIGURE CACHE
+# =========================
+# Figure keys carry the sheet version token plus every view parameter the figure depends on
+# (range, segment column, compare flag, top-N, height). A hit skips the builder and plotly's
+# validation; st.plotly_chart only serializes the stored figure.
+def cached_figure(key: Tuple, build: Callable[[], go.Figure]) -> go.Figure:
+    return budget_cache().get_or_compute("figures", key, build)
+
 
 # =========================
-# 9) COMPARE MODE HELPERS
+# 6) VIEW PARAMETERS
 # =========================
-def previous_period_window(periods: List[pd.Period], start_p: pd.Period, end_p: pd.Period) -> Tuple[Optional[pd.Period], Optional[pd.Period]]:
-    try:
-        i0 = periods.index(start_p)
-        i1 = periods.index(end_p)
-    except ValueError:
-        return None, None
-    if i1 < i0:
-        i0, i1 = i1, i0
-    length = (i1 - i0) + 1
-    prev_end_idx = i0 - 1
-    prev_start_idx = prev_end_idx - (length - 1)
-    if prev_start_idx < 0:
-        return None, None
-    return periods[prev_start_idx], periods[prev_end_idx]
+@dataclass(frozen=True)
+class ViewParams:
+    """The applied sidebar state each tab fragment renders from."""
+    segment: str
+    compare_mode: bool
+    top_countries: int
+    top_courses: int
+    chart_height: int
+    start_p: pd.Period
+    end_p: pd.Period
+    prev_start_p: Optional[pd.Period] = None
+    prev_end_p: Optional[pd.Period] = None
+
+    @property
+    def range_key(self) -> Tuple:
+        """Everything a range/compare line chart depends on besides its data version."""
+        return (self.start_p, self.end_p, self.prev_start_p, self.prev_end_p, self.compare_mode, self.chart_height)
+
+    @property
+    def start_dt(self) -> pd.Timestamp:
+        return period_to_month_end_ts(self.start_p)
+
+    @property
+    def end_dt(self) -> pd.Timestamp:
+        return period_to_month_end_ts(self.end_p)
+
+    @property
+    def prev_start_dt(self) -> Optional[pd.Timestamp]:
+        return period_to_month_end_ts(self.prev_start_p) if self.prev_start_p else None
+
+    @property
+    def prev_end_dt(self) -> Optional[pd.Timestamp]:
+        return period_to_month_end_ts(self.prev_end_p) if self.prev_end_p else None
 
 
 # =========================
-# 10) MAIN APP
+# 7) MAIN APP
 # =========================
 if not check_password():
     st.stop()
 
+store = bundle_store()
+workbook_watcher()
+bundle = store.get(FILE_PATH, source_stamp(FILE_PATH), CACHE_VERSION)
+if not bundle:
+    st.error("Could not load data. Ensure the Excel file exists and is readable.")
+    st.stop()
+
+all_periods = bundle.month_periods
+
 with st.sidebar:
     st.markdown("### Dashboard Controls")
 
@@ -600,191 +438,158 @@ with st.sidebar:
         st.session_state["top_courses"] = cfg["top_courses"]
         st.session_state["preset_applied"] = preset
 
-    months_back = st.slider("Default range (months)", 3, 24, int(st.session_state.get("months_back", 12)), 1)
-    st.session_state["months_back"] = months_back
+    # Controls are batched: edits stay client-side until "Apply", so a multi-control
+    # adjustment costs one rerun instead of one per widget.
+    with st.form("dashboard_controls", border=False):
+        months_back = st.slider("Default range (months)", 3, 24, int(st.session_state.get("months_back", 12)), 1)
+
+        segment = st.selectbox(
+            "Segment",
+            ["All", "Business", "Generic", "Invalid"],
+            index=["All", "Business", "Generic", "Invalid"].index(st.session_state.get("segment", "All")),
+        )
+
+        compare_mode = st.toggle("Compare mode (previous period)", value=bool(st.session_state.get("compare_mode", False)))
+
+        st.markdown("---")
+        top_countries = st.number_input("Top countries", min_value=5, max_value=50, value=int(st.session_state.get("top_countries", 10)), step=1)
+        top_courses = st.number_input("Top courses", min_value=5, max_value=50, value=int(st.session_state.get("top_courses", 15)), step=1)
+
+        chart_height = st.slider("Chart height", 280, 520, 380, 10)
+
+        if all_periods:
+            if "selected_range" not in st.session_state:
+                default_end = all_periods[-1]
+                default_start = all_periods[max(0, len(all_periods) - int(months_back))]
+                st.session_state["selected_range"] = (default_start, default_end)
+
+            st.markdown("---")
+            st.markdown("### Date Range (global)")
+            selected_range = st.select_slider(
+                "Select range",
+                options=all_periods,
+                value=st.session_state["selected_range"],
+                format_func=lambda p: p.strftime("%b %Y"),
+            )
+            st.session_state["selected_range"] = selected_range
 
-    segment = st.selectbox(
-        "Segment",
-        ["All", "Business", "Generic", "Invalid"],
-        index=["All", "Business", "Generic", "Invalid"].index(st.session_state.get("segment", "All")),
-    )
-    st.session_state["segment"] = segment
+        st.form_submit_button("Apply", type="primary", use_container_width=True)
 
-    compare_mode = st.toggle("Compare mode (previous period)", value=bool(st.session_state.get("compare_mode", False)))
+    st.session_state["months_back"] = months_back
+    st.session_state["segment"] = segment
     st.session_state["compare_mode"] = compare_mode
-
-    st.markdown("---")
-    top_countries = st.number_input("Top countries", min_value=5, max_value=50, value=int(st.session_state.get("top_countries", 10)), step=1)
-    top_courses = st.number_input("Top courses", min_value=5, max_value=50, value=int(st.session_state.get("top_courses", 15)), step=1)
     st.session_state["top_countries"] = int(top_countries)
     st.session_state["top_courses"] = int(top_courses)
 
-    chart_height = st.slider("Chart height", 280, 520, 380, 10)
-
-    course_search = st.text_input("Course search (global)", value=st.session_state.get("course_search", ""), placeholder="Filter course tables…")
-    st.session_state["course_search"] = course_search
-
-    if st.button("Refresh dashboard cache"):
-        load_raw.clear()
-        compute_geo_top.clear()
-        compute_course_top.clear()
-        compute_course_perf.clear()
-        compute_funnel.clear()
+    # Builds the next data version off the request path; other viewers keep the current
+    # version until the swap, so nobody is thrown back to a cold parse.
+    if st.button("Reload data", disabled=store.refreshing):
+        store.refresh(FILE_PATH, source_stamp(FILE_PATH), CACHE_VERSION)
         st.rerun()
 
-mtime_key_minute = mtime_rounded_minute(file_mtime_seconds(FILE_PATH))
-bundle = load_raw(FILE_PATH, mtime_key_minute, CACHE_VERSION)
-if not bundle:
-    st.error("Could not load data. Ensure the Excel file exists and is readable.")
-    st.stop()
-
-data = bundle.data
+if bundle.missing_sheets:
+    st.warning("Missing sheets in workbook: " + ", ".join(bundle.missing_sheets))
+if store.last_error:
+    st.warning(f"Background data refresh failed; showing the last good data. ({store.last_error})")
+if bundle.events_error:
+    st.warning(f"New event partitions could not be ingested; showing the data from before them. ({bundle.events_error})")
 
 st.title("ManageEngine User Academy Dashboard")
 st.markdown(
-    f"<div class='small-muted'>Data updated: <b>{bundle.updated_str}</b> • Preset: <b>{preset}</b> • Segment: <b>{segment}</b></div>",
+    f"<div class='small-muted'>Data updated: <b>{bundle.updated_str}</b> (v{bundle.version}) • Preset: <b>{preset}</b> • Segment: <b>{segment}</b>"
+    + (" • <i>refreshing in background…</i>" if store.refreshing else "")
+    + "</div>",
     unsafe_allow_html=True,
 )
 st.markdown("<div class='section-divider'></div>", unsafe_allow_html=True)
 
-tab_exec, tab_growth, tab_geo, tab_courses, tab_users = st.tabs(
-    ["Executive Summary", "Growth & Retention", "Geography", "Course Performance", "User Insights"]
-)
-
-all_periods = bundle.month_periods
 if not all_periods:
     st.warning("No month/cohort data found to build time filters.")
     st.stop()
 
-default_end = all_periods[-1]
-default_start = all_periods[max(0, len(all_periods) - int(months_back))]
-
-if "selected_range" not in st.session_state:
-    st.session_state["selected_range"] = (default_start, default_end)
-
-with st.sidebar:
-    st.markdown("---")
-    st.markdown("### Date Range (global)")
-    selected_range = st.select_slider(
-        "Select range",
-        options=all_periods,
-        value=st.session_state["selected_range"],
-        format_func=lambda p: p.strftime("%b %Y"),
-    )
-    st.session_state["selected_range"] = selected_range
-
 start_p, end_p = st.session_state["selected_range"]
-start_dt = period_to_month_end_ts(start_p)
-end_dt = period_to_month_end_ts(end_p)
-
-prev_start_p, prev_end_p = previous_period_window(all_periods, start_p, end_p) if compare_mode else (None, None)
-prev_start_dt = period_to_month_end_ts(prev_start_p) if prev_start_p else None
-prev_end_dt = period_to_month_end_ts(prev_end_p) if prev_end_p else None
+prev_start_p, prev_end_p = previous_period_window(all_periods, bundle.period_pos, start_p, end_p) if compare_mode else (None, None)
+view = ViewParams(
+    segment=segment,
+    compare_mode=bool(compare_mode),
+    top_countries=int(top_countries),
+    top_courses=int(top_courses),
+    chart_height=int(chart_height),
+    start_p=start_p,
+    end_p=end_p,
+    prev_start_p=prev_start_p,
+    prev_end_p=prev_end_p,
+)
 
 
 # =========================
 # EXEC SUMMARY
 # =========================
-with tab_exec:
+@st.fragment
+def render_exec(bundle: Bundle, view: ViewParams) -> None:
+    data = bundle.data
     st.markdown("<div class='section-title'>Executive Summary</div>", unsafe_allow_html=True)
     info_expander("How to read this", "KPI movement + sparklines + key insights for quick decisions.")
     info_expander("Compare mode", TOOLTIPS["compare"])
 
-    def sum_in_window(df: Optional[pd.DataFrame], dt_col: str, val_col: str, s_dt: pd.Timestamp, e_dt: pd.Timestamp) -> float:
-        if not is_valid_df(df) or dt_col not in df.columns or val_col not in df.columns:
-            return 0.0
-        dfw = filter_range(df, dt_col, s_dt, e_dt)
-        if not is_valid_df(dfw):
-            return 0.0
-        return float(to_num_series(dfw[val_col], 0).sum())
-
-    def last_in_window(df: Optional[pd.DataFrame], dt_col: str, val_col: str, s_dt: pd.Timestamp, e_dt: pd.Timestamp) -> float:
-        if not is_valid_df(df) or dt_col not in df.columns or val_col not in df.columns:
-            return 0.0
-        dfw = filter_range(df, dt_col, s_dt, e_dt)
-        if not is_valid_df(dfw):
-            return 0.0
-        return float(to_num_series(dfw[val_col], 0).iloc[-1])
-
-    cur_enroll_sum = sum_in_window(data.get("Monthly_Enroll"), "Month_dt", "Enrollments", start_dt, end_dt)
-    prev_enroll_sum = sum_in_window(data.get("Monthly_Enroll"), "Month_dt", "Enrollments", prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt) else 0.0
-
-    cur_signup_sum = sum_in_window(data.get("Monthly_Unique"), "Month_dt", "Unique User Signups", start_dt, end_dt)
-    prev_signup_sum = sum_in_window(data.get("Monthly_Unique"), "Month_dt", "Unique User Signups", prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt) else 0.0
-
-    mau_col = "Business MAU" if (segment == "Business" and is_valid_df(data.get("MAU")) and "Business MAU" in data["MAU"].columns) else "MAU"
-    cur_mau_last = last_in_window(data.get("MAU"), "Month_dt", mau_col, start_dt, end_dt)
-    prev_mau_last = last_in_window(data.get("MAU"), "Month_dt", mau_col, prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt) else 0.0
-
-    act_col = "Business Activation Rate %" if (segment == "Business" and is_valid_df(data.get("Activation")) and "Business Activation Rate %" in data["Activation"].columns) else "All Activation Rate %"
-    cur_act_last = last_in_window(data.get("Activation"), "Cohort_dt", act_col, start_dt, end_dt)
-    prev_act_last = last_in_window(data.get("Activation"), "Cohort_dt", act_col, prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt) else 0.0
+    # view.prev_* are None outside compare mode, which zeroes the prev_* KPIs.
+    kpis = window_kpis(bundle, view.segment, view.start_p, view.end_p, view.prev_start_p, view.prev_end_p)
+    cur_enroll_sum, prev_enroll_sum = kpis.enrollments, kpis.prev_enrollments
+    cur_signup_sum, prev_signup_sum = kpis.signups, kpis.prev_signups
+    mau_col, cur_mau_last, prev_mau_last = kpis.mau_col, kpis.mau, kpis.prev_mau
+    act_col, cur_act_last, prev_act_last = kpis.activation_col, kpis.activation, kpis.prev_activation
 
     kpi_cols = st.columns(4)
     with kpi_cols[0]:
-        st.metric("Enrollments (in range)", f"{int(round(cur_enroll_sum)):,}", delta=(percent_delta(cur_enroll_sum, prev_enroll_sum) if compare_mode and prev_enroll_sum else None))
+        st.metric("Enrollments (in range)", f"{int(round(cur_enroll_sum)):,}", delta=(percent_delta(cur_enroll_sum, prev_enroll_sum) if view.compare_mode and prev_enroll_sum else None))
     with kpi_cols[1]:
-        st.metric("Signups (in range)", f"{int(round(cur_signup_sum)):,}", delta=(percent_delta(cur_signup_sum, prev_signup_sum) if compare_mode and prev_signup_sum else None))
+        st.metric("Signups (in range)", f"{int(round(cur_signup_sum)):,}", delta=(percent_delta(cur_signup_sum, prev_signup_sum) if view.compare_mode and prev_signup_sum else None))
     with kpi_cols[2]:
-        st.metric(f"{mau_col} (latest)", f"{int(round(cur_mau_last)):,}", delta=(percent_delta(cur_mau_last, prev_mau_last) if compare_mode and prev_mau_last else None))
+        st.metric(f"{mau_col} (latest)", f"{int(round(cur_mau_last)):,}", delta=(percent_delta(cur_mau_last, prev_mau_last) if view.compare_mode and prev_mau_last else None))
     with kpi_cols[3]:
-        st.metric(f"{act_col} (latest)", f"{cur_act_last:.1f}%", delta=(f"{(cur_act_last - prev_act_last):+.1f} pts" if compare_mode and prev_act_last else None))
+        st.metric(f"{act_col} (latest)", f"{cur_act_last:.1f}%", delta=(f"{(cur_act_last - prev_act_last):+.1f} pts" if view.compare_mode and prev_act_last else None))
 
     spark_cols = st.columns(4)
 
-    def spark_from(df: Optional[pd.DataFrame], dt_col: str, x_label_col: str, val_col: str, color: str):
+    def spark_from(key: str, x_label_col: str, val_col: str, color: str):
+        df = data.get(key)
+        dt_col = MONTH_SERIES[key][0]
         if not is_valid_df(df) or dt_col not in df.columns or x_label_col not in df.columns or val_col not in df.columns:
             return None
-        d = filter_range(df, dt_col, start_dt, end_dt)
+        d = bundle.time_slice(key, view.start_dt, view.end_dt)
         if not is_valid_df(d):
             return None
-        return create_sparkline(d, x_label_col, val_col, color)
+        return cached_figure(
+            ("spark", key, bundle.sheet_version(key), val_col, view.start_p, view.end_p),
+            lambda: create_sparkline(d, x_label_col, val_col, color),
+        )
 
     with spark_cols[0]:
-        fig = spark_from(data.get("Monthly_Enroll"), "Month_dt", "Month", "Enrollments", ACCENT)
+        fig = spark_from("Monthly_Enroll", "Month", "Enrollments", ACCENT)
         if fig: st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
     with spark_cols[1]:
-        fig = spark_from(data.get("Monthly_Unique"), "Month_dt", "Month", "Unique User Signups", BLUE)
+        fig = spark_from("Monthly_Unique", "Month", "Unique User Signups", BLUE)
         if fig: st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
     with spark_cols[2]:
-        fig = spark_from(data.get("MAU"), "Month_dt", "Month", mau_col, LILAC)
+        fig = spark_from("MAU", "Month", mau_col, LILAC)
         if fig: st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
     with spark_cols[3]:
-        fig = spark_from(data.get("Activation"), "Cohort_dt", "Cohort", act_col, SOFT_GRAY)
+        fig = spark_from("Activation", "Cohort", act_col, SOFT_GRAY)
         if fig: st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
 
     st.markdown("<div class='section-divider'></div>", unsafe_allow_html=True)
 
     st.markdown("<div class='section-title'>Key Insights</div>", unsafe_allow_html=True)
 
-    top_course_df = compute_course_top(data.get("Course"), 1, CACHE_VERSION) if is_valid_df(data.get("Course")) else None
-    top_geo_df = compute_geo_top(data.get("Country"), 1, CACHE_VERSION) if is_valid_df(data.get("Country")) else None
-
-    growth_driver = "—"
-    if is_valid_df(top_course_df):
-        growth_driver = f"Top course: **{top_course_df.iloc[0]['Course']}** ({int(top_course_df.iloc[0]['Sign Ups']):,} sign-ups)"
-
-    geo_driver = "—"
-    if is_valid_df(top_geo_df):
-        geo_driver = f"Top country: **{top_geo_df.iloc[0]['Country']}** ({int(top_geo_df.iloc[0]['Total Course Signups']):,} sign-ups)"
-
-    funnel_df, funnel_warn, funnel_drops = compute_funnel(data.get("DropOff_Split"), tuple(FUNNEL_STAGE_ORDER), CACHE_VERSION) if is_valid_df(data.get("DropOff_Split")) else (None, None, None)
-    risk = "—"
-    if is_valid_df(funnel_drops):
-        worst = funnel_drops.sort_values("Drop (%)", ascending=False).iloc[0]
-        risk = f"Biggest drop: **{worst['From → To']}** (−{int(worst['Drop (users)']):,}, {float(worst['Drop (%)']):.1f}%)"
-
-    perf = compute_course_perf(data.get("Course"), data.get("Completion"), CACHE_VERSION) if (is_valid_df(data.get("Course")) and is_valid_df(data.get("Completion"))) else None
-    opportunity = "—"
-    if is_valid_df(perf) and has_cols(perf, ["Course", "Sign Ups", "Avg Completion %"]):
-        perf2 = perf.copy()
-        perf2["Sign Ups"] = to_num_series(perf2["Sign Ups"], 0)
-        perf2["Avg Completion %"] = to_num_series(perf2["Avg Completion %"], 0.0)
-        cutoff = perf2["Sign Ups"].quantile(0.80) if len(perf2) >= 10 else perf2["Sign Ups"].median()
-        high = perf2[perf2["Sign Ups"] >= cutoff]
-        if not high.empty:
-            cand = high.sort_values(["Avg Completion %", "Sign Ups"], ascending=[True, False]).iloc[0]
-            opportunity = f"Improve completion: **{cand['Course']}** ({int(cand['Sign Ups']):,} sign-ups, {float(cand['Avg Completion %']):.1f}% completion)"
+    insights = key_insights(bundle)
+    growth_driver = f"Top course: **{insights.top_course[0]}** ({insights.top_course[1]:,} sign-ups)" if insights.top_course else "—"
+    geo_driver = f"Top country: **{insights.top_country[0]}** ({insights.top_country[1]:,} sign-ups)" if insights.top_country else "—"
+    risk = f"Biggest drop: **{insights.biggest_drop[0]}** (−{insights.biggest_drop[1]:,}, {insights.biggest_drop[2]:.1f}%)" if insights.biggest_drop else "—"
+    funnel_warn = insights.funnel_warning
+    opportunity = (
+        f"Improve completion: **{insights.opportunity[0]}** ({insights.opportunity[1]:,} sign-ups, {insights.opportunity[2]:.1f}% completion)"
+        if insights.opportunity else "—"
+    )
 
     insight_cols = st.columns(3)
     with insight_cols[0]:
@@ -804,7 +609,7 @@ with tab_exec:
 
     st.markdown("<div class='section-title'>What changed?</div>", unsafe_allow_html=True)
     bullets = []
-    if compare_mode and prev_start_dt and prev_end_dt:
+    if view.compare_mode and view.prev_start_dt and view.prev_end_dt:
         bullets.append(f"Enrollments: **{int(round(cur_enroll_sum)):,}** ({percent_delta(cur_enroll_sum, prev_enroll_sum)} vs previous period)")
         bullets.append(f"Signups: **{int(round(cur_signup_sum)):,}** ({percent_delta(cur_signup_sum, prev_signup_sum)} vs previous period)")
         if prev_mau_last:
@@ -819,22 +624,27 @@ with tab_exec:
 # =========================
 # GROWTH & RETENTION
 # =========================
-with tab_growth:
+@st.fragment
+def render_growth(bundle: Bundle, view: ViewParams) -> None:
+    data = bundle.data
     st.markdown("<div class='section-title'>Growth & Retention</div>", unsafe_allow_html=True)
     info_expander("What this means", "Use this tab to understand volume + activation. Compare mode overlays the prior period.")
-    st.caption(f"Range: {start_p.strftime('%b %Y')} → {end_p.strftime('%b %Y')}" + (f" | Compare: {prev_start_p.strftime('%b %Y')} → {prev_end_p.strftime('%b %Y')}" if compare_mode and prev_start_p else ""))
+    st.caption(f"Range: {view.start_p.strftime('%b %Y')} → {view.end_p.strftime('%b %Y')}" + (f" | Compare: {view.prev_start_p.strftime('%b %Y')} → {view.prev_end_p.strftime('%b %Y')}" if view.compare_mode and view.prev_start_p else ""))
 
     st.markdown("#### Enrollment trends")
     info_expander("Definition", TOOLTIPS["enrollment_trend"])
     col1, col2 = st.columns([2, 1])
 
     df_en = data.get("Monthly_Enroll")
-    df_en_cur = filter_range(df_en, "Month_dt", start_dt, end_dt) if (is_valid_df(df_en) and "Month_dt" in df_en.columns) else None
-    df_en_prev = filter_range(df_en, "Month_dt", prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt and is_valid_df(df_en) and "Month_dt" in df_en.columns) else None
+    df_en_cur = bundle.time_slice("Monthly_Enroll", view.start_dt, view.end_dt) if (is_valid_df(df_en) and "Month_dt" in df_en.columns) else None
+    df_en_prev = bundle.time_slice("Monthly_Enroll", view.prev_start_dt, view.prev_end_dt) if (view.compare_mode and view.prev_start_dt and view.prev_end_dt and is_valid_df(df_en) and "Month_dt" in df_en.columns) else None
 
     with col1:
         if is_valid_df(df_en_cur) and has_cols(df_en_cur, ["Month", "Enrollments"]):
-            fig = create_line_compare_chart(df_en_cur, "Month", "Enrollments", df_en_prev, "Enrollments", ACCENT, chart_height, compare_mode)
+            fig = cached_figure(
+                ("line", "Monthly_Enroll", bundle.sheet_version("Monthly_Enroll"), "Enrollments", view.range_key),
+                lambda: create_line_compare_chart(df_en_cur, "Month", "Enrollments", df_en_prev, "Enrollments", ACCENT, view.chart_height, view.compare_mode),
+            )
             st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
         else:
             st.warning("Enrollment Trends: data not available or required columns missing.")
@@ -855,12 +665,15 @@ with tab_growth:
     col1, col2 = st.columns([2, 1])
 
     df_su = data.get("Monthly_Unique")
-    df_su_cur = filter_range(df_su, "Month_dt", start_dt, end_dt) if (is_valid_df(df_su) and "Month_dt" in df_su.columns) else None
-    df_su_prev = filter_range(df_su, "Month_dt", prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt and is_valid_df(df_su) and "Month_dt" in df_su.columns) else None
+    df_su_cur = bundle.time_slice("Monthly_Unique", view.start_dt, view.end_dt) if (is_valid_df(df_su) and "Month_dt" in df_su.columns) else None
+    df_su_prev = bundle.time_slice("Monthly_Unique", view.prev_start_dt, view.prev_end_dt) if (view.compare_mode and view.prev_start_dt and view.prev_end_dt and is_valid_df(df_su) and "Month_dt" in df_su.columns) else None
 
     with col1:
         if is_valid_df(df_su_cur) and has_cols(df_su_cur, ["Month", "Unique User Signups"]):
-            fig = create_line_compare_chart(df_su_cur, "Month", "Unique User Signups", df_su_prev, "Signups", BLUE, chart_height, compare_mode)
+            fig = cached_figure(
+                ("line", "Monthly_Unique", bundle.sheet_version("Monthly_Unique"), "Unique User Signups", view.range_key),
+                lambda: create_line_compare_chart(df_su_cur, "Month", "Unique User Signups", df_su_prev, "Signups", BLUE, view.chart_height, view.compare_mode),
+            )
             st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
         else:
             st.warning("User Sign Up Trends: data not available or required columns missing.")
@@ -884,12 +697,15 @@ with tab_growth:
         info_expander("Definition", TOOLTIPS["mau"])
         df_m = data.get("MAU")
         if is_valid_df(df_m) and "Month_dt" in df_m.columns and "Month" in df_m.columns:
-            mau_series_col = "Business MAU" if (segment == "Business" and "Business MAU" in df_m.columns) else "MAU"
+            mau_series_col = "Business MAU" if (view.segment == "Business" and "Business MAU" in df_m.columns) else "MAU"
             if mau_series_col in df_m.columns:
-                cur = filter_range(df_m, "Month_dt", start_dt, end_dt)
-                prev = filter_range(df_m, "Month_dt", prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt) else None
+                cur = bundle.time_slice("MAU", view.start_dt, view.end_dt)
+                prev = bundle.time_slice("MAU", view.prev_start_dt, view.prev_end_dt) if (view.compare_mode and view.prev_start_dt and view.prev_end_dt) else None
                 if is_valid_df(cur):
-                    fig = create_line_compare_chart(cur, "Month", mau_series_col, prev, mau_series_col, LILAC, chart_height, compare_mode)
+                    fig = cached_figure(
+                        ("line", "MAU", bundle.sheet_version("MAU"), mau_series_col, view.range_key),
+                        lambda: create_line_compare_chart(cur, "Month", mau_series_col, prev, mau_series_col, LILAC, view.chart_height, view.compare_mode),
+                    )
                     st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
                 else:
                     st.info("No MAU data in selected range.")
@@ -903,12 +719,15 @@ with tab_growth:
         info_expander("Definition", TOOLTIPS["activation"])
         df_a = data.get("Activation")
         if is_valid_df(df_a) and "Cohort_dt" in df_a.columns and "Cohort" in df_a.columns:
-            act_series_col = "Business Activation Rate %" if (segment == "Business" and "Business Activation Rate %" in df_a.columns) else "All Activation Rate %"
+            act_series_col = "Business Activation Rate %" if (view.segment == "Business" and "Business Activation Rate %" in df_a.columns) else "All Activation Rate %"
             if act_series_col in df_a.columns:
-                cur = filter_range(df_a, "Cohort_dt", start_dt, end_dt)
-                prev = filter_range(df_a, "Cohort_dt", prev_start_dt, prev_end_dt) if (compare_mode and prev_start_dt and prev_end_dt) else None
+                cur = bundle.time_slice("Activation", view.start_dt, view.end_dt)
+                prev = bundle.time_slice("Activation", view.prev_start_dt, view.prev_end_dt) if (view.compare_mode and view.prev_start_dt and view.prev_end_dt) else None
                 if is_valid_df(cur):
-                    fig = create_line_compare_chart(cur, "Cohort", act_series_col, prev, act_series_col, SOFT_GRAY, chart_height, compare_mode)
+                    fig = cached_figure(
+                        ("line", "Activation", bundle.sheet_version("Activation"), act_series_col, view.range_key),
+                        lambda: create_line_compare_chart(cur, "Cohort", act_series_col, prev, act_series_col, SOFT_GRAY, view.chart_height, view.compare_mode),
+                    )
                     st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
                 else:
                     st.info("No activation data in selected range.")
@@ -917,36 +736,59 @@ with tab_growth:
         else:
             st.warning("Activation: data not available / columns missing.")
 
+    st.markdown("**Cohort retention**")
+    info_expander("Definition", TOOLTIPS["retention"])
+    df_r = data.get("Retention")
+    if is_valid_df(df_r) and "Segment" in df_r.columns:
+        segment = view.segment if df_r["Segment"].astype(str).eq(view.segment).any() else "All"
+        if segment != view.segment:
+            st.caption(f"No retention data for the {view.segment} segment; showing All users.")
+        matrix = compute_retention(df_r, bundle.sheet_version("Retention"), segment)
+        if is_valid_df(matrix):
+            matrix = matrix[matrix["Cohort_dt"].between(view.start_dt, view.end_dt)]
+        if is_valid_df(matrix):
+            fig = cached_figure(
+                ("heatmap", "Retention", bundle.sheet_version("Retention"), segment, view.range_key),
+                lambda: create_retention_heatmap(matrix, max(view.chart_height, 28 * len(matrix) + 120)),
+            )
+            st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
+        else:
+            st.info("No signup cohorts in selected range.")
+    else:
+        st.info("Cohort retention needs user-level activity: add enrollment and activity partitions under events/ (see events.py).")
+
 
 # =========================
 # GEOGRAPHY
 # =========================
-with tab_geo:
+@st.fragment
+def render_geo(bundle: Bundle, view: ViewParams) -> None:
+    data = bundle.data
     st.markdown("<div class='section-title'>Geography</div>", unsafe_allow_html=True)
     info_expander("Definition", TOOLTIPS["geo"])
 
     df_geo = data.get("Country")
-    top_geo = compute_geo_top(df_geo, int(top_countries), CACHE_VERSION) if is_valid_df(df_geo) else None
+    top_geo = bundle.top_n("Country", int(view.top_countries))
 
     colM, colN = st.columns([2, 1])
     with colM:
-        if is_valid_df(df_geo) and has_cols(df_geo, ["Country", "Total Course Signups"]):
-            geo_map = df_geo[["Country", "Total Course Signups"]].copy()
-            geo_map["Total Course Signups"] = to_num_series(geo_map["Total Course Signups"], 0)
-            fig = px.choropleth(
-                geo_map,
-                locations="Country",
-                locationmode="country names",
-                color="Total Course Signups",
-                color_continuous_scale=["#1e1e1e", ACCENT],
+        if is_valid_df(df_geo) and has_cols(df_geo, ["Country", "Total Course Signups", "ISO3"]):
+            map_height = max(420, view.chart_height + 80)
+            fig = cached_figure(
+                ("geo_map", bundle.sheet_version("Country"), map_height),
+                lambda: create_choropleth(df_geo, map_height),
             )
-            fig.update_layout(**DARK_LAYOUT, geo=dict(bgcolor="rgba(0,0,0,0)"), height=max(420, chart_height + 80))
             st.plotly_chart(fig, use_container_width=True)
+            if bundle.unmatched_countries:
+                st.caption(
+                    f"Not on the map ({len(bundle.unmatched_countries)} unrecognised country names): "
+                    + ", ".join(bundle.unmatched_countries)
+                )
         else:
             st.warning("Geography map: data not available / columns missing.")
 
     with colN:
-        st.markdown(f"#### Top {int(top_countries)} Countries")
+        st.markdown(f"#### Top {int(view.top_countries)} Countries")
         if is_valid_df(top_geo):
             st.dataframe(top_geo, use_container_width=True, hide_index=True)
         else:
@@ -956,23 +798,47 @@ with tab_geo:
 # =========================
 # COURSE PERFORMANCE
 # =========================
-with tab_courses:
+# Searching and paging rerun only this section, not the charts above it.
+@st.fragment
+def render_course_table(index: Optional[Union[CourseSearchIndex, SqlCourseSearch]]) -> None:
+    st.markdown("#### All course performance")
+    if index is not None:
+        course_search = st.text_input("Course search", key="course_search", placeholder="Filter course tables…")
+        matches = index.search(course_search)
+
+        st.markdown("**Top 20 (quick view)**")
+        st.dataframe(index.rows(matches[:20]), use_container_width=True, hide_index=True)
+
+        with st.expander("View full table (paginated)", expanded=False):
+            page_size = st.number_input("Rows per page", min_value=25, max_value=200, value=DEFAULT_PAGE_SIZE, step=25)
+            total_rows = len(matches)
+            total_pages = max(1, (total_rows + int(page_size) - 1) // int(page_size))
+            page = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+            start = (int(page) - 1) * int(page_size)
+            end = start + int(page_size)
+            st.caption(f"Showing rows {start+1}-{min(end, total_rows)} of {total_rows}")
+            st.dataframe(index.rows(matches[start:end]), use_container_width=True, hide_index=True, height=560)
+    else:
+        st.info("Course performance table not available.")
+
+@st.fragment
+def render_courses(bundle: Bundle, view: ViewParams) -> None:
+    data = bundle.data
     st.markdown("<div class='section-title'>Course Performance</div>", unsafe_allow_html=True)
     info_expander("Definition", "Find high-impact courses, completion rate gaps, and diagnose drop-offs.")
     info_expander("Popular courses", TOOLTIPS["popular"])
     info_expander("Completion rates", TOOLTIPS["completion"])
 
-    df_course = data.get("Course")
-    df_comp = data.get("Completion")
-    perf = compute_course_perf(df_course, df_comp, CACHE_VERSION) if (is_valid_df(df_course) and is_valid_df(df_comp)) else None
-
     colA, colB = st.columns(2)
 
     with colA:
         st.markdown("#### Popular courses")
-        top_courses_df = compute_course_top(df_course, int(top_courses), CACHE_VERSION) if is_valid_df(df_course) else None
+        top_courses_df = bundle.top_n("Course", int(view.top_courses))
         if is_valid_df(top_courses_df):
-            fig = create_bar_chart(top_courses_df, "Sign Ups", "ShortName", ACCENT, text_col="Sign Ups", height=max(360, chart_height + 40))
+            fig = cached_figure(
+                ("course_top", bundle.sheet_version("Course"), view.top_courses, view.chart_height),
+                lambda: create_bar_chart(top_courses_df, "Sign Ups", "ShortName", ACCENT, text_col="Sign Ups", height=max(360, view.chart_height + 40)),
+            )
             st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
             with st.expander("Details (table)", expanded=False):
                 st.dataframe(top_courses_df, use_container_width=True, hide_index=True)
@@ -981,10 +847,14 @@ with tab_courses:
 
     with colB:
         st.markdown("#### Completion rates (top by volume)")
-        if is_valid_df(perf) and has_cols(perf, ["ShortName", "Sign Ups", "Avg Completion %"]):
-            top_perf = perf.nlargest(int(top_courses), "Sign Ups")
-            fig = create_bar_chart(top_perf, "Avg Completion %", "ShortName", BLUE, text_col="Avg Completion %", height=max(360, chart_height + 40), x_title="Avg Completion %")
-            fig.update_traces(texttemplate="%{text:.1f}%")
+        top_perf = bundle.course_perf(limit=int(view.top_courses))  # in the Course sheet's rank order
+        if is_valid_df(top_perf) and has_cols(top_perf, ["ShortName", "Sign Ups", "Avg Completion %"]):
+            fig = cached_figure(
+                ("course_completion", bundle.sheet_version("Course"), bundle.sheet_version("Completion"), view.top_courses, view.chart_height),
+                lambda: create_bar_chart(
+                    top_perf, "Avg Completion %", "ShortName", BLUE, text_col="Avg Completion %", height=max(360, view.chart_height + 40), x_title="Avg Completion %"
+                ).update_traces(texttemplate="%{text:.1f}%"),
+            )
             st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
             with st.expander("Details (table)", expanded=False):
                 st.dataframe(top_perf.sort_values("Avg Completion %"), use_container_width=True, hide_index=True)
@@ -997,23 +867,16 @@ with tab_courses:
     info_expander("Definition", TOOLTIPS["funnel"])
     colF, colT = st.columns([2, 1])
 
-    funnel_df, funnel_warn, funnel_drops = compute_funnel(data.get("DropOff_Split"), tuple(FUNNEL_STAGE_ORDER), CACHE_VERSION) if is_valid_df(data.get("DropOff_Split")) else (None, None, None)
+    funnel_df, funnel_warn, funnel_drops = compute_funnel(data.get("DropOff_Split"), bundle.sheet_version("DropOff_Split"), tuple(FUNNEL_STAGE_ORDER)) if is_valid_df(data.get("DropOff_Split")) else (None, None, None)
 
     with colF:
         if funnel_warn:
             st.warning(funnel_warn)
         if is_valid_df(funnel_df):
-            fig = go.Figure(
-                go.Bar(
-                    x=funnel_df["All Count"],
-                    y=funnel_df["Stage"],
-                    orientation="h",
-                    text=funnel_df["text_label"],
-                    textposition="auto",
-                    marker={"color": [DARK, MID_GRAY_1, MID_GRAY_2, ACCENT]},
-                )
+            fig = cached_figure(
+                ("funnel", bundle.sheet_version("DropOff_Split"), view.chart_height),
+                lambda: create_funnel_chart(funnel_df, max(360, view.chart_height + 40)),
             )
-            fig.update_layout(**DARK_LAYOUT, height=max(360, chart_height + 40), yaxis=dict(autorange="reversed"))
             st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
         else:
             st.warning("Funnel: data not available / columns missing.")
@@ -1027,35 +890,41 @@ with tab_courses:
 
     st.markdown("<div class='section-divider'></div>", unsafe_allow_html=True)
 
-    st.markdown("#### All course performance")
-    if is_valid_df(perf):
-        df_table = perf.copy()
-        if st.session_state["course_search"].strip():
-            q = st.session_state["course_search"].strip().lower()
-            df_table = df_table[df_table["Course"].astype(str).str.lower().str.contains(q, na=False)]
-
-        if "Sign Ups" in df_table.columns:
-            df_table = df_table.sort_values("Sign Ups", ascending=False)
-
-        st.markdown("**Top 20 (quick view)**")
-        st.dataframe(df_table.head(20), use_container_width=True, hide_index=True)
-
-        with st.expander("View full table (paginated)", expanded=False):
-            page_size = st.number_input("Rows per page", min_value=25, max_value=200, value=DEFAULT_PAGE_SIZE, step=25)
-            total_rows = len(df_table)
-            total_pages = max(1, (total_rows + int(page_size) - 1) // int(page_size))
-            page = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
-            start = (int(page) - 1) * int(page_size)
-            end = start + int(page_size)
-            st.caption(f"Showing rows {start+1}-{min(end, total_rows)} of {total_rows}")
-            st.dataframe(df_table.iloc[start:end], use_container_width=True, hide_index=True, height=560)
-    else:
-        st.info("Course performance table not available.")
+    render_course_table(bundle.course_search())
 
     st.markdown("<div class='section-divider'></div>", unsafe_allow_html=True)
 
-    st.markdown("#### Course drop-off sheet (raw)")
+    st.markdown("#### Course funnels")
+    info_expander("Definition", TOOLTIPS["course_funnel"])
     df_cd = data.get("Course_DropOff")
+    ranking, course_stages, funnel_note = (
+        compute_course_funnels(df_cd, bundle.sheet_version("Course_DropOff"), view.segment) if is_valid_df(df_cd) else (None, None, None)
+    )
+    if funnel_note:
+        st.caption(funnel_note)
+    if is_valid_df(ranking):
+        colR, colD = st.columns([3, 2])
+        with colR:
+            st.markdown("**Worst transitions**")
+            st.dataframe(
+                ranking[["Course", "Enrolled", "Completed", "Worst transition", "Worst drop %", "Completion %"]].head(int(view.top_courses)),
+                use_container_width=True,
+                hide_index=True,
+            )
+        with colD:
+            course = st.selectbox("Drill down", ranking["Course"].tolist(), key="funnel_course")
+            stages = course_stages.loc[[course]]
+            fig = cached_figure(
+                ("course_funnel", bundle.sheet_version("Course_DropOff"), view.segment, course, view.chart_height),
+                lambda: create_funnel_chart(stages, max(320, view.chart_height), count_col="Count"),
+            )
+            st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
+            row = ranking.loc[ranking["Course"].eq(course)].iloc[0]
+            if row["Enrolled"] > 0:
+                st.caption(f"Worst step: {row['Worst transition']} ({row['Worst drop %']:.1f}% drop) • {row['Completion %']:.1f}% of enrolled complete.")
+    else:
+        st.warning("Course funnels: course drop-off sheet not available / columns missing.")
+
     with st.expander("Show raw course drop-off data", expanded=False):
         if is_valid_df(df_cd):
             st.dataframe(df_cd, use_container_width=True)
@@ -1066,7 +935,9 @@ with tab_courses:
 # =========================
 # USER INSIGHTS
 # =========================
-with tab_users:
+@st.fragment
+def render_users(bundle: Bundle, view: ViewParams) -> None:
+    data = bundle.data
     st.markdown("<div class='section-title'>User Insights</div>", unsafe_allow_html=True)
     info_expander("What this means", "Understand composition (segmentation) and depth of engagement.")
 
@@ -1082,11 +953,10 @@ with tab_users:
             inv = get_metric_value(df_seg, "Invalid Users")
 
             if biz + gen + inv > 0:
-                fig = go.Figure(
-                    data=[go.Pie(labels=["Business", "Generic", "Invalid"], values=[biz, gen, inv], hole=0.5,
-                                 marker=dict(colors=[ACCENT, SOFT_GRAY, DARK]))]
+                fig = cached_figure(
+                    ("segmentation", bundle.sheet_version("User_Segmentation"), view.chart_height),
+                    lambda: create_donut_chart(["Business", "Generic", "Invalid"], [biz, gen, inv], [ACCENT, SOFT_GRAY, DARK], max(320, view.chart_height)),
                 )
-                fig.update_layout(**DARK_LAYOUT, height=max(320, chart_height))
                 st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
 
                 total = biz + gen + inv
@@ -1105,8 +975,10 @@ with tab_users:
             df_plot = df_eng.loc[mask, ["Metric", "Count"]].copy()
             if is_valid_df(df_plot):
                 df_plot["Count"] = to_num_series(df_plot["Count"], 0)
-                fig = px.bar(df_plot, x="Metric", y="Count", color="Metric")
-                fig.update_layout(**DARK_LAYOUT, showlegend=False, height=max(320, chart_height))
+                fig = cached_figure(
+                    ("engagement", bundle.sheet_version("User_Engagement"), view.chart_height),
+                    lambda: create_column_chart(df_plot, "Metric", "Count", max(320, view.chart_height)),
+                )
                 st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
 
                 top_row = df_plot.sort_values("Count", ascending=False).iloc[0]
@@ -1120,8 +992,100 @@ with tab_users:
 
     st.markdown("#### Badges")
     df_b = data.get("Badges_Issued")
-    st.caption("If you want this to be actionable, add issuance velocity and claim-rate over time (requires event timestamps).")
+    df_bm = data.get("Badges_Monthly")  # only present when badge events are ingested
+    if is_valid_df(df_bm) and has_cols(df_bm, ["Month", "Month_dt", "Issued", "Claimed"]):
+        cur = df_bm[df_bm["Month_dt"].between(view.start_dt, view.end_dt)]
+        if is_valid_df(cur):
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                fig = cached_figure(
+                    ("lines", "Badges_Monthly", bundle.sheet_version("Badges_Monthly"), view.range_key),
+                    lambda: create_multi_line_chart(cur, "Month", [("Issued", ACCENT), ("Claimed", BLUE)], view.chart_height),
+                )
+                st.plotly_chart(fig, use_container_width=True, config=CHART_CONFIG)
+            with col2:
+                tbl = cur[["Month", "Issued", "Claimed"]].copy()
+                issued = to_num_series(tbl["Issued"], 0)
+                tbl["Claim Rate %"] = (to_num_series(tbl["Claimed"], 0) / issued.where(issued > 0) * 100).round(1)
+                st.dataframe(tbl.tail(12), use_container_width=True, hide_index=True)
+        else:
+            st.info("No badge events in the selected range.")
+    else:
+        st.caption("If you want this to be actionable, add issuance velocity and claim-rate over time (requires event timestamps).")
     if is_valid_df(df_b):
         st.dataframe(df_b, use_container_width=True, hide_index=True)
     else:
         st.info("Badges sheet not available.")
+
+
+@st.fragment
+def render_admin(bundle: Bundle, view: ViewParams) -> None:
+    st.markdown("<div class='section-title'>Cache & Load Diagnostics</div>", unsafe_allow_html=True)
+    cache = budget_cache()
+    used_mb, max_mb = cache.used_bytes / 1024 ** 2, cache.max_bytes / 1024 ** 2
+    st.progress(min(cache.used_bytes / cache.max_bytes, 1.0), text=f"Cache memory: {used_mb:,.1f} MB of {max_mb:,.0f} MB")
+
+    rows = []
+    for ns, stats in sorted(cache.stats().items()):
+        lookups = stats.hits + stats.misses
+        rows.append({
+            "Cache": ns,
+            "Entries": stats.entries,
+            "MB": round(stats.bytes / 1024 ** 2, 2),
+            "Hits": stats.hits,
+            "Misses": stats.misses,
+            "Hit rate": f"{stats.hits / lookups * 100:.1f}%" if lookups else "—",
+            "Evictions": stats.evictions,
+        })
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    else:
+        st.info("Nothing cached yet.")
+
+    st.markdown("#### Loaded sheets")
+    store = bundle_store()
+    report = bundle.memory_report()
+    sheet_bytes = report.groupby("Sheet", sort=False)["Bytes"].sum()
+    st.caption(
+        f"Bundle version {bundle.version} • {sheet_bytes.sum() / 1024:,.1f} KB in memory • "
+        f"backend: {'sqlite' if bundle.database is not None else 'pandas'} • "
+        f"live versions: {', '.join(map(str, store.live_versions())) or '—'}"
+    )
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "Sheet": key,
+                "Source": bundle.sheet_sources.get(key, ""),
+                "Seconds": round(bundle.sheet_timings.get(key, 0.0), 3),
+                "KB": round(sheet_bytes.get(key, 0) / 1024, 1),
+                "Digest": bundle.sheet_version(key),
+            }
+            for key in bundle.data
+        ]),
+        use_container_width=True,
+        hide_index=True,
+    )
+    with st.expander("Memory by column"):
+        st.dataframe(report, use_container_width=True, hide_index=True)
+
+
+# =========================
+# NAVIGATION
+# =========================
+VIEWS: Dict[str, Callable[[Bundle, ViewParams], None]] = {
+    "Executive Summary": render_exec,
+    "Growth & Retention": render_growth,
+    "Geography": render_geo,
+    "Course Performance": render_courses,
+    "User Insights": render_users,
+}
+if st.query_params.get("admin") == "1":
+    VIEWS["Admin"] = render_admin
+
+if NAV_MODE == "lazy":
+    active_view = st.radio("View", list(VIEWS), horizontal=True, key="active_view", label_visibility="collapsed")
+    VIEWS[active_view](bundle, view)
+else:
+    for tab, render in zip(st.tabs(list(VIEWS)), VIEWS.values()):
+        with tab:
+            render(bundle, view)
@@ -0,0 +1,53 @@
+"""Validate the "stream" xlsx engine against openpyxl and time both.
+
+Usage: python bench_xlsx_engines.py [path/to/workbook.xlsx] [repeats]
+
+Every sheet is parsed by both engines and compared with
+``pandas.testing.assert_frame_equal``; the script exits non-zero on any mismatch.
+"""
+import sys
+import time
+
+import pandas as pd
+
+from workbook import StreamWorkbook
+
+DEFAULT_PATH = "ManageEngine User Academy Stats - Single Source of Truth.xlsx"
+
+
+def best_of(repeats: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(path: str, repeats: int) -> int:
+    failures = 0
+    stream = StreamWorkbook(path)
+    xls = pd.ExcelFile(path)
+    for name in stream.sheet_names:
+        expected = pd.read_excel(xls, sheet_name=name)
+        actual = stream.read_sheet(name)
+        try:
+            pd.testing.assert_frame_equal(actual, expected)
+            status = "ok"
+        except AssertionError as exc:
+            failures += 1
+            status = f"MISMATCH: {exc}"
+        print(f"{name:<32} {expected.shape!s:<10} {status}")
+
+    t_openpyxl = best_of(repeats, lambda: [pd.read_excel(x, sheet_name=n) for x in [pd.ExcelFile(path)] for n in x.sheet_names])
+    t_stream = best_of(repeats, lambda: [w.read_sheet(n) for w in [StreamWorkbook(path)] for n in w.sheet_names])
+    print()
+    print(f"openpyxl : {t_openpyxl * 1000:8.1f} ms (best of {repeats}, whole workbook)")
+    print(f"stream   : {t_stream * 1000:8.1f} ms (best of {repeats}, whole workbook)")
+    print(f"speed-up : {t_openpyxl / t_stream:8.1f}x")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sys.exit(main(args[0] if args else DEFAULT_PATH, int(args[1]) if len(args) > 1 else 5))
@@ -0,0 +1,1802 @@
+"""Headless metrics engine behind the academy dashboard.
+
+Everything the dashboard computes lives here and runs without a Streamlit server:
+- loading the workbook into a versioned ``Bundle``
+- the derived tables (``compute_*``)
+- the window KPIs and the Key Insights
+``app.py`` only renders on top of it; batch jobs, benchmarks and process-pool workers
+import this module directly. Caches are process-wide module state (``process_singleton``),
+which is the lifetime ``st.cache_resource`` used to give them.
+
+Usage: python engine.py [path/to/workbook.xlsx] [--months N] [--segment S] [--top N] [--backend B]
+"""
+import os
+import sys
+import hashlib
+import argparse
+import contextlib
+import sqlite3
+import inspect
+import threading
+import weakref
+import time
+import multiprocessing
+import types
+import datetime as dt
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterator, Optional, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from countries import resolve_iso3
+from events import EventStore
+from sheetdb import SheetDatabase, table_name
+from workbook import StreamWorkbook, read_sheet_timed, sheet_digests, workbook_stamp
+
+
+# =========================
+# 0) CACHE / VERSIONING
+# =========================
+CACHE_VERSION = "2026-10-17.dashboard.v12-course-funnels"
+CACHE_TTL_SECONDS = 3600  # 1 hour
+CACHE_MAX_BYTES = 512 * 1024 ** 2  # one budget for cached sheets, derived tables and figures
+# Cached figures are sized from their per-point trace arrays plus a flat allowance for the
+# layout and template, which barely vary between charts.
+FIGURE_ARRAY_PROPS = ("x", "y", "z", "text", "hovertext", "customdata", "values", "labels", "locations", "ids")
+FIGURE_BASE_BYTES = 8 * 1024
+
+# Cached frames are shared across sessions and handed out as shallow copies; Copy-on-Write
+# (always on from pandas 3, see requirements.txt) is what keeps a caller's edits off the
+# shared frame.
+
+def process_singleton(factory: Callable[[], Any]) -> Callable[[], Any]:
+    """Build ``factory()`` on first call and return that same object for the life of the process.
+
+    Streamlit imports this module once and re-executes only the app script, so the result
+    outlives reruns and is shared by every session.
+    """
+    lock = threading.Lock()
+    built: List[Any] = []
+
+    @wraps(factory)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
+
+    return get
+
+
+# =========================
+# 1) CONSTANTS
+# =========================
+FILE_PATH = "ManageEngine User Academy Stats - Single Source of Truth.xlsx"
+SNAPSHOT_DIR = ".dashboard_snapshots"
+SNAPSHOT_KEEP = 3  # most recent workbook versions kept on disk
+
+# "serial" | "parallel" | "auto". Auto only pays for a process pool once the workbook is
+# big enough that per-sheet parsing outweighs worker startup.
+LOAD_MODE = "auto"
+PARALLEL_MIN_BYTES = 2_000_000
+PARALLEL_MAX_WORKERS = 6
+PARALLEL_TIMEOUT_SECONDS = 120  # after this the pool is killed and the load parses serially
+
+# xlsx parser backend: "openpyxl" (pandas default) or "stream" (workbook.StreamWorkbook, an
+# iterparse pass over the sheet XML; checked against openpyxl by bench_xlsx_engines.py).
+XLSX_ENGINE = "stream"
+
+# Background watcher: poll interval, and how long size/mtime must hold still before a
+# rewritten workbook counts as fully written.
+WATCH_INTERVAL_SECONDS = 5
+WATCH_SETTLE_SECONDS = 2
+
+SHORTNAME_MAX_LEN = 35
+
+FUNNEL_STAGE_ORDER = ["Enrolled", "Started", "In Progress", "Completed"]
+
+# Course_DropOff counts each course's users by the stage they stopped at, in funnel order.
+# Summed from the end, they give the users reaching each FUNNEL_STAGE_ORDER stage. Counts per
+# segment ("Business No Progress Count", ...) are used when the sheet has them.
+COURSE_FUNNEL_COUNTS = ["No Progress Count", "Early Drop-off Count", "Mid Funnel Count", "Completed Count"]
+SEGMENTS = ["Business", "Generic", "Invalid"]
+COURSE_FUNNEL_MIN_ENROLLED = 10  # courses with fewer enrolled users rank after the rest
+
+SHEET_MAP = {
+    "Monthly_Enroll": "Monthly Enrollments",
+    "Monthly_Unique": "Monthly User Sign-Ups",
+    "Country": "Country Breakdown",
+    "Course": "Course Sign-Up Sheet",
+    "Completion": "Completion Percentage",
+    "MAU": "MAU",
+    "Activation": "Activation Rate (D30)",
+    "DropOff_Split": "Drop-off Stage Split",
+    "Course_DropOff": "Course Drop-off (All)",
+    "User_Engagement": "User and Course Engagement",
+    "Badges_Issued": "Badges Issued",
+    "User_Segmentation": "User Segmentation",
+}
+
+# Source header -> dashboard column name, applied right after parsing.
+SHEET_RENAMES = {
+    "Monthly_Enroll": {"Number of enrollments": "Enrollments"},
+    "Monthly_Unique": {"Number of Sign Ups": "Unique User Signups"},
+    "Course": {"Course Name": "Course", "Course Sign-Ups": "Sign Ups"},
+    "Completion": {"Avg %": "Avg Completion %"},
+}
+
+# Columns each sheet needs (post-rename names) and the dtype they're coerced to once at load:
+# "str", "category", "Int32", "float32" or "datetime". Only these columns are read from the
+# workbook. A sheet mapped to None is read whole and left untyped (Badges is shown raw and
+# its layout varies). After derived columns are added, typed sheets go through compact_frame.
+SHEET_SCHEMAS: Dict[str, Optional[Dict[str, str]]] = {
+    "Monthly_Enroll": {"Month": "str", "Enrollments": "Int32"},
+    "Monthly_Unique": {"Month": "str", "Unique User Signups": "Int32"},
+    "Country": {"Country": "str", "Total Course Signups": "Int32"},
+    "Course": {"Course": "str", "Sign Ups": "Int32"},
+    "Completion": {"Course": "str", "Avg Completion %": "float32"},
+    "MAU": {"Month": "str", "MAU": "Int32", "Business MAU": "Int32"},
+    "Activation": {"Cohort": "str", "All Activation Rate %": "float32", "Business Activation Rate %": "float32"},
+    "DropOff_Split": {"Stage": "category", "All Count": "Int32"},
+    "Course_DropOff": {
+        "Course": "str",
+        "No Progress Count": "Int32", "No Progress %": "float32",
+        "Early Drop-off Count": "Int32", "Early Drop-off %": "float32",
+        "Mid Funnel Count": "Int32", "Mid Funnel %": "float32",
+        "Completed Count": "Int32", "Completed %": "float32",
+        **{f"{seg} {col}": "Int32" for seg in SEGMENTS for col in COURSE_FUNNEL_COUNTS},  # optional
+    },
+    "User_Engagement": {"Metric": "category", "Count": "Int32"},
+    "Badges_Issued": None,
+    "User_Segmentation": {"Metric": "category", "Count": "Int32"},
+    "Badges_Monthly": {"Month": "str", "Issued": "Int32", "Claimed": "Int32"},  # events only
+    "Retention": {  # events only
+        "Cohort": "str", "Segment": "category", "Months Since Signup": "Int32",
+        "Active Users": "Int32", "Cohort Size": "Int32",
+    },
+}
+
+# Ranked sheets: key -> (value column, name column). The loader fills missing values with 0
+# and keeps rows in rank order (value descending, ties by name), so any top-N is a head().
+RANKED_SHEETS = {
+    "Country": ("Total Course Signups", "Country"),
+    "Course": ("Sign Ups", "Course"),
+}
+# Columns a top-N lookup returns, per ranked sheet.
+TOP_N_COLUMNS = {
+    "Country": ["Country", "Total Course Signups"],
+    "Course": ["Course", "ShortName", "Sign Ups"],
+}
+
+# Time sheets: key -> (date column, value columns). The loader sorts these by their date
+# column (undated rows last) and pre-aggregates the value columns into a MonthSeries.
+MONTH_SERIES = {
+    "Monthly_Enroll": ("Month_dt", ["Enrollments"]),
+    "Monthly_Unique": ("Month_dt", ["Unique User Signups"]),
+    "MAU": ("Month_dt", ["MAU", "Business MAU"]),
+    "Activation": ("Cohort_dt", ["All Activation Rate %", "Business Activation Rate %"]),
+}
+
+# Where window KPIs, top-N, the course performance join and course search run. "pandas": on
+# the Bundle's frames. "sqlite": load_raw also writes SQLITE_SHEETS into SQLITE_PATH
+# (sheetdb.SheetDatabase) and those lookups run there as indexed queries that return only
+# the result rows. The per-course sheets in SQLITE_ONLY_SHEETS are then not kept in memory
+# at all, and once their tables exist a load doesn't even read them from the workbook. The
+# time sheets stay in memory as well, since the charts plot every month of them. If the
+# database can't be opened or written, the Bundle falls back to pandas.
+BACKEND = "pandas"
+SQLITE_PATH = os.path.join(SNAPSHOT_DIR, "dashboard.sqlite3")
+SQLITE_ONLY_SHEETS = ("Course", "Completion")
+SQLITE_SHEETS = (*MONTH_SERIES, *SQLITE_ONLY_SHEETS)
+# Column lists indexed per sheet. Course needs none: its rowid is the rank, and the
+# course-performance join looks courses up in Completion.
+SQLITE_INDEXES = {
+    **{key: [[dt_col]] for key, (dt_col, _) in MONTH_SERIES.items()},
+    "Completion": [["Course"]],
+}
+
+# Raw event partitions (events.EventStore). When EVENTS_DIR exists, load_raw first folds any
+# partitions it hasn't seen into the state kept under EVENTS_STATE_DIR, and the aggregates
+# replace the hand-made workbook sheets they cover (Monthly_Enroll, Monthly_Unique, MAU,
+# Activation, Badges_Issued) and add Badges_Monthly and Retention (active users per signup
+# cohort, segment and months since signup). Other sheets still come from the workbook.
+EVENTS_DIR = "events"
+EVENTS_STATE_DIR = os.path.join(SNAPSHOT_DIR, "events")
+EVENT_CHUNK_ROWS = 100_000  # rows per chunk read from a partition
+
+
+# =========================
+# 2) UTILS
+# =========================
+def is_valid_df(df: Optional[pd.DataFrame]) -> bool:
+    return df is not None and isinstance(df, pd.DataFrame) and not df.empty
+
+def has_cols(df: pd.DataFrame, cols: List[str]) -> bool:
+    return all(c in df.columns for c in cols)
+
+def to_num_series(s: pd.Series, default: float = 0.0) -> pd.Series:
+    # Columns typed by SHEET_SCHEMAS at load are already numeric; don't copy them again.
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype) and not s.hasnans:
+        return s
+    out = pd.to_numeric(s, errors="coerce")
+    return out.fillna(default)
+
+def to_int_safe(x, default: int = 0) -> int:
+    try:
+        if pd.isna(x):
+            return default
+        return int(float(x))
+    except (ValueError, TypeError, OverflowError):
+        return default
+
+def month_end_from_mmm_yyyy(series: pd.Series) -> pd.Series:
+    dt0 = pd.to_datetime(series, format="%b %Y", errors="coerce")
+    return dt0 + pd.offsets.MonthEnd(0)
+
+def build_shortname(course_series: pd.Series, max_len: int = SHORTNAME_MAX_LEN) -> pd.Series:
+    s = course_series.astype(str).fillna("")
+    return s.where(s.str.len().le(max_len), s.str.slice(0, max_len) + "...")
+
+def file_mtime_seconds(path: str) -> int:
+    try:
+        return int(os.path.getmtime(path))
+    except OSError:
+        return 0
+
+def percent_delta(curr: float, prev: float) -> str:
+    if prev == 0:
+        return "—"
+    return f"{((curr - prev) / prev) * 100:.1f}%"
+
+@lru_cache(maxsize=2048)
+def period_to_month_end_ts(p: pd.Period) -> pd.Timestamp:
+    return (p.to_timestamp(how="end")).normalize() + pd.offsets.MonthEnd(0)
+
+def get_metric_value(df: Optional[pd.DataFrame], metric_name, col_name="Metric", value_col="Count") -> int:
+    if not is_valid_df(df) or col_name not in df.columns or value_col not in df.columns:
+        return 0
+    try:
+        row = df.loc[df[col_name].eq(metric_name), value_col]
+        if row.empty:
+            return 0
+        return to_int_safe(row.iloc[0], 0)
+    except (KeyError, IndexError, ValueError, TypeError):
+        return 0
+
+
+# =========================
+# 3) DATA MODEL
+# =========================
+class FrozenFrames(Mapping):
+    """Read-only {sheet key: frame} mapping shared by every session.
+
+    Lookups return shallow copies: no data is copied, and under Copy-on-Write any edit a
+    caller makes lands on its own copy, never on the shared frame.
+    """
+
+    def __init__(self, frames: Dict[str, Optional[pd.DataFrame]]):
+        self._frames = dict(frames)
+
+    def __getitem__(self, key: str) -> Optional[pd.DataFrame]:
+        df = self._frames[key]
+        return df.copy(deep=False) if df is not None else None
+
+    def __iter__(self):
+        return iter(self._frames)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class MonthSeries:
+    """Value columns of one monthly sheet laid out on a dense month axis.
+
+    Each column is stored as a prefix sum (window sums) and as the value of the latest row
+    per month (latest-in-window), so both are two array lookups keyed by ``pd.Period``.
+    Missing values count as 0, matching ``to_num_series(..., 0)``.
+    """
+
+    def __init__(self, df: pd.DataFrame, dt_col: str, value_cols: List[str]):
+        months = pd.PeriodIndex(df[dt_col], freq="M")
+        valid = ~months.isna()
+        ordinals = months.asi8[valid]
+        self.first = int(ordinals.min()) if len(ordinals) else 0
+        self.size = int(ordinals.max()) - self.first + 1 if len(ordinals) else 0
+
+        pos = ordinals - self.first
+        order = np.argsort(pos, kind="stable")
+        pos_sorted = pos[order]
+        is_last = np.r_[pos_sorted[1:] != pos_sorted[:-1], True] if len(pos_sorted) else np.array([], dtype=bool)
+        last_row = np.full(self.size, -1, dtype=np.int64)
+        last_row[pos_sorted[is_last]] = order[is_last]  # later rows win within a month
+
+        # latest[i]: the latest month <= i that has a row, or -1.
+        slots = np.arange(self.size)
+        self._latest = np.maximum.accumulate(np.where(last_row >= 0, slots, -1)) if self.size else slots
+
+        self._cumsum: Dict[str, np.ndarray] = {}
+        self._last: Dict[str, np.ndarray] = {}
+        for col in value_cols:
+            if col not in df.columns:
+                continue
+            vals = to_num_series(df[col], 0).to_numpy(dtype="float64")[valid]
+            sums = np.zeros(self.size + 1)
+            np.add.at(sums, pos + 1, vals)
+            self._cumsum[col] = np.cumsum(sums)
+            self._last[col] = np.where(last_row >= 0, vals[np.maximum(last_row, 0)] if len(vals) else 0.0, np.nan)
+
+    def __contains__(self, col: str) -> bool:
+        return col in self._cumsum
+
+    def _bounds(self, start_p: pd.Period, end_p: pd.Period) -> Tuple[int, int]:
+        lo = max(start_p.ordinal - self.first, 0)
+        hi = min(end_p.ordinal - self.first, self.size - 1)
+        return lo, hi
+
+    def window_sum(self, col: str, start_p: pd.Period, end_p: pd.Period) -> float:
+        if col not in self._cumsum:
+            return 0.0
+        lo, hi = self._bounds(start_p, end_p)
+        if hi < lo:
+            return 0.0
+        sums = self._cumsum[col]
+        return float(sums[hi + 1] - sums[lo])
+
+    def window_last(self, col: str, start_p: pd.Period, end_p: pd.Period) -> float:
+        """Value of the latest row dated inside the window (0.0 when the window has none)."""
+        if col not in self._last:
+            return 0.0
+        lo, hi = self._bounds(start_p, end_p)
+        if hi < lo:
+            return 0.0
+        slot = int(self._latest[hi])
+        if slot < lo:
+            return 0.0
+        return float(self._last[col][slot])
+
+
+@dataclass
+class Bundle:
+    data: Mapping[str, Optional[pd.DataFrame]]
+    month_periods: List[pd.Period]
+    updated_str: str
+
+    total_enrolls: int
+    total_unique: int
+    total_badges: int
+    current_mau: int
+
+    sheet_digests: Dict[str, str] = field(default_factory=dict)  # content digest per sheet key
+    sheet_sources: Dict[str, str] = field(default_factory=dict)  # "memory" | "snapshot" | "serial" | "parallel" | "events" | "sqlite"
+    sheet_timings: Dict[str, float] = field(default_factory=dict)  # seconds per sheet read or parsed
+    missing_sheets: List[str] = field(default_factory=list)
+    events_error: Optional[str] = None  # why new event partitions weren't folded in (event sheets are from before)
+    unmatched_countries: List[str] = field(default_factory=list)  # Country names with no ISO-3 code
+    version: int = 0  # assigned by BundleStore when the Bundle becomes active
+    month_series: Dict[str, MonthSeries] = field(default_factory=dict)  # per MONTH_SERIES key
+    time_index: Dict[str, pd.DatetimeIndex] = field(default_factory=dict)  # sorted dates of the dated rows
+    period_pos: Dict[pd.Period, int] = field(default_factory=dict)  # month_periods position
+    database: Optional[SheetDatabase] = None  # set when BACKEND == "sqlite" and the sync succeeded
+    sql_tables: Dict[str, str] = field(default_factory=dict)  # sheet key -> its table in database (non-empty sheets)
+
+    def memory_report(self) -> pd.DataFrame:
+        return memory_report(self.data)
+
+    def sheet_version(self, key: str) -> str:
+        """Cache token for one sheet: its content digest (already salted with CACHE_VERSION)."""
+        return self.sheet_digests.get(key, "")
+
+    def window_sum(self, key: str, col: str, start_p: Optional[pd.Period], end_p: Optional[pd.Period]) -> float:
+        series = self.month_series.get(key)
+        if series is None or start_p is None or end_p is None:
+            return 0.0
+        table = self.sql_tables.get(key)
+        if table is not None and col in series:
+            return self.database.window_sum(table, MONTH_SERIES[key][0], col, start_p.start_time, end_p.end_time)
+        return series.window_sum(col, start_p, end_p)
+
+    def window_last(self, key: str, col: str, start_p: Optional[pd.Period], end_p: Optional[pd.Period]) -> float:
+        series = self.month_series.get(key)
+        if series is None or start_p is None or end_p is None:
+            return 0.0
+        table = self.sql_tables.get(key)
+        if table is not None and col in series:
+            return self.database.window_last(table, MONTH_SERIES[key][0], col, start_p.start_time, end_p.end_time)
+        return series.window_last(col, start_p, end_p)
+
+    def top_n(self, key: str, n: int) -> Optional[pd.DataFrame]:
+        """First ``n`` rows of a ranked sheet (TOP_N_COLUMNS only): a slice, so nothing is cached per N."""
+        table = self.sql_tables.get(key)
+        if table is not None:
+            if not all(c in self.database.columns(table) for c in TOP_N_COLUMNS[key]):
+                return None
+            return self.database.head(table, TOP_N_COLUMNS[key], n)
+        df = self.data.get(key)
+        if not is_valid_df(df) or not has_cols(df, TOP_N_COLUMNS[key]):
+            return None
+        return df[TOP_N_COLUMNS[key]].head(n)
+
+    def course_perf(self, limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """Course sheet left-joined with completion rates, in course rank order; the first ``limit`` rows when given."""
+        if "Course" in self.sql_tables:
+            table = course_perf_table(self)
+            return None if table is None else self.database.head(table, n=limit)
+        data = self.data
+        if not (is_valid_df(data.get("Course")) and is_valid_df(data.get("Completion"))):
+            return None
+        versions = (self.sheet_version("Course"), self.sheet_version("Completion"))
+        perf = compute_course_perf(data["Course"], data["Completion"], *versions)
+        return perf if perf is None or limit is None else perf.head(limit)
+
+    def course_search(self) -> Optional[Any]:
+        """Search over course_perf() rows: a CourseSearchIndex, or a SqlCourseSearch on the SQLite backend."""
+        if "Course" in self.sql_tables:
+            table = course_perf_table(self)
+            return None if table is None else SqlCourseSearch(self.database, table)
+        perf = self.course_perf()
+        if not is_valid_df(perf):
+            return None
+        return course_search_index(perf, self.sheet_version("Course"), self.sheet_version("Completion"))
+
+    def course_opportunity(self) -> Optional[Tuple[str, int, float]]:
+        """(course, sign-ups, avg completion %) of the least-completed course among the high-volume ones.
+
+        High volume is at or above the 80th sign-up percentile (the median under ten courses);
+        ties go to more sign-ups, then to rank order.
+        """
+        cols = ["Course", "Sign Ups", "Avg Completion %"]
+        if "Course" in self.sql_tables:
+            table = course_perf_table(self)
+            if table is None or not all(c in self.database.columns(table) for c in cols):
+                return None
+            return sql_course_opportunity(self.database, table)
+        perf = self.course_perf()
+        if not is_valid_df(perf) or not has_cols(perf, cols):
+            return None
+        perf2 = perf.copy()
+        perf2["Sign Ups"] = to_num_series(perf2["Sign Ups"], 0)
+        perf2["Avg Completion %"] = to_num_series(perf2["Avg Completion %"], 0.0)
+        cutoff = perf2["Sign Ups"].quantile(0.80) if len(perf2) >= 10 else perf2["Sign Ups"].median()
+        high = perf2[perf2["Sign Ups"] >= cutoff]
+        if high.empty:
+            return None
+        cand = high.sort_values(["Avg Completion %", "Sign Ups"], ascending=[True, False]).iloc[0]
+        return (str(cand["Course"]), int(cand["Sign Ups"]), float(cand["Avg Completion %"]))
+
+    def time_slice(self, key: str, start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> Optional[pd.DataFrame]:
+        """Rows of a time sheet dated within [start_dt, end_dt]: a binary-search slice, not a masked copy."""
+        df = self.data.get(key)
+        index = self.time_index.get(key)
+        if index is None or not is_valid_df(df):
+            return filter_range(df, MONTH_SERIES[key][0], start_dt, end_dt)
+        lo = index.searchsorted(start_dt, side="left")
+        hi = index.searchsorted(end_dt, side="right")
+        return df.iloc[lo:hi]
+
+
+# =========================
+# 3b) MEMORY-BUDGETED CACHE
+# =========================
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+def estimate_nbytes(obj: Any) -> int:
+    """Approximate resident size of a cached value."""
+    if obj is None:
+        return 0
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(index=True, deep=True)))
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(o) for o in obj)
+    if isinstance(obj, np.ndarray) and obj.dtype == object:
+        return obj.nbytes + sum(sys.getsizeof(o) for o in obj.flat)
+    if callable(getattr(obj, "to_plotly_json", None)):  # a Plotly figure, without serialising it
+        return FIGURE_BASE_BYTES + sum(
+            estimate_nbytes(getattr(trace, prop, None)) for trace in obj.data for prop in FIGURE_ARRAY_PROPS
+        )
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(obj)
+
+
+class BudgetCache:
+    """Process-wide LRU with a byte budget, shared by the loader, derived tables and figures.
+
+    Entries are grouped by namespace (one per cached function) for the hit/miss/eviction
+    counters shown in the admin view. An insert that takes the total past ``max_bytes``
+    evicts least-recently-used entries from any namespace. A value bigger than the whole
+    budget is handed back but not kept. Entries older than ``ttl_seconds`` are dropped
+    when they are next looked up, and the lookup counts as a miss.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, int, float]]" = OrderedDict()
+        self._stats: Dict[str, CacheStats] = {}
+        self._bytes = 0
+
+    @property
+    def used_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, ns: str, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            stats = self._stats.setdefault(ns, CacheStats())
+            entry = self._entries.get((ns, key))
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._drop((ns, key))
+                entry = None
+            if entry is None:
+                stats.misses += 1
+                return False, None
+            self._entries.move_to_end((ns, key))
+            stats.hits += 1
+            return True, entry[0]
+
+    def put(self, ns: str, key: Hashable, value: Any) -> None:
+        size = estimate_nbytes(value)
+        with self._lock:
+            if (ns, key) in self._entries:
+                self._drop((ns, key))
+            if size > self.max_bytes:
+                return
+            self._entries[(ns, key)] = (value, size, time.monotonic())
+            self._bytes += size
+            stats = self._stats.setdefault(ns, CacheStats())
+            stats.entries += 1
+            stats.bytes += size
+            while self._bytes > self.max_bytes:
+                victim = next(iter(self._entries))
+                self._drop(victim)
+                self._stats[victim[0]].evictions += 1
+
+    def get_or_compute(self, ns: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        # Computed outside the lock; two sessions racing on one key just compute it twice.
+        found, value = self.get(ns, key)
+        if not found:
+            value = compute()
+            self.put(ns, key, value)
+        return value
+
+    def discard(self, ns: str, keep: Callable[[Hashable], bool]) -> None:
+        """Evict the entries of ``ns`` whose key fails ``keep``."""
+        with self._lock:
+            for full_key in [k for k in self._entries if k[0] == ns and not keep(k[1])]:
+                self._drop(full_key)
+                self._stats[ns].evictions += 1
+
+    def clear(self, ns: Optional[str] = None) -> None:
+        with self._lock:
+            for full_key in [k for k in self._entries if ns is None or k[0] == ns]:
+                self._drop(full_key)
+
+    def stats(self) -> Dict[str, CacheStats]:
+        with self._lock:
+            return {ns: CacheStats(**vars(st_)) for ns, st_ in self._stats.items()}
+
+    def _drop(self, full_key: Tuple[str, Hashable]) -> None:
+        _, size, _ = self._entries.pop(full_key)
+        self._bytes -= size
+        stats = self._stats[full_key[0]]
+        stats.entries -= 1
+        stats.bytes -= size
+
+@process_singleton
+def budget_cache() -> BudgetCache:
+    return BudgetCache(CACHE_MAX_BYTES, ttl_seconds=CACHE_TTL_SECONDS)
+
+
+# =========================
+# 4) SHEET PREPARATION
+# =========================
+def sheet_source_columns(key: str) -> Optional[FrozenSet[str]]:
+    """Workbook headers to read for a sheet, or None to read every column."""
+    schema = SHEET_SCHEMAS.get(key)
+    if schema is None:
+        return None
+    inverse = {new: old for old, new in SHEET_RENAMES.get(key, {}).items()}
+    return frozenset(inverse.get(col, col) for col in schema)
+
+def apply_schema(key: str, df: pd.DataFrame) -> None:
+    schema = SHEET_SCHEMAS.get(key)
+    if not schema:
+        return
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype in ("Int32", "float32"):
+            num = pd.to_numeric(df[col], errors="coerce")
+            valid = num.dropna()
+            if dtype == "Int32" and valid.eq(valid.round()).all():
+                df[col] = num.astype("Int32")
+            else:
+                # Non-integral values in a count column keep their fractions rather than failing the load.
+                df[col] = num.astype("float32")
+        elif dtype == "datetime":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        else:
+            df[col] = df[col].astype(dtype)
+
+def prepare_sheet(key: str, df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """Apply renames and derived columns (Month_dt, Cohort_dt, ShortName) to one sheet in place."""
+    if not is_valid_df(df):
+        return df
+
+    if key in SHEET_RENAMES:
+        df.rename(columns=SHEET_RENAMES[key], inplace=True)
+    apply_schema(key, df)
+    sort_col = None
+
+    if key == "Monthly_Enroll":
+        if "Month" in df.columns:
+            df["Month_dt"] = month_end_from_mmm_yyyy(df["Month"])
+            sort_col = "Month_dt"
+
+    elif key == "Monthly_Unique":
+        if "Month" in df.columns:
+            df["Month_dt"] = month_end_from_mmm_yyyy(df["Month"])
+            sort_col = "Month_dt"
+
+    elif key == "MAU":
+        if "Month" in df.columns:
+            df["Month_dt"] = month_end_from_mmm_yyyy(df["Month"])
+            sort_col = "Month_dt"
+
+    elif key == "Badges_Monthly":
+        if "Month" in df.columns:
+            df["Month_dt"] = month_end_from_mmm_yyyy(df["Month"])
+            sort_col = "Month_dt"
+
+    elif key == "Activation":
+        if "Cohort" in df.columns:
+            df["Cohort_dt"] = month_end_from_mmm_yyyy(df["Cohort"])
+            sort_col = "Cohort_dt"
+
+    elif key == "Retention":
+        if "Cohort" in df.columns:
+            df["Cohort_dt"] = month_end_from_mmm_yyyy(df["Cohort"])
+            sort_col = "Cohort_dt"
+
+    elif key == "Country":
+        if "Country" in df.columns:
+            df["ISO3"] = df["Country"].map(resolve_iso3)
+
+    elif key == "Course":
+        if "Course" in df.columns:
+            df["ShortName"] = build_shortname(df["Course"])
+
+    elif key == "Completion":
+        if "Avg Completion %" in df.columns:
+            df["Avg Completion %"] = to_num_series(df["Avg Completion %"], 0.0)
+
+    if sort_col is not None:
+        df.sort_values(sort_col, kind="stable", na_position="last", ignore_index=True, inplace=True)
+    if key in RANKED_SHEETS:
+        rank_sheet(df, *RANKED_SHEETS[key])
+    if SHEET_SCHEMAS.get(key):
+        compact_frame(df)
+    return df
+
+# Nullable integer dtypes from narrowest to widest, with the largest magnitude each holds.
+_COMPACT_INTS = [("Int8", 2 ** 7 - 1), ("Int16", 2 ** 15 - 1), ("Int32", 2 ** 31 - 1)]
+
+def compact_frame(df: pd.DataFrame, category_ratio: float = 0.5) -> None:
+    """Shrink column dtypes in place.
+
+    Integer columns get the narrowest nullable dtype that still holds ``max|x|`` times
+    (rows + columns), so sums down a column or across a row cannot overflow it. Integral
+    float64 becomes a nullable int, exactly. Other float64 becomes float32, which is lossy:
+    it keeps about 7 significant digits (39.523077 reads back as 39.523075), ample for the
+    rates and percentages the dashboard shows to one decimal. A string column with at most
+    ``category_ratio`` distinct values per row becomes a categorical, so each repeated label
+    is stored once.
+    """
+    headroom = len(df) + len(df.columns)
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s.dtype):
+            continue
+        if pd.api.types.is_float_dtype(s.dtype) and s.dtype.itemsize > 4:
+            valid = s.dropna()
+            if valid.eq(valid.round()).all() and valid.abs().max(skipna=True) < 2 ** 31:
+                s = s.astype("Int64")
+            else:
+                df[col] = s.astype("float32")
+                continue
+        if pd.api.types.is_integer_dtype(s.dtype):
+            bound = (0 if s.isna().all() else int(s.abs().max())) * headroom
+            target = next((name for name, top in _COMPACT_INTS if bound <= top), "Int64")
+            if str(s.dtype) != target:
+                df[col] = s.astype(target)
+        elif pd.api.types.is_string_dtype(s.dtype) and len(s) > 1:
+            if s.nunique() <= len(s) * category_ratio:
+                df[col] = s.astype("category")
+
+def memory_report(data: Mapping[str, Optional[pd.DataFrame]]) -> pd.DataFrame:
+    """Resident bytes per sheet column (deep, so string payloads count), largest first within a sheet."""
+    rows = []
+    for key, df in data.items():
+        if not is_valid_df(df):
+            continue
+        usage = df.memory_usage(index=True, deep=True)
+        for col, nbytes in usage.items():
+            rows.append({
+                "Sheet": key,
+                "Column": col,
+                "Dtype": str(df[col].dtype) if col != "Index" else str(df.index.dtype),
+                "Rows": len(df),
+                "Bytes": int(nbytes),
+            })
+    report = pd.DataFrame(rows, columns=["Sheet", "Column", "Dtype", "Rows", "Bytes"])
+    return report.sort_values(["Sheet", "Bytes"], ascending=[True, False], kind="stable", ignore_index=True)
+
+def rank_sheet(df: pd.DataFrame, value_col: str, name_col: str) -> None:
+    """Reorder rows in place: value descending, ties broken by name, unnamed rows last among ties."""
+    if not has_cols(df, [value_col, name_col]):
+        return
+    df[value_col] = df[value_col].fillna(0)
+    df.sort_values([value_col, name_col], ascending=[False, True], kind="stable", na_position="last", ignore_index=True, inplace=True)
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """Content token for a frame that has no workbook digest (salted like the workbook's)."""
+    h = hashlib.sha256(CACHE_VERSION.encode("utf-8"))
+    h.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def build_bundle(
+    data: Mapping[str, Optional[pd.DataFrame]],
+    mtime_sec: int,
+    sheet_digests: Optional[Mapping[str, str]] = None,
+) -> Bundle:
+    """Bundle over prepared sheets.
+
+    ``sheet_digests`` are the per-sheet version tokens that key every derived-table cache;
+    load_raw passes the workbook's. Without them each sheet is hashed, so two Bundles built
+    from different frames (a batch job, a benchmark) never share cached results.
+    """
+    if sheet_digests is None:
+        sheet_digests = {key: frame_digest(df) for key, df in data.items() if is_valid_df(df)}
+    month_periods: List[pd.Period] = []
+    for key, col in [
+        ("Monthly_Unique", "Month_dt"),
+        ("Monthly_Enroll", "Month_dt"),
+        ("MAU", "Month_dt"),
+        ("Activation", "Cohort_dt"),
+    ]:
+        df = data.get(key)
+        if is_valid_df(df) and col in df.columns:
+            s = df[col].dropna()
+            if not s.empty:
+                month_periods = s.dt.to_period("M").sort_values().unique().tolist()
+                break
+
+    total_enrolls = 0
+    if is_valid_df(data.get("Course")) and "Sign Ups" in data["Course"].columns:
+        total_enrolls = to_int_safe(to_num_series(data["Course"]["Sign Ups"], 0).sum(), 0)
+
+    total_unique = get_metric_value(data.get("User_Segmentation"), "Total Users")
+    if total_unique == 0 and is_valid_df(data.get("Monthly_Unique")) and "Unique User Signups" in data["Monthly_Unique"].columns:
+        total_unique = to_int_safe(to_num_series(data["Monthly_Unique"]["Unique User Signups"], 0).sum(), 0)
+
+    current_mau = 0
+    if is_valid_df(data.get("MAU")) and "MAU" in data["MAU"].columns:
+        current_mau = to_int_safe(data["MAU"].iloc[-1]["MAU"], 0)
+
+    total_badges = 0
+    df_b = data.get("Badges_Issued")
+    if is_valid_df(df_b):
+        if has_cols(df_b, ["Metric", "Count"]):
+            total_badges = get_metric_value(df_b, "Total Sent")
+        else:
+            try:
+                c0, c1 = df_b.columns[0], df_b.columns[1]
+                match = df_b.loc[df_b[c0].astype(str).eq("Total Sent"), c1]
+                if not match.empty:
+                    total_badges = to_int_safe(match.iloc[0], 0)
+            except (IndexError, KeyError, ValueError, TypeError):
+                total_badges = 0
+
+    month_series: Dict[str, MonthSeries] = {}
+    time_index: Dict[str, pd.DatetimeIndex] = {}
+    for key, (col, value_cols) in MONTH_SERIES.items():
+        df = data.get(key)
+        if is_valid_df(df) and col in df.columns:
+            month_series[key] = MonthSeries(df, col, value_cols)
+            dates = pd.DatetimeIndex(df[col])
+            dated = dates[: int(dates.notna().sum())]
+            if dated.notna().all() and dated.is_monotonic_increasing:
+                time_index[key] = dated
+
+    unmatched_countries: List[str] = []
+    df_geo = data.get("Country")
+    if is_valid_df(df_geo) and "ISO3" in df_geo.columns:
+        names = df_geo.loc[df_geo["ISO3"].isna(), "Country"].astype(str)
+        unmatched_countries = sorted(names.fillna("(blank)").unique())  # a row with no name can't be mapped either
+
+    updated_str = (
+        dt.datetime.fromtimestamp(mtime_sec).strftime("%Y-%m-%d %H:%M")
+        if mtime_sec
+        else dt.datetime.now().strftime("%Y-%m-%d %H:%M")
+    )
+
+    return Bundle(
+        data=data,
+        month_periods=month_periods,
+        updated_str=updated_str,
+        total_enrolls=total_enrolls,
+        total_unique=total_unique,
+        total_badges=total_badges,
+        current_mau=current_mau,
+        month_series=month_series,
+        time_index=time_index,
+        period_pos={p: i for i, p in enumerate(month_periods)},
+        unmatched_countries=unmatched_countries,
+        sheet_digests=dict(sheet_digests),
+    )
+
+
+# =========================
+# 4a) SNAPSHOT CACHE (PARQUET, KEYED BY CONTENT)
+# =========================
+# Post-processed sheets are persisted as one Parquet file per sheet, named after the sheet's
+# content digest (which already folds in CACHE_VERSION). A server restart or TTL expiry reads
+# columnar files instead of re-running openpyxl, and only edited sheets are ever reparsed.
+def snapshot_path(key: str, digest: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{key}-{digest}.parquet")
+
+def read_sheet_snapshot(key: str, digest: str) -> Optional[pd.DataFrame]:
+    try:
+        return pd.read_parquet(snapshot_path(key, digest))
+    except (OSError, ValueError, TypeError, ImportError):
+        return None
+
+def write_sheet_snapshot(key: str, digest: str, df: pd.DataFrame) -> None:
+    final_path = snapshot_path(key, digest)
+    if os.path.exists(final_path):
+        return
+    tmp_path = f"{final_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, final_path)
+    except (OSError, ValueError, TypeError, ImportError, NotImplementedError):
+        # Snapshot is an optimisation only: an unwritable dir or a column Arrow can't
+        # represent just means the next cold start parses this sheet again.
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        return
+    prune_sheet_snapshots(key, keep=SNAPSHOT_KEEP)
+
+def prune_sheet_snapshots(key: str, keep: int) -> None:
+    try:
+        entries = [e for e in os.scandir(SNAPSHOT_DIR) if e.name.startswith(f"{key}-") and e.name.endswith(".parquet")]
+    except OSError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for e in entries[keep:]:
+        with contextlib.suppress(OSError):
+            os.remove(e.path)
+
+
+# =========================
+# 4b) LOAD RAW
+# =========================
+def resolve_load_mode(file_path: str, mode: str = LOAD_MODE) -> str:
+    if mode != "auto":
+        return mode
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        return "serial"
+    return "parallel" if size >= PARALLEL_MIN_BYTES else "serial"
+
+@contextlib.contextmanager
+def _main_hidden() -> Iterator[None]:
+    """Start worker processes without ``__main__``.
+
+    Under Streamlit ``__main__`` is the app script, and spawn/forkserver children re-run the
+    parent's main module. The workers only need ``workbook``, so hand them a blank one.
+    """
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+def _worker_context() -> multiprocessing.context.BaseContext:
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["workbook"])  # the server imports pandas once for all workers
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+def _stop_pool(pool: ProcessPoolExecutor, kill: bool) -> None:
+    # Workers are started on submit, so the private process map is complete here (3.14 adds
+    # a public terminate_workers()). Grab it first: shutdown() drops it.
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=not kill, cancel_futures=True)
+    if kill:
+        for proc in processes:
+            proc.terminate()
+
+def parse_sheets_parallel(
+    file_path: str,
+    wanted: Dict[str, str],
+    engine: str,
+    timeout: float = PARALLEL_TIMEOUT_SECONDS,
+) -> Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, float]]]:
+    # No fork: the server is multi-threaded (sessions, the watcher), and a forked child can
+    # inherit a lock some other thread held. The caller holds the loader's lock, so a pool
+    # that breaks or runs past ``timeout`` is abandoned (workers killed) and we report
+    # failure; the caller then parses serially.
+    if not wanted:
+        return None
+    workers = max(1, min(len(wanted), PARALLEL_MAX_WORKERS, os.cpu_count() or 1))
+    pool = None
+    finished = False
+    try:
+        with _main_hidden():
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context())
+            futures = {
+                key: pool.submit(read_sheet_timed, file_path, sheet_name, sheet_source_columns(key), engine)
+                for key, sheet_name in wanted.items()
+            }
+        _, pending = wait(futures.values(), timeout=timeout)
+        if pending:
+            return None
+        results = {key: fut.result() for key, fut in futures.items()}
+        finished = True
+    except (BrokenProcessPool, OSError):
+        return None
+    finally:
+        if pool is not None:
+            _stop_pool(pool, kill=not finished)
+    return {k: r[0] for k, r in results.items()}, {k: r[1] for k, r in results.items()}
+
+def parse_sheets(
+    file_path: str,
+    wanted: Dict[str, str],
+    mode: str = LOAD_MODE,
+    engine: str = XLSX_ENGINE,
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, float], str]:
+    """Parse and prepare only the requested {sheet key: sheet name} pairs."""
+    source = resolve_load_mode(file_path, mode)
+    parsed = parse_sheets_parallel(file_path, wanted, engine) if source == "parallel" else None
+    if parsed is None:
+        source = "serial"
+        frames: Dict[str, pd.DataFrame] = {}
+        timings: Dict[str, float] = {}
+        reader = StreamWorkbook(file_path) if engine == "stream" else pd.ExcelFile(file_path)
+        for key, sheet_name in wanted.items():
+            frames[key], timings[key] = read_sheet_timed(reader, sheet_name, sheet_source_columns(key), engine)
+    else:
+        frames, timings = parsed
+
+    for key in list(frames):
+        frames[key] = prepare_sheet(key, frames[key])
+    return frames, timings, source
+
+def load_raw(file_path: str, workbook_key: str, cache_version: str) -> Optional[Bundle]:
+    if not os.path.exists(file_path):
+        return None
+
+    # The engine is part of the digest so switching it never reuses the other engine's snapshots.
+    digests = sheet_digests(file_path, salt=f"{cache_version}:{XLSX_ENGINE}")
+    # Prepared frames are cached under (sheet key, digest), so an unchanged sheet is reused.
+    cache = budget_cache()
+
+    data: Dict[str, Optional[pd.DataFrame]] = {}
+    sources: Dict[str, str] = {}
+    timings: Dict[str, float] = {}
+    missing: List[str] = []
+    event_frames: Dict[str, pd.DataFrame] = {}
+    events_error = None
+    if os.path.isdir(EVENTS_DIR):
+        event_frames, events_digest, events_source, events_seconds, events_error = load_event_sheets(cache, cache_version)
+        for key, df in event_frames.items():
+            data[key], sources[key] = df, events_source
+            if events_source != "memory":
+                timings[key] = events_seconds
+    database = None
+    offloaded: List[str] = []  # SQLITE_ONLY_SHEETS served from the database, not kept in memory
+    if BACKEND == "sqlite":
+        try:
+            database = sheet_database()
+            tables = [table_name(key, digests[SHEET_MAP[key]]) for key in SQLITE_ONLY_SHEETS if SHEET_MAP[key] in digests]
+            if len(tables) == len(SQLITE_ONLY_SHEETS) and all(database.has_rows(t) for t in tables):
+                offloaded = list(SQLITE_ONLY_SHEETS)
+        except (OSError, sqlite3.Error):
+            database = None  # like the snapshots, the database is an optimisation: serve from pandas
+    for key in offloaded:
+        data[key], sources[key] = None, "sqlite"
+
+    def read_sheets(keys: List[str]) -> None:
+        to_parse: Dict[str, str] = {}
+        for key in keys:
+            sheet_name = SHEET_MAP[key]
+            digest = digests.get(sheet_name)
+            data[key] = None
+            if digest is None:
+                missing.append(sheet_name)
+                continue
+            found, df = cache.get("sheets", (key, digest))
+            if found:
+                data[key], sources[key] = df, "memory"
+                continue
+            t0 = time.perf_counter()
+            df = read_sheet_snapshot(key, digest)
+            if df is not None:
+                data[key], sources[key], timings[key] = df, "snapshot", time.perf_counter() - t0
+                continue
+            to_parse[key] = sheet_name
+        if to_parse:
+            frames, parse_timings, mode = parse_sheets(file_path, to_parse)
+            for key, df in frames.items():
+                data[key], sources[key], timings[key] = df, mode, parse_timings[key]
+                write_sheet_snapshot(key, digests[to_parse[key]], df)
+
+    read_sheets([key for key in SHEET_MAP if key not in event_frames and key not in offloaded])
+
+    versions = {key: digests[name] for key, name in SHEET_MAP.items() if name in digests and key not in event_frames}
+    if event_frames:
+        versions.update(dict.fromkeys(event_frames, events_digest))
+
+    sql_tables: Dict[str, str] = {}
+    if database is not None:
+        try:
+            database.sync({key: data[key] for key in SQLITE_SHEETS if data.get(key) is not None}, versions, SQLITE_INDEXES)
+            for key in SQLITE_SHEETS:
+                if key in versions and database.has_rows(table_name(key, versions[key])):
+                    sql_tables[key] = table_name(key, versions[key])
+        except (OSError, sqlite3.Error, ValueError):
+            database, sql_tables = None, {}
+            read_sheets([key for key in offloaded if data[key] is None])  # tables we counted on are unreadable
+            offloaded = []
+        else:
+            # Both or neither: the course-performance join needs the two sheets in one place.
+            if all(key in sql_tables for key in SQLITE_ONLY_SHEETS):
+                for key in SQLITE_ONLY_SHEETS:
+                    data[key] = None
+                    if sources.get(key) == "memory":
+                        sources[key] = "sqlite"
+                offloaded = list(SQLITE_ONLY_SHEETS)
+            else:
+                for key in SQLITE_ONLY_SHEETS:
+                    sql_tables.pop(key, None)
+
+    current = {(key, versions[key]) for key in SHEET_MAP if key in versions and key not in event_frames and key not in offloaded}
+    if event_frames:
+        current.add(("events", events_digest))
+    for key, df in data.items():
+        if df is not None and sources.get(key) not in ("memory", "events"):
+            cache.put("sheets", (key, versions[key]), df)
+    cache.discard("sheets", keep=current.__contains__)
+
+    bundle = build_bundle(FrozenFrames(data), file_mtime_seconds(file_path), versions)
+    bundle.missing_sheets = missing
+    bundle.events_error = events_error
+    bundle.sheet_sources = sources
+    bundle.sheet_timings = timings
+    bundle.database, bundle.sql_tables = database, sql_tables
+    if "Course" in offloaded and "Sign Ups" in database.columns(sql_tables["Course"]):
+        bundle.total_enrolls = to_int_safe(database.total(sql_tables["Course"], "Sign Ups"), 0)
+    return bundle
+
+def load_event_sheets(cache: BudgetCache, cache_version: str) -> Tuple[Dict[str, pd.DataFrame], str, str, float, Optional[str]]:
+    """Fold new event partitions into the state; return its prepared sheets, digest, source, seconds and error.
+
+    All event sheets share one digest, taken over the manifest of processed partitions, and
+    are cached together under ("events", digest). If the ingest fails (say a partition is
+    missing a column) nothing is published, so the sheets come from the last published
+    state, or from the workbook when there is none yet, and the error is returned for the
+    app to show. The next load retries.
+    """
+    store = event_store()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        store.ingest()
+    except Exception as exc:  # a bad partition must not take the dashboard down
+        error = f"{type(exc).__name__}: {exc}"
+    digest = hashlib.sha256(f"{cache_version}:{store.digest()}".encode("utf-8")).hexdigest()[:16]
+    found, cached = cache.get("sheets", ("events", digest))
+    if found:
+        return dict(cached), digest, "memory", 0.0, error
+    frames = {key: prepare_sheet(key, df) for key, df in store.state().sheets().items()}
+    cache.put("sheets", ("events", digest), tuple(frames.items()))
+    return frames, digest, "events", time.perf_counter() - t0, error
+
+def source_stamp(file_path: str) -> str:
+    """BundleStore key for the data sources: the workbook stamp, plus the event partition listing."""
+    stamp = workbook_stamp(file_path)
+    if stamp and os.path.isdir(EVENTS_DIR):
+        stamp += ":" + event_store().stamp()
+    return stamp
+
+@process_singleton
+def event_store() -> EventStore:
+    return EventStore(EVENTS_DIR, EVENTS_STATE_DIR, chunk_rows=EVENT_CHUNK_ROWS)
+
+@process_singleton
+def sheet_database() -> SheetDatabase:
+    os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
+    return SheetDatabase(SQLITE_PATH, keep=SNAPSHOT_KEEP)
+
+
+
+# =========================
+# 4c) VERSIONED BUNDLE STORE (SINGLE-FLIGHT + STALE-WHILE-REVALIDATE)
+# =========================
+class BundleStore:
+    """Process-wide registry of Bundle versions with one active version.
+
+    Only one load runs at a time. A cold store makes callers wait for that load; once a
+    Bundle exists, an expired TTL, a new workbook stamp or an explicit refresh builds the
+    next version on a background thread and swaps it in atomically, while callers keep
+    getting the current one. The store only holds the active version strongly: an older
+    version stays alive exactly as long as some running session still references it.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._state_lock = threading.Lock()  # guards the fields below
+        self._load_lock = threading.Lock()  # held for the duration of a load (single flight)
+        self._bundle: Optional[Bundle] = None
+        self._key: Optional[Tuple[str, str, str]] = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+        self._next_version = 1
+        self._live: "weakref.WeakValueDictionary[int, Bundle]" = weakref.WeakValueDictionary()
+        self.last_error: Optional[str] = None
+
+    @property
+    def refreshing(self) -> bool:
+        return self._refreshing
+
+    @property
+    def active_version(self) -> int:
+        bundle = self._bundle
+        return bundle.version if bundle is not None else 0
+
+    def live_versions(self) -> List[int]:
+        """Versions still referenced somewhere (the active one plus any pinned by running sessions)."""
+        with self._state_lock:
+            return sorted(self._live.keys())
+
+    def get(self, file_path: str, workbook_key: str, cache_version: str) -> Optional[Bundle]:
+        key = (file_path, workbook_key, cache_version)
+        with self._state_lock:
+            bundle, current_key = self._bundle, self._key
+            expired = time.monotonic() - self._loaded_at >= self.ttl_seconds
+
+        if bundle is not None:
+            if current_key != key or expired:
+                self._refresh_in_background(key)
+            return bundle
+
+        with self._load_lock:
+            return self._load(key)  # returns the waited-for Bundle if another session just loaded it
+
+    def refresh(self, file_path: str, workbook_key: str, cache_version: str) -> None:
+        """Build the next version in the background even if the workbook looks unchanged."""
+        self._refresh_in_background((file_path, workbook_key, cache_version), force=True)
+
+    def load_now(self, file_path: str, workbook_key: str, cache_version: str) -> Optional[Bundle]:
+        """Load synchronously on the calling (non-request) thread and swap the result in."""
+        with self._load_lock:
+            return self._load((file_path, workbook_key, cache_version))
+
+    def _load(self, key: Tuple[str, str, str], force: bool = False) -> Optional[Bundle]:
+        # Caller holds _load_lock. A load that queued behind one for the same key reuses it.
+        with self._state_lock:
+            fresh = time.monotonic() - self._loaded_at < self.ttl_seconds
+            if not force and self._bundle is not None and self._key == key and fresh:
+                return self._bundle
+        bundle = load_raw(*key)
+        if bundle is not None:
+            with self._state_lock:
+                bundle.version = self._next_version
+                self._next_version += 1
+                self._live[bundle.version] = bundle
+                self._bundle, self._key, self._loaded_at = bundle, key, time.monotonic()
+        return bundle
+
+    def _refresh_in_background(self, key: Tuple[str, str, str], force: bool = False) -> None:
+        with self._state_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, args=(key, force), name="bundle-refresh", daemon=True).start()
+
+    def _refresh(self, key: Tuple[str, str, str], force: bool) -> None:
+        try:
+            with self._load_lock:
+                self._load(key, force=force)
+            self.last_error = None
+        except Exception as exc:  # keep serving the previous Bundle; surface the failure instead
+            self.last_error = f"{type(exc).__name__}: {exc}"
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+
+@process_singleton
+def bundle_store() -> BundleStore:
+    return BundleStore(ttl_seconds=CACHE_TTL_SECONDS)
+
+
+# =========================
+# 5) LAZY COMPUTES (TAB-SCOPED CACHE)
+# =========================
+def readonly_view(obj: Any) -> Any:
+    if isinstance(obj, pd.DataFrame):
+        return obj.copy(deep=False)
+    if isinstance(obj, tuple):
+        return tuple(readonly_view(o) for o in obj)
+    return obj
+
+def shared_cache(func: Callable) -> Callable:
+    """Memoise a derived-table function in the BudgetCache: one shared result per key, no pickling.
+
+    As with st.cache_resource, underscore-prefixed parameters are left out of the key, and
+    ``*_version`` parameters stand in for them; a call with an empty version is not cached.
+    Unlike st.cache_data, a hit returns shallow Copy-on-Write views of the shared result
+    rather than an unpickled copy.
+    """
+    signature = inspect.signature(func)
+    ns = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple((name, value) for name, value in bound.arguments.items() if not name.startswith("_"))
+        if any(name.endswith("_version") and not value for name, value in key):
+            return func(*args, **kwargs)  # no version token for the frames: nothing safe to key on
+        return readonly_view(budget_cache().get_or_compute(ns, key, lambda: func(*args, **kwargs)))
+
+    wrapper.clear = lambda: budget_cache().clear(ns)
+    return wrapper
+
+# Frames are passed as underscore parameters, which shared_cache leaves out of the key;
+# the Bundle's sheet version token stands in for them, so a lookup never hashes a frame.
+@shared_cache
+def compute_course_perf(_df_course: pd.DataFrame, _df_completion: pd.DataFrame, course_version: str, completion_version: str) -> Optional[pd.DataFrame]:
+    if not is_valid_df(_df_course) or not is_valid_df(_df_completion):
+        return None
+    if "Course" not in _df_course.columns or "Course" not in _df_completion.columns:
+        return None
+    left_cols = [c for c in ["Course", "ShortName", "Sign Ups"] if c in _df_course.columns]
+    right_cols = ["Course"]
+    if "Avg Completion %" in _df_completion.columns:
+        right_cols.append("Avg Completion %")
+    perf = pd.merge(_df_course[left_cols], _df_completion[right_cols], on="Course", how="left")
+    if "Sign Ups" in perf.columns:
+        perf["Sign Ups"] = to_num_series(perf["Sign Ups"], 0)
+    if "Avg Completion %" in perf.columns:
+        perf["Avg Completion %"] = to_num_series(perf["Avg Completion %"], 0.0)
+    return perf
+
+class CourseSearchIndex:
+    """Trigram postings over lowercased course names for the course performance table.
+
+    Rows are numbered in the table's order, which is the course rank order, and postings
+    hold row numbers in ascending order, so a search result is already sorted and a page
+    of it is a slice. Matching is a literal, case-insensitive substring test.
+    """
+
+    GRAM = 3
+
+    def __init__(self, perf: pd.DataFrame):
+        self.table = perf.reset_index(drop=True)
+        self.names: List[str] = self.table["Course"].astype(str).fillna("").str.lower().tolist()
+        postings: Dict[str, List[int]] = {}
+        for row, name in enumerate(self.names):
+            for gram in {name[i:i + self.GRAM] for i in range(len(name) - self.GRAM + 1)}:
+                postings.setdefault(gram, []).append(row)
+        self._postings = {gram: np.asarray(rows, dtype=np.int64) for gram, rows in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            int(self.table.memory_usage(index=True, deep=True).sum())
+            + sum(len(name) for name in self.names)
+            + sum(rows.nbytes for rows in self._postings.values())
+        )
+
+    def search(self, query: str) -> np.ndarray:
+        """Row numbers (in display order) whose name contains ``query``."""
+        q = query.strip().lower()
+        if not q:
+            return np.arange(len(self.names))
+        if len(q) < self.GRAM:
+            candidates = np.arange(len(self.names))
+        else:
+            lists = [self._postings.get(q[i:i + self.GRAM]) for i in range(len(q) - self.GRAM + 1)]
+            if any(rows is None for rows in lists):
+                return np.array([], dtype=np.int64)
+            lists.sort(key=len)
+            candidates = lists[0]
+            for rows in lists[1:]:
+                candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        # Trigram hits are candidates only; confirm the full substring.
+        return np.array([row for row in candidates if q in self.names[row]], dtype=np.int64)
+
+    def rows(self, ids: np.ndarray) -> pd.DataFrame:
+        return self.table.iloc[ids]
+
+@shared_cache
+def course_search_index(_perf: pd.DataFrame, course_version: str, completion_version: str) -> Optional[CourseSearchIndex]:
+    if not is_valid_df(_perf) or "Course" not in _perf.columns:
+        return None
+    return CourseSearchIndex(_perf)
+
+def course_perf_table(bundle: Bundle) -> Optional[str]:
+    """Materialise compute_course_perf's join in the SQLite backend; returns the table name."""
+    database = bundle.database
+    course, completion = bundle.sql_tables.get("Course"), bundle.sql_tables.get("Completion")
+    if database is None or course is None or completion is None:
+        return None
+    course_cols, completion_cols = database.columns(course), database.columns(completion)
+    if "Course" not in course_cols or "Course" not in completion_cols:
+        return None
+    select = ['c."Course"']
+    dtypes = {"Course": course_cols["Course"]}
+    if "ShortName" in course_cols:
+        select.append('c."ShortName"')
+        dtypes["ShortName"] = course_cols["ShortName"]
+    if "Sign Ups" in course_cols:
+        select.append('COALESCE(c."Sign Ups", 0) AS "Sign Ups"')
+        dtypes["Sign Ups"] = course_cols["Sign Ups"]
+    if "Avg Completion %" in completion_cols:
+        select.append('COALESCE(p."Avg Completion %", 0.0) AS "Avg Completion %"')
+        dtypes["Avg Completion %"] = completion_cols["Avg Completion %"]
+    # Ordered like pd.merge(how="left"): course rank order, then completion rows per course.
+    # IS rather than =, because pandas also joins a blank course name to a blank one.
+    name = f"course_perf__{bundle.sheet_version('Course')}_{bundle.sheet_version('Completion')}"
+    database.ensure_view(
+        name,
+        f'SELECT {", ".join(select)} FROM "{course}" c LEFT JOIN "{completion}" p ON p."Course" IS c."Course" ORDER BY c.rowid, p.rowid',
+        dtypes,
+        indexes=[["Sign Ups"]] if "Sign Ups" in dtypes else [],
+        search_col="Course",
+    )
+    return name
+
+def sql_course_opportunity(database: SheetDatabase, table: str) -> Optional[Tuple[str, int, float]]:
+    """Bundle.course_opportunity on the materialised course_perf table: a cutoff lookup and one indexed row."""
+    q = 0.80 if database.count(table) >= 10 else 0.5
+    cutoff = database.quantile(table, "Sign Ups", q)
+    if cutoff is None:
+        return None
+    cand = database.frame(
+        f'SELECT "Course", "Sign Ups", "Avg Completion %" FROM "{table}" WHERE "Sign Ups" >= ? '
+        'ORDER BY "Avg Completion %" ASC, "Sign Ups" DESC, rowid LIMIT 1',
+        (cutoff,),
+        dtypes_from=table,
+    )
+    if cand.empty:
+        return None
+    row = cand.iloc[0]
+    return (str(row["Course"]), int(row["Sign Ups"]), float(row["Avg Completion %"]))
+
+class SqlCourseSearch:
+    """CourseSearchIndex over the SQLite backend.
+
+    Matches come from the table's trigram FTS index (a scan for queries under three
+    characters), and rows() reads only the requested page.
+    """
+
+    def __init__(self, database: SheetDatabase, table: str):
+        self.database = database
+        self.table = table
+
+    def __len__(self) -> int:
+        return self.database.count(self.table)
+
+    def search(self, query: str) -> np.ndarray:
+        return self.database.search(self.table, "Course", query)
+
+    def rows(self, ids: np.ndarray) -> pd.DataFrame:
+        return self.database.rows(self.table, ids)
+
+@shared_cache
+def compute_funnel(_df_split: pd.DataFrame, split_version: str, stage_order: Tuple[str, ...]) -> Tuple[Optional[pd.DataFrame], Optional[str], Optional[pd.DataFrame]]:
+    if not is_valid_df(_df_split) or not has_cols(_df_split, ["Stage", "All Count"]):
+        return None, None, None
+
+    df_f = _df_split[["Stage", "All Count"]].copy()
+    df_f["All Count"] = to_num_series(df_f["All Count"], 0)
+
+    stage_lower = df_f["Stage"].astype(str).str.lower()
+    stage_map = {s.lower(): i for i, s in enumerate(stage_order)}
+    warning = None
+
+    if stage_lower.isin(stage_map.keys()).all():
+        df_f["_ord"] = stage_lower.map(stage_map)
+        df_f.sort_values("_ord", inplace=True)
+        df_f.drop(columns=["_ord"], inplace=True)
+    else:
+        warning = "Funnel stages don't fully match configured order; using sheet order."
+
+    base = to_int_safe(df_f["All Count"].iloc[0], 0)
+    if base <= 0:
+        base = to_int_safe(df_f["All Count"].max(), 0)
+
+    if base > 0:
+        df_f["pct_of_base"] = (df_f["All Count"] / base * 100).round(1)
+    else:
+        df_f["pct_of_base"] = 0.0
+
+    counts_str = df_f["All Count"].round(0).astype(int).map(str)
+    pct_str = df_f["pct_of_base"].map(lambda v: f"{v:g}")
+    df_f["text_label"] = counts_str + " (" + pct_str + "%)"
+
+    counts = df_f["All Count"].to_numpy(dtype="float64")
+    stages = df_f["Stage"].astype(object).map(str).to_numpy(dtype=object)  # str() per stage, so a blank one reads "nan"
+    prev_val, curr_val = counts[:-1], counts[1:]
+    drop_abs = prev_val - curr_val
+    drop_pct = np.divide(drop_abs * 100, prev_val, out=np.zeros_like(drop_abs), where=prev_val > 0)
+    df_drop = pd.DataFrame({
+        "From → To": stages[:-1] + " → " + stages[1:],
+        "Drop (users)": np.rint(drop_abs).astype(int),
+        "Drop (%)": drop_pct.round(1),
+    }) if len(df_f) > 1 else None
+
+    return df_f, warning, df_drop
+
+@shared_cache
+def compute_course_funnels(_df_dropoff: pd.DataFrame, dropoff_version: str, segment: str) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], Optional[str]]:
+    """Funnel of every course in one pass over Course_DropOff, for a segment ("All" for everyone).
+
+    Returns (ranking, stages, note):
+    - ranking: one row per course with stage reach counts, the conversion of each transition
+      and the worst one; ordered by worst drop %, then enrolled users. Courses with fewer than
+      COURSE_FUNNEL_MIN_ENROLLED users come last.
+    - stages: Stage / Count / pct_of_base / text_label rows per course, indexed by Course, so a
+      drill-down is a .loc lookup.
+    - note: set when the sheet has no counts for the segment and All was used instead.
+    """
+    if not is_valid_df(_df_dropoff) or not has_cols(_df_dropoff, ["Course"] + COURSE_FUNNEL_COUNTS):
+        return None, None, None
+    note = None
+    cols = COURSE_FUNNEL_COUNTS
+    if segment != "All":
+        seg_cols = [f"{segment} {col}" for col in COURSE_FUNNEL_COUNTS]
+        if has_cols(_df_dropoff, seg_cols):
+            cols = seg_cols
+        else:
+            note = f"The course drop-off sheet has no {segment} counts; showing all users."
+
+    df = _df_dropoff.dropna(subset=["Course"])
+    exclusive = np.column_stack([to_num_series(df[col], 0).to_numpy(dtype="float64") for col in cols])
+    reach = exclusive[:, ::-1].cumsum(axis=1)[:, ::-1]  # users reaching each stage
+    prev_val, next_val = reach[:, :-1], reach[:, 1:]
+    conversion = np.divide(next_val * 100, prev_val, out=np.full_like(prev_val, np.nan), where=prev_val > 0)
+    drop_pct = 100 - conversion
+    worst = np.where(np.isnan(drop_pct), -1.0, drop_pct).argmax(axis=1)
+    rows = np.arange(len(df))
+    stage_names = np.asarray(FUNNEL_STAGE_ORDER, dtype=object)
+    transitions = stage_names[:-1] + " → " + stage_names[1:]
+    enrolled = reach[:, 0]
+
+    ranking = pd.DataFrame({"Course": df["Course"].astype(str).to_numpy()})
+    for i, stage in enumerate(FUNNEL_STAGE_ORDER):
+        ranking[stage] = reach[:, i].astype("int64")
+    for i, name in enumerate(transitions):
+        ranking[f"{name} %"] = conversion[:, i].round(1)
+    ranking["Worst transition"] = np.where(enrolled > 0, transitions[worst], "")
+    ranking["Worst drop %"] = drop_pct[rows, worst].round(1)
+    ranking["Completion %"] = np.divide(reach[:, -1] * 100, enrolled, out=np.full_like(enrolled, np.nan), where=enrolled > 0).round(1)
+    ranking["_low"] = enrolled < COURSE_FUNNEL_MIN_ENROLLED
+    ranking = (
+        ranking.sort_values(["_low", "Worst drop %", "Enrolled"], ascending=[True, False, False], kind="stable", na_position="last")
+        .drop(columns=["_low"])
+        .reset_index(drop=True)
+    )
+
+    base = np.repeat(enrolled, len(FUNNEL_STAGE_ORDER))
+    counts = reach.ravel()
+    pct = np.divide(counts * 100, base, out=np.zeros_like(counts), where=base > 0).round(1)
+    stages = pd.DataFrame({
+        "Course": np.repeat(df["Course"].astype(str).to_numpy(), len(FUNNEL_STAGE_ORDER)),
+        "Stage": np.tile(stage_names, len(df)),
+        "Count": counts.astype("int64"),
+        "pct_of_base": pct,
+    })
+    stages["text_label"] = stages["Count"].astype(str) + " (" + stages["pct_of_base"].map(lambda v: f"{v:g}") + "%)"
+    return ranking, stages.set_index("Course"), note
+
+@shared_cache
+def compute_retention(_df_retention: pd.DataFrame, retention_version: str, segment: str) -> Optional[pd.DataFrame]:
+    """Cohort x months-since-signup retention triangle for one segment ("All" for everyone).
+
+    Columns: Cohort, Cohort_dt, Cohort Size, then M0, M1, ... as the share of the cohort
+    active that many months after its signup month. Cells later than the newest month in
+    the data are NaN rather than 0, which is what makes the result a triangle.
+    """
+    cols = ["Cohort_dt", "Segment", "Months Since Signup", "Active Users", "Cohort Size"]
+    if not is_valid_df(_df_retention) or not has_cols(_df_retention, cols):
+        return None
+    df = _df_retention.dropna(subset=["Cohort_dt", "Months Since Signup"])
+    cohort_month = df["Cohort_dt"].dt.year * 12 + df["Cohort_dt"].dt.month
+    offset = df["Months Since Signup"].astype("int64")
+    latest = int((cohort_month + offset).max())
+
+    rows = df[df["Segment"].astype(str).eq(segment)]
+    if rows.empty:
+        return None
+    size = to_num_series(rows["Cohort Size"], 0)
+    rate = to_num_series(rows["Active Users"], 0) / size.where(size > 0)
+    wide = rows.assign(rate=rate).pivot_table(index="Cohort_dt", columns="Months Since Signup", values="rate", aggfunc="sum", observed=True)
+    wide = wide.reindex(columns=range(int(offset.max()) + 1)).fillna(0.0)
+    age = latest - (wide.index.year * 12 + wide.index.month).to_numpy()
+    wide = wide.mask(wide.columns.to_numpy()[None, :] > age[:, None])
+
+    sizes = rows.groupby("Cohort_dt")["Cohort Size"].max().reindex(wide.index)
+    out = pd.DataFrame({"Cohort": wide.index.strftime("%b %Y"), "Cohort_dt": wide.index, "Cohort Size": sizes.to_numpy()})
+    out[[f"M{k}" for k in wide.columns]] = wide.to_numpy(dtype="float64", na_value=np.nan)
+    return out
+
+
+# =========================
+# 5b) BACKGROUND WORKBOOK WATCHER
+# =========================
+def prewarm_derived(bundle: Bundle) -> None:
+    """Populate the compute_* caches for a new Bundle with the parameters sessions ask for most."""
+    data = bundle.data
+    bundle.course_search()
+    if is_valid_df(data.get("DropOff_Split")):
+        compute_funnel(data["DropOff_Split"], bundle.sheet_version("DropOff_Split"), tuple(FUNNEL_STAGE_ORDER))
+
+def stat_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st_ = os.stat(path)
+    except OSError:
+        return None
+    return st_.st_mtime_ns, st_.st_size
+
+class WorkbookWatcher(threading.Thread):
+    """Polls FILE_PATH and, once a changed file has stopped growing, loads and pre-warms it.
+
+    Analysts overwrite the workbook in place, so the first user after an upload would
+    otherwise pay the parse. The watcher does it on its own thread and swaps the result
+    into the BundleStore; reruns then only ever see warm data.
+    """
+
+    def __init__(self, store: BundleStore, file_path: str, cache_version: str,
+                 interval_seconds: float, settle_seconds: float):
+        super().__init__(name="workbook-watcher", daemon=True)
+        self.store = store
+        self.file_path = file_path
+        self.cache_version = cache_version
+        self.interval_seconds = interval_seconds
+        self.settle_seconds = settle_seconds
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _settled_signature(self) -> Optional[Tuple[int, int]]:
+        # The write is done once size and mtime hold still for a full settle period.
+        sig = stat_signature(self.file_path)
+        while not self._stop_event.wait(self.settle_seconds):
+            now = stat_signature(self.file_path)
+            if now is not None and now == sig:
+                return now
+            sig = now
+        return None
+
+    def run(self) -> None:
+        seen = stat_signature(self.file_path)
+        while not self._stop_event.wait(self.interval_seconds):
+            if stat_signature(self.file_path) == seen:
+                continue
+            sig = self._settled_signature()
+            stamp = source_stamp(self.file_path) if sig is not None else ""
+            if not stamp:
+                continue  # still mid-write (or unreadable); retry on the next poll
+            try:
+                bundle = self.store.load_now(self.file_path, stamp, self.cache_version)
+                if bundle is not None:
+                    prewarm_derived(bundle)
+                self.store.last_error = None
+            except Exception as exc:  # never let the watcher die; the store keeps the old Bundle
+                self.store.last_error = f"{type(exc).__name__}: {exc}"
+            seen = sig
+
+@process_singleton
+def workbook_watcher() -> WorkbookWatcher:
+    watcher = WorkbookWatcher(bundle_store(), FILE_PATH, CACHE_VERSION, WATCH_INTERVAL_SECONDS, WATCH_SETTLE_SECONDS)
+    watcher.start()
+    return watcher
+
+
+# =========================
+# 6) WINDOWS & KPIs
+# =========================
+def filter_range(df: pd.DataFrame, dt_col: str, start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> pd.DataFrame:
+    if not is_valid_df(df) or dt_col not in df.columns:
+        return df
+    m = df[dt_col].notna() & (df[dt_col] >= start_dt) & (df[dt_col] <= end_dt)
+    return df.loc[m].sort_values(dt_col)
+
+def previous_period_window(periods: List[pd.Period], positions: Mapping[pd.Period, int], start_p: pd.Period, end_p: pd.Period) -> Tuple[Optional[pd.Period], Optional[pd.Period]]:
+    i0 = positions.get(start_p)
+    i1 = positions.get(end_p)
+    if i0 is None or i1 is None:
+        return None, None
+    if i1 < i0:
+        i0, i1 = i1, i0
+    length = (i1 - i0) + 1
+    prev_end_idx = i0 - 1
+    prev_start_idx = prev_end_idx - (length - 1)
+    if prev_start_idx < 0:
+        return None, None
+    return periods[prev_start_idx], periods[prev_end_idx]
+
+@dataclass(frozen=True)
+class WindowKpis:
+    """Executive Summary KPIs for a date window; the prev_* fields cover the compare window (0.0 without one)."""
+    mau_col: str
+    activation_col: str
+    enrollments: float
+    signups: float
+    mau: float
+    activation: float
+    prev_enrollments: float = 0.0
+    prev_signups: float = 0.0
+    prev_mau: float = 0.0
+    prev_activation: float = 0.0
+
+def segment_column(bundle: Bundle, key: str, segment: str, business_col: str, all_col: str) -> str:
+    df = bundle.data.get(key)
+    return business_col if (segment == "Business" and is_valid_df(df) and business_col in df.columns) else all_col
+
+def window_kpis(
+    bundle: Bundle,
+    segment: str,
+    start_p: pd.Period,
+    end_p: pd.Period,
+    prev_start_p: Optional[pd.Period] = None,
+    prev_end_p: Optional[pd.Period] = None,
+) -> WindowKpis:
+    """Sums (enrollments, signups) and latest values (MAU, activation) over [start_p, end_p]."""
+    mau_col = segment_column(bundle, "MAU", segment, "Business MAU", "MAU")
+    act_col = segment_column(bundle, "Activation", segment, "Business Activation Rate %", "All Activation Rate %")
+    return WindowKpis(
+        mau_col=mau_col,
+        activation_col=act_col,
+        enrollments=bundle.window_sum("Monthly_Enroll", "Enrollments", start_p, end_p),
+        signups=bundle.window_sum("Monthly_Unique", "Unique User Signups", start_p, end_p),
+        mau=bundle.window_last("MAU", mau_col, start_p, end_p),
+        activation=bundle.window_last("Activation", act_col, start_p, end_p),
+        prev_enrollments=bundle.window_sum("Monthly_Enroll", "Enrollments", prev_start_p, prev_end_p),
+        prev_signups=bundle.window_sum("Monthly_Unique", "Unique User Signups", prev_start_p, prev_end_p),
+        prev_mau=bundle.window_last("MAU", mau_col, prev_start_p, prev_end_p),
+        prev_activation=bundle.window_last("Activation", act_col, prev_start_p, prev_end_p),
+    )
+
+
+# =========================
+# 7) KEY INSIGHTS
+# =========================
+@dataclass(frozen=True)
+class KeyInsights:
+    top_course: Optional[Tuple[str, int]] = None  # (course, sign-ups)
+    top_country: Optional[Tuple[str, int]] = None  # (country, sign-ups)
+    biggest_drop: Optional[Tuple[str, int, float]] = None  # ("From → To", users lost, drop %)
+    funnel_warning: Optional[str] = None
+    opportunity: Optional[Tuple[str, int, float]] = None  # (course, sign-ups, avg completion %)
+
+def key_insights(bundle: Bundle) -> KeyInsights:
+    """Growth driver, biggest funnel risk and completion opportunity for the whole Bundle."""
+    data = bundle.data
+
+    top_course = None
+    top_course_df = bundle.top_n("Course", 1)
+    if is_valid_df(top_course_df):
+        row = top_course_df.iloc[0]
+        top_course = (str(row["Course"]), int(row["Sign Ups"]))
+
+    top_country = None
+    top_geo_df = bundle.top_n("Country", 1)
+    if is_valid_df(top_geo_df):
+        row = top_geo_df.iloc[0]
+        top_country = (str(row["Country"]), int(row["Total Course Signups"]))
+
+    _, funnel_warning, funnel_drops = compute_funnel(data.get("DropOff_Split"), bundle.sheet_version("DropOff_Split"), tuple(FUNNEL_STAGE_ORDER)) if is_valid_df(data.get("DropOff_Split")) else (None, None, None)
+    biggest_drop = None
+    if is_valid_df(funnel_drops):
+        worst = funnel_drops.sort_values("Drop (%)", ascending=False).iloc[0]
+        biggest_drop = (str(worst["From → To"]), int(worst["Drop (users)"]), float(worst["Drop (%)"]))
+
+    opportunity = bundle.course_opportunity()
+
+    return KeyInsights(
+        top_course=top_course,
+        top_country=top_country,
+        biggest_drop=biggest_drop,
+        funnel_warning=funnel_warning,
+        opportunity=opportunity,
+    )
+
+
+# =========================
+# 8) CLI
+# =========================
+def main(argv: Optional[List[str]] = None) -> int:
+    global BACKEND
+    parser = argparse.ArgumentParser(description="Print the dashboard KPIs and insights for a workbook.")
+    parser.add_argument("path", nargs="?", default=FILE_PATH)
+    parser.add_argument("--months", type=int, default=12, help="window length, ending at the latest month")
+    parser.add_argument("--segment", default="All", choices=["All", "Business", "Generic", "Invalid"])
+    parser.add_argument("--top", type=int, default=10, help="rows in the top-course list")
+    parser.add_argument("--backend", choices=["pandas", "sqlite"], default=BACKEND)
+    args = parser.parse_args(argv)
+    BACKEND = args.backend
+
+    t0 = time.perf_counter()
+    bundle = load_raw(args.path, source_stamp(args.path), CACHE_VERSION)
+    if bundle is None:
+        print(f"Could not load {args.path}", file=sys.stderr)
+        return 1
+    print(f"Loaded {args.path} in {(time.perf_counter() - t0) * 1000:.0f} ms (data updated {bundle.updated_str})")
+    if bundle.missing_sheets:
+        print("Missing sheets: " + ", ".join(bundle.missing_sheets))
+    if bundle.events_error:
+        print(f"Event ingest failed; event sheets are from the last good state ({bundle.events_error})")
+
+    periods = bundle.month_periods
+    if periods:
+        start_p, end_p = periods[max(0, len(periods) - args.months)], periods[-1]
+        prev_start_p, prev_end_p = previous_period_window(periods, bundle.period_pos, start_p, end_p)
+        k = window_kpis(bundle, args.segment, start_p, end_p, prev_start_p, prev_end_p)
+        print(f"\nWindow {start_p.strftime('%b %Y')} → {end_p.strftime('%b %Y')} (vs previous period)")
+        print(f"  Enrollments        {int(round(k.enrollments)):>10,}  {percent_delta(k.enrollments, k.prev_enrollments)}")
+        print(f"  Signups            {int(round(k.signups)):>10,}  {percent_delta(k.signups, k.prev_signups)}")
+        print(f"  {k.mau_col + ' (latest)':<18} {int(round(k.mau)):>10,}  {percent_delta(k.mau, k.prev_mau)}")
+        print(f"  {'Activation (latest)':<18} {k.activation:>9.1f}%  {k.activation - k.prev_activation:+.1f} pts")
+
+    insights = key_insights(bundle)
+    print("\nKey insights")
+    if insights.top_course:
+        print(f"  Top course:   {insights.top_course[0]} ({insights.top_course[1]:,} sign-ups)")
+    if insights.top_country:
+        print(f"  Top country:  {insights.top_country[0]} ({insights.top_country[1]:,} sign-ups)")
+    if insights.biggest_drop:
+        print(f"  Biggest drop: {insights.biggest_drop[0]} (−{insights.biggest_drop[1]:,}, {insights.biggest_drop[2]:.1f}%)")
+    if insights.opportunity:
+        print(f"  Opportunity:  {insights.opportunity[0]} ({insights.opportunity[1]:,} sign-ups, {insights.opportunity[2]:.1f}% completion)")
+
+    top = bundle.top_n("Course", args.top)
+    if is_valid_df(top):
+        print(f"\nTop {len(top)} courses by sign-ups")
+        for _, row in top.iterrows():
+            print(f"  {int(row['Sign Ups']):>7,}  {row['Course']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,446 @@
+"""Incremental aggregation of raw event partitions into the dashboard's monthly sheets.
+
+Events are append-only files under ``<events_dir>/<kind>/``, as CSV (optionally gzipped) or
+Parquet, one file per partition:
+
+- ``enrollments``: ``user_id``, ``ts``, optional ``segment`` (Business / Generic / Invalid)
+- ``activity``: ``user_id``, ``ts``, optional ``segment``
+- ``badges``: ``user_id``, ``ts``, ``action`` ("issued" or "claimed")
+
+Every aggregate is kept as state that a new partition can be folded into without looking
+at older ones. Counts are summed. Per-user first enrollment and first activity are taken
+with ``min``. Active (month, user) pairs are unioned, and retention counts (active users per
+signup cohort and months since signup) are updated from the newly added pairs only. The
+state and a manifest of processed partitions are persisted, so each run reads only
+partitions it has not seen, and it reads them in ``chunk_rows`` pieces. Memory therefore
+follows the number of users and user-months, not the length of the event history.
+
+Usage: python events.py [events_dir] [state_dir]
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+EVENT_COLUMNS = {
+    "enrollments": (["user_id", "ts"], ["segment"]),
+    "activity": (["user_id", "ts"], ["segment"]),
+    "badges": (["user_id", "ts", "action"], []),
+}
+PARTITION_SUFFIXES = (".csv", ".csv.gz", ".parquet")
+ACTIVATION_WINDOW = pd.Timedelta(days=30)
+RETENTION_KEY = ["cohort", "segment", "offset"]
+STATE_KEEP = 2  # state generations kept on disk (the current one and its predecessor)
+
+
+@dataclass
+class IngestReport:
+    processed: List[str] = field(default_factory=list)  # "<kind>/<file>" newly folded into the state
+    rows: int = 0
+    rewritten: List[str] = field(default_factory=list)  # processed partitions whose file has since changed
+
+
+def _month_label(months: pd.Series) -> pd.Series:
+    return months.dt.strftime("%b %Y")
+
+
+def read_partition(path: str, columns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield the partition in chunks of at most ``chunk_rows`` rows, keeping only ``columns``."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        present = [c for c in columns if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=present):
+            yield batch.to_pandas()
+    else:
+        wanted = set(columns)
+        yield from pd.read_csv(path, usecols=lambda c: c in wanted, dtype={"user_id": str}, chunksize=chunk_rows)
+
+
+def retention_rows(active: pd.DataFrame, cohorts: pd.DataFrame, sign: int) -> pd.DataFrame:
+    """(cohort, segment, offset, n=sign) per active (month, user) pair of a user with a cohort."""
+    rows = active[["month", "user_id"]].join(cohorts, on="user_id", how="inner")
+    offset = pd.PeriodIndex(rows["month"]).asi8 - pd.PeriodIndex(rows["cohort"]).asi8
+    rows = rows.assign(offset=offset, n=sign)
+    return rows.loc[rows["offset"].ge(0), RETENTION_KEY + ["n"]]
+
+
+class EventState:
+    """The foldable aggregates. Every field is keyed, so merging a partial is a groupby."""
+
+    def __init__(self):
+        self.enroll_months = pd.Series(dtype="int64", name="enrollments")  # Period[M] -> count
+        self.users = pd.DataFrame(
+            {"signup_ts": pd.Series(dtype="datetime64[us]"), "first_activity_ts": pd.Series(dtype="datetime64[us]"), "segment": pd.Series(dtype="str")},
+            index=pd.Index([], dtype="str", name="user_id"),
+        )
+        self.active = pd.DataFrame({"month": pd.Series(dtype="period[M]"), "user_id": pd.Series(dtype="str"), "segment": pd.Series(dtype="str")})
+        self.badges = pd.DataFrame({"issued": pd.Series(dtype="int64"), "claimed": pd.Series(dtype="int64")}, index=pd.PeriodIndex([], freq="M", name="month"))
+        # (cohort, segment, offset) -> distinct active users; offset is months since the signup month.
+        self.retention = pd.Series(
+            dtype="int64",
+            name="users",
+            index=pd.MultiIndex.from_arrays(
+                [pd.PeriodIndex([], freq="M"), pd.Index([], dtype="str"), pd.Index([], dtype="int64")],
+                names=RETENTION_KEY,
+            ),
+        )
+        # Per-chunk partials for the keyed tables, merged by flush() once per partition.
+        self._user_parts: List[pd.DataFrame] = []
+        self._active_parts: List[pd.DataFrame] = []
+
+    # ---- folding ----
+    def fold(self, kind: str, chunk: pd.DataFrame) -> None:
+        chunk = chunk.dropna(subset=["user_id", "ts"])
+        if chunk.empty:
+            return
+        ts = pd.to_datetime(chunk["ts"], errors="coerce").astype("datetime64[us]")
+        chunk = chunk.assign(ts=ts, month=ts.dt.to_period("M"), user_id=chunk["user_id"].astype(str)).dropna(subset=["ts"])
+        if "segment" not in chunk.columns:
+            chunk = chunk.assign(segment=pd.NA)
+
+        if kind == "enrollments":
+            self.enroll_months = self.enroll_months.add(chunk.groupby("month").size(), fill_value=0).astype("int64")
+            firsts = chunk.sort_values("ts", kind="stable").groupby("user_id").agg(signup_ts=("ts", "min"), segment=("segment", "last"))
+            self._user_parts.append(firsts.assign(first_activity_ts=pd.NaT))
+        elif kind == "activity":
+            self._active_parts.append(chunk[["month", "user_id", "segment"]].drop_duplicates(["month", "user_id"]))
+            firsts = chunk.groupby("user_id").agg(first_activity_ts=("ts", "min"))
+            self._user_parts.append(firsts.assign(signup_ts=pd.NaT, segment=pd.NA))
+        elif kind == "badges":
+            action = chunk["action"].astype(str).str.lower()
+            counts = pd.DataFrame({
+                "issued": chunk.loc[action.eq("issued")].groupby("month").size(),
+                "claimed": chunk.loc[action.eq("claimed")].groupby("month").size(),
+            })
+            self.badges = self.badges.add(counts, fill_value=0).fillna(0).astype("int64")
+            self.badges.index.name = "month"
+
+    def flush(self) -> None:
+        """Merge the pending partials into the keyed tables and the retention counts."""
+        if not (self._user_parts or self._active_parts):
+            return
+        old_cohorts, old_active = self.cohorts(), self.active
+        if self._user_parts:
+            both = pd.concat([self.users] + [p[self.users.columns] for p in self._user_parts])
+            self.users = both.groupby(level=0).agg(
+                signup_ts=("signup_ts", "min"),
+                first_activity_ts=("first_activity_ts", "min"),
+                segment=("segment", "last"),  # "last" skips missing values
+            ).rename_axis("user_id")
+            self._user_parts = []
+        added = old_active.iloc[:0]
+        if self._active_parts:
+            both = pd.concat([old_active] + self._active_parts, ignore_index=True)
+            # The old rows are already distinct, so everything kept past them is new.
+            self.active = both[~both.duplicated(["month", "user_id"], keep="first")].reset_index(drop=True)
+            added = self.active.iloc[len(old_active):]
+            self._active_parts = []
+
+        # A user whose cohort or segment changed (e.g. an earlier enrollment arrived late) moves
+        # their already-counted months from the old key to the new one.
+        cohorts = self.cohorts()
+        before = old_cohorts.reindex(cohorts.index)
+        moved = cohorts.index[cohorts["cohort"].ne(before["cohort"]) | cohorts["segment"].ne(before["segment"])]
+        pulled = old_active[old_active["user_id"].isin(moved)]
+        delta = pd.concat([
+            retention_rows(pulled, old_cohorts, -1),
+            retention_rows(pd.concat([pulled, added]), cohorts, 1),
+        ])
+        if not delta.empty:
+            counts = self.retention.add(delta.groupby(RETENTION_KEY)["n"].sum(), fill_value=0).astype("int64")
+            self.retention = counts[counts.ne(0)].rename("users")
+
+    def cohorts(self) -> pd.DataFrame:
+        """Signup month and segment ("" when unknown) per user with an enrollment, indexed by user_id."""
+        signed_up = self.users.dropna(subset=["signup_ts"])
+        return pd.DataFrame({"cohort": signed_up["signup_ts"].dt.to_period("M"), "segment": signed_up["segment"].fillna("").astype(str)}, index=signed_up.index)
+
+    def rebuild_retention(self) -> None:
+        """Recount retention from the full active table (for state saved without it)."""
+        self.flush()
+        rows = retention_rows(self.active, self.cohorts(), 1)
+        self.retention = rows.groupby(RETENTION_KEY)["n"].sum().astype("int64").rename("users")
+
+    # ---- persistence ----
+    def save(self, directory: str) -> None:
+        self.flush()
+        os.makedirs(directory, exist_ok=True)
+        # Periods are stored as "YYYY-MM" text, which every Parquet reader understands.
+        pd.DataFrame({"month": self.enroll_months.index.astype(str), "enrollments": self.enroll_months.to_numpy()}).to_parquet(
+            os.path.join(directory, "enroll_months.parquet"), index=False
+        )
+        self.users.reset_index().to_parquet(os.path.join(directory, "users.parquet"), index=False)
+        self.active.assign(month=self.active["month"].astype(str)).to_parquet(os.path.join(directory, "active.parquet"), index=False)
+        pd.DataFrame({"month": self.badges.index.astype(str), "issued": self.badges["issued"].to_numpy(), "claimed": self.badges["claimed"].to_numpy()}).to_parquet(
+            os.path.join(directory, "badges.parquet"), index=False
+        )
+        retention = self.retention.reset_index()
+        retention.assign(cohort=retention["cohort"].astype(str)).to_parquet(os.path.join(directory, "retention.parquet"), index=False)
+
+    @classmethod
+    def load(cls, directory: str) -> "EventState":
+        state = cls()
+        em = pd.read_parquet(os.path.join(directory, "enroll_months.parquet"))
+        state.enroll_months = pd.Series(em["enrollments"].to_numpy(), index=pd.PeriodIndex(em["month"], freq="M"), name="enrollments").astype("int64")
+        state.users = pd.read_parquet(os.path.join(directory, "users.parquet")).set_index("user_id")
+        active = pd.read_parquet(os.path.join(directory, "active.parquet"))
+        state.active = active.assign(month=pd.PeriodIndex(active["month"], freq="M"))
+        badges = pd.read_parquet(os.path.join(directory, "badges.parquet"))
+        state.badges = badges.set_index(pd.PeriodIndex(badges["month"], freq="M", name="month"))[["issued", "claimed"]]
+        path = os.path.join(directory, "retention.parquet")
+        if os.path.exists(path):
+            retention = pd.read_parquet(path)
+            state.retention = retention.assign(cohort=pd.PeriodIndex(retention["cohort"], freq="M")).set_index(RETENTION_KEY)["users"]
+        else:
+            state.rebuild_retention()
+        return state
+
+    # ---- sheets ----
+    def sheets(self) -> Dict[str, pd.DataFrame]:
+        """The aggregates shaped like the workbook sheets they replace (dashboard column names)."""
+        self.flush()
+        out: Dict[str, pd.DataFrame] = {}
+        if not self.enroll_months.empty:
+            em = self.enroll_months.sort_index()
+            out["Monthly_Enroll"] = pd.DataFrame({"Month": _month_label(em.index.to_timestamp().to_series()).to_numpy(), "Enrollments": em.to_numpy()})
+
+        signed_up = self.users.dropna(subset=["signup_ts"])
+        if not signed_up.empty:
+            cohort = signed_up["signup_ts"].dt.to_period("M")
+            unique = cohort.value_counts().sort_index()
+            out["Monthly_Unique"] = pd.DataFrame({"Month": _month_label(unique.index.to_timestamp().to_series()).to_numpy(), "Unique User Signups": unique.to_numpy()})
+
+            # D30: first activity no later than 30 days after the first enrollment.
+            activated = signed_up["first_activity_ts"].notna() & (signed_up["first_activity_ts"] - signed_up["signup_ts"] <= ACTIVATION_WINDOW)
+            business = signed_up["segment"].eq("Business")
+            rates = pd.DataFrame({"cohort": cohort, "all": activated, "biz": activated.where(business)})
+            by_cohort = rates.groupby("cohort").agg(all_rate=("all", "mean"), biz_rate=("biz", "mean")).sort_index()
+            out["Activation"] = pd.DataFrame({
+                "Cohort": _month_label(by_cohort.index.to_timestamp().to_series()).to_numpy(),
+                "All Activation Rate %": by_cohort["all_rate"].to_numpy(dtype="float64"),
+                "Business Activation Rate %": by_cohort["biz_rate"].fillna(0.0).to_numpy(dtype="float64"),
+            })
+
+        if not self.active.empty:
+            # Segment comes from the activity events, falling back to the user's enrollment segment.
+            seg = self.active["segment"].fillna(self.active["user_id"].map(self.users["segment"]))
+            mau = self.active.assign(biz=seg.eq("Business")).groupby("month").agg(MAU=("user_id", "size"), biz=("biz", "sum")).sort_index()
+            out["MAU"] = pd.DataFrame({
+                "Month": _month_label(mau.index.to_timestamp().to_series()).to_numpy(),
+                "MAU": mau["MAU"].to_numpy(),
+                "Business MAU": mau["biz"].to_numpy(),
+            })
+
+        if not self.retention.empty:
+            counts = self.retention.reset_index()
+            sizes = self.cohorts().groupby(["cohort", "segment"]).size().rename("size").reset_index()
+            # "All" rows sum every segment, including users with no known segment.
+            counts = pd.concat([counts.groupby(["cohort", "offset"], as_index=False)["users"].sum().assign(segment="All"), counts[counts["segment"].ne("")]])
+            sizes = pd.concat([sizes.groupby("cohort", as_index=False)["size"].sum().assign(segment="All"), sizes[sizes["segment"].ne("")]])
+            ret = counts.merge(sizes, on=["cohort", "segment"], how="left").sort_values(["cohort", "segment", "offset"], kind="stable")
+            out["Retention"] = pd.DataFrame({
+                "Cohort": _month_label(ret["cohort"].dt.to_timestamp()).to_numpy(),
+                "Segment": ret["segment"].to_numpy(),
+                "Months Since Signup": ret["offset"].to_numpy(),
+                "Active Users": ret["users"].to_numpy(),
+                "Cohort Size": ret["size"].fillna(0).astype("int64").to_numpy(),
+            })
+
+        if not self.badges.empty:
+            b = self.badges.sort_index()
+            sent, claimed = int(b["issued"].sum()), int(b["claimed"].sum())
+            out["Badges_Issued"] = pd.DataFrame({
+                "Metric": ["Total Sent", "Total Claimed", "Claim Rate"],
+                "Count": [float(sent), float(claimed), claimed / sent * 100 if sent else 0.0],
+            })
+            out["Badges_Monthly"] = pd.DataFrame({
+                "Month": _month_label(b.index.to_timestamp().to_series()).to_numpy(),
+                "Issued": b["issued"].to_numpy(),
+                "Claimed": b["claimed"].to_numpy(),
+            })
+        return out
+
+
+class EventStore:
+    """Event partitions plus the persisted state and manifest they have been folded into.
+
+    State is written to a fresh ``state-<n>`` directory and published by rewriting the
+    small ``CURRENT`` pointer, so a crash mid-ingest leaves the previous state and manifest
+    intact and the same partitions are simply processed again.
+    """
+
+    def __init__(self, events_dir: str, state_dir: str, chunk_rows: int = 100_000):
+        self.events_dir = events_dir
+        self.state_dir = state_dir
+        self.chunk_rows = chunk_rows
+
+    def partitions(self) -> List[Tuple[str, str, str]]:
+        """(kind, "<kind>/<file>", path) for every partition file, in name order per kind."""
+        found = []
+        for kind in EVENT_COLUMNS:
+            folder = os.path.join(self.events_dir, kind)
+            try:
+                names = sorted(n for n in os.listdir(folder) if n.endswith(PARTITION_SUFFIXES))
+            except OSError:
+                continue
+            found.extend((kind, f"{kind}/{n}", os.path.join(folder, n)) for n in names)
+        return found
+
+    @staticmethod
+    def _signature(path: str) -> List[int]:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def stamp(self) -> str:
+        """Cheap change token over the partition listing (names, sizes, mtimes)."""
+        h = hashlib.sha256()
+        for _, name, path in self.partitions():
+            h.update(f"{name}:{self._signature(path)};".encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    def _current(self) -> Tuple[Optional[str], Dict[str, List[int]]]:
+        try:
+            with open(os.path.join(self.state_dir, "CURRENT"), encoding="utf-8") as fh:
+                generation = fh.read().strip()
+            with open(os.path.join(self.state_dir, generation, "manifest.json"), encoding="utf-8") as fh:
+                return generation, json.load(fh)["partitions"]
+        except (OSError, ValueError, KeyError):
+            return None, {}
+
+    def manifest(self) -> Dict[str, List[int]]:
+        return self._current()[1]
+
+    def digest(self) -> str:
+        """Content token for the current state: changes exactly when a partition is folded in."""
+        manifest = self.manifest()
+        return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def state(self) -> EventState:
+        generation, _ = self._current()
+        return EventState.load(os.path.join(self.state_dir, generation)) if generation else EventState()
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive lock on the state directory, across threads and processes.
+
+        Two ingests (the server and the CLI, or replicas sharing the snapshot directory)
+        would otherwise both build ``state-<n+1>`` and could publish a half-written one.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(os.path.join(self.state_dir, "LOCK"), "a+b") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            else:
+                fh.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10 s; keep waiting
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+                else:
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def ingest(self) -> IngestReport:
+        """Fold every partition not yet in the manifest into the state and publish the result.
+
+        Ingests are serialised by a lock file in the state directory; one that waited for
+        another re-reads the manifest, so it only folds what is still pending.
+        """
+        with self._locked():
+            return self._ingest()
+
+    def _ingest(self) -> IngestReport:
+        report = IngestReport()
+        generation, manifest = self._current()
+        pending = []
+        for kind, name, path in self.partitions():
+            if name not in manifest:
+                pending.append((kind, name, path))
+            elif manifest[name] != self._signature(path):
+                report.rewritten.append(name)  # append-only contract broken; already counted once
+        if not pending:
+            return report
+
+        state = EventState.load(os.path.join(self.state_dir, generation)) if generation else EventState()
+        manifest = dict(manifest)
+        for kind, name, path in pending:
+            required, optional = EVENT_COLUMNS[kind]
+            signature = self._signature(path)
+            for chunk in read_partition(path, required + optional, self.chunk_rows):
+                missing = [c for c in required if c not in chunk.columns]
+                if missing:
+                    raise ValueError(f"{name}: missing column(s) {', '.join(missing)}")
+                state.fold(kind, chunk)
+                report.rows += len(chunk)
+            state.flush()
+            manifest[name] = signature
+            report.processed.append(name)
+
+        # Written under a scratch name and renamed into place, so a state-<n> directory is
+        # always complete, even after a crash mid-write.
+        next_generation = f"state-{int(generation.rsplit('-', 1)[1]) + 1 if generation else 1}"
+        target = os.path.join(self.state_dir, next_generation)
+        scratch = os.path.join(self.state_dir, f".{next_generation}.tmp-{os.getpid()}")
+        shutil.rmtree(scratch, ignore_errors=True)
+        state.save(scratch)
+        with open(os.path.join(scratch, "manifest.json"), "w", encoding="utf-8") as fh:
+            json.dump({"partitions": manifest}, fh, sort_keys=True)
+        shutil.rmtree(target, ignore_errors=True)  # an unpublished leftover; CURRENT never names it
+        os.replace(scratch, target)
+        tmp = os.path.join(self.state_dir, f"CURRENT.tmp-{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(next_generation)
+        os.replace(tmp, os.path.join(self.state_dir, "CURRENT"))
+        self._prune(keep=STATE_KEEP)
+        return report
+
+    def _prune(self, keep: int) -> None:
+        generations = sorted(
+            (n for n in os.listdir(self.state_dir) if n.startswith("state-")),
+            key=lambda n: int(n.rsplit("-", 1)[1]),
+        )
+        for name in generations[:-keep]:
+            shutil.rmtree(os.path.join(self.state_dir, name), ignore_errors=True)
+        for name in os.listdir(self.state_dir):
+            if name.startswith(".state-"):  # scratch directories of ingests that crashed
+                shutil.rmtree(os.path.join(self.state_dir, name), ignore_errors=True)
+
+
+def main(argv: List[str]) -> int:
+    events_dir = argv[1] if len(argv) > 1 else "events"
+    state_dir = argv[2] if len(argv) > 2 else os.path.join(".dashboard_snapshots", "events")
+    store = EventStore(events_dir, state_dir)
+    report = store.ingest()
+    print(f"processed {len(report.processed)} partition(s), {report.rows:,} rows")
+    for name in report.processed:
+        print(f"  + {name}")
+    for name in report.rewritten:
+        print(f"  ! {name} changed after it was processed; ignored (partitions are append-only)")
+    for key, df in store.state().sheets().items():
+        print(f"{key}: {len(df)} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,292 @@
+"""SQLite copy of the prepared sheets, for queries pushed down to an indexed database.
+
+Each sheet is stored as its own table named after the sheet key and its content digest
+(``Course__<digest>``), the same naming the Parquet snapshots use. A table is written once,
+in a single transaction, by whichever thread or process gets there first, so a reader never
+sees a half-written sheet and a sync never rewrites a table an older, still-running Bundle
+version is reading. Superseded tables are dropped once more than ``keep`` newer versions of
+the sheet exist.
+
+Rows keep the loader's order as their rowid, so the rank order of ranked sheets and the
+"later rows win within a month" rule of time sheets carry over to SQL unchanged. Column
+dtypes are recorded in a ``sheet_columns`` table and restored on read, so query results
+come back typed like the loader's frames, even in a process that never loaded the sheet.
+"""
+import contextlib
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"  # datetimes are stored as text in this format, which sorts
+_META = "sheet_columns"  # (tbl, pos, col, dtype) for every table and derived table
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_name(key: str, digest: str) -> str:
+    return f"{key}__{digest}"
+
+
+def _fts_phrase(query: str) -> str:
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _sql_type(dtype: Any) -> str:
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _column_values(s: pd.Series) -> List[Any]:
+    """Python values for one column: None for missing, datetimes as sortable text."""
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        s = s.dt.strftime(_TS_FORMAT)
+    elif pd.api.types.is_float_dtype(s.dtype):
+        s = s.astype("float64")
+    values = s.tolist()
+    for i in np.flatnonzero(s.isna().to_numpy()):
+        values[i] = None
+    return values
+
+
+class SheetDatabase:
+    """Prepared sheets in one SQLite file, with the indexes the dashboard's queries need.
+
+    Connections are per thread (sqlite3 objects can't cross threads) and the file is in WAL
+    mode, so a background sync never blocks readers.
+    """
+
+    def __init__(self, path: str, keep: int = 3):
+        self.path = path
+        self.keep = keep
+        self._local = threading.local()
+        self._columns: Dict[str, Dict[str, str]] = {}  # table -> {column: dtype}, read from _META
+        self.has_fts = self._probe_fts()
+        self._conn().execute(f"CREATE TABLE IF NOT EXISTS {_META} (tbl TEXT, pos INTEGER, col TEXT, dtype TEXT)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; writes open their own BEGIN IMMEDIATE transaction (_write).
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Python's lower(): SQLite's own lower() and LIKE only fold ASCII.
+            conn.create_function("py_lower", 1, lambda v: None if v is None else str(v).lower(), deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _probe_fts() -> bool:
+        try:
+            sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram case_sensitive 1')")
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    @contextlib.contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so "does the table exist?" and creating it
+        # are one step across every thread and process using the file.
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def has_table(self, name: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+        return row is not None
+
+    def has_rows(self, name: str) -> bool:
+        return self.has_table(name) and self._conn().execute(f"SELECT 1 FROM {_q(name)} LIMIT 1").fetchone() is not None
+
+    def columns(self, table: str) -> Dict[str, str]:
+        """{column: pandas dtype} of a table, in column order."""
+        cols = self._columns.get(table)
+        if cols is None:
+            rows = self._conn().execute(f"SELECT col, dtype FROM {_META} WHERE tbl = ? ORDER BY pos", (table,)).fetchall()
+            cols = dict(rows)
+            if cols:
+                self._columns[table] = cols
+        return cols
+
+    # ---- writing ----
+    def sync(
+        self,
+        frames: Mapping,
+        digests: Mapping[str, str],
+        indexes: Mapping[str, Sequence[Sequence[str]]],
+    ) -> List[str]:
+        """Write each sheet whose ``key__digest`` table doesn't exist yet; return the keys written.
+
+        ``indexes`` maps a sheet key to the column lists to index.
+        """
+        written = []
+        for key, df in frames.items():
+            if df is None or key not in digests:
+                continue
+            table = table_name(key, digests[key])
+            with self._write() as conn:
+                if self.has_table(table):
+                    continue
+                conn.execute(f"CREATE TABLE {_q(table)} ({', '.join(f'{_q(str(c))} {_sql_type(t)}' for c, t in df.dtypes.items())})")
+                rows = list(zip(*(_column_values(df[c]) for c in df.columns)))
+                conn.executemany(f"INSERT INTO {_q(table)} VALUES ({', '.join('?' * len(df.columns))})", rows)
+                for cols in indexes.get(key, ()):
+                    if all(c in df.columns for c in cols):
+                        conn.execute(f"CREATE INDEX {_q(table + '__' + '_'.join(cols))} ON {_q(table)} ({', '.join(map(_q, cols))})")
+                self._record_columns(conn, table, {str(c): str(t) for c, t in df.dtypes.items()})
+                self._prune(conn, key, keep_table=table)
+            written.append(key)
+        return written
+
+    def ensure_view(
+        self,
+        name: str,
+        select_sql: str,
+        dtypes: Mapping[str, str],
+        indexes: Sequence[Sequence[str]] = (),
+        search_col: Optional[str] = None,
+    ) -> None:
+        """Materialise ``select_sql`` as table ``name`` (rowid in result order), with indexes and a trigram search index.
+
+        ``dtypes`` are the pandas dtypes to restore on the result's columns when it is read back.
+        """
+        if name in self._columns:
+            return
+        with self._write() as conn:
+            if not self.has_table(name):
+                conn.execute(f"CREATE TABLE {_q(name)} AS {select_sql}")
+                for cols in indexes:
+                    conn.execute(f"CREATE INDEX {_q(name + '__' + '_'.join(cols))} ON {_q(name)} ({', '.join(map(_q, cols))})")
+                if search_col is not None and self.has_fts:
+                    fts = _q(name + "__fts")
+                    # Indexed lowercased the way search() lowercases the query.
+                    conn.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({_q(search_col)}, tokenize='trigram case_sensitive 1')")
+                    conn.execute(f"INSERT INTO {fts} (rowid, {_q(search_col)}) SELECT rowid, py_lower({_q(search_col)}) FROM {_q(name)}")
+                self._record_columns(conn, name, dtypes)
+        self.columns(name)
+
+    @staticmethod
+    def _record_columns(conn: sqlite3.Connection, table: str, dtypes: Mapping[str, str]) -> None:
+        conn.executemany(f"INSERT INTO {_META} VALUES (?, ?, ?, ?)", [(table, i, c, t) for i, (c, t) in enumerate(dtypes.items())])
+
+    def _prune(self, conn: sqlite3.Connection, key: str, keep_table: str) -> None:
+        # Inside the writer's transaction. _META rows are appended, so the highest rowid is
+        # the most recently written table.
+        rows = conn.execute(
+            f"SELECT tbl FROM {_META} WHERE tbl LIKE ? ESCAPE '\\' AND pos = 0 ORDER BY rowid DESC",
+            (key.replace("_", "\\_") + "\\_\\_%",),
+        ).fetchall()
+        stale = [r[0] for r in rows if r[0] != keep_table][max(self.keep - 1, 0):]
+        for table in stale:
+            # Derived tables (ensure_view) carry the digests they were built from in their name.
+            digest = table.split("__", 1)[1]
+            derived = conn.execute(f"SELECT DISTINCT tbl FROM {_META} WHERE tbl LIKE ? AND tbl != ?", (f"%{digest}%", table)).fetchall()
+            for name in [table] + [d[0] for d in derived]:
+                conn.execute(f"DROP TABLE IF EXISTS {_q(name + '__fts')}")
+                conn.execute(f"DROP TABLE IF EXISTS {_q(name)}")
+                conn.execute(f"DELETE FROM {_META} WHERE tbl = ?", (name,))
+                self._columns.pop(name, None)
+
+    # ---- reading ----
+    def frame(self, sql: str, params: Iterable = (), dtypes_from: Optional[str] = None) -> pd.DataFrame:
+        df = pd.read_sql_query(sql, self._conn(), params=list(params))
+        dtypes = self.columns(dtypes_from) if dtypes_from else {}
+        for col in df.columns:
+            if col in dtypes:
+                df[col] = df[col].astype(dtypes[col])
+        return df
+
+    def scalar(self, sql: str, params: Iterable = ()) -> Optional[float]:
+        row = self._conn().execute(sql, list(params)).fetchone()
+        return None if row is None or row[0] is None else float(row[0])
+
+    def total(self, table: str, col: str) -> float:
+        return self.scalar(f"SELECT SUM(COALESCE({_q(col)}, 0)) FROM {_q(table)}") or 0.0
+
+    def quantile(self, table: str, col: str, q: float) -> Optional[float]:
+        """``col``'s ``q`` quantile over non-null rows, from at most two indexed row lookups.
+
+        numpy's default "linear" method step for step (np.quantile), so a cutoff compares
+        exactly like pandas' Series.quantile.
+        """
+        n = int(self.scalar(f"SELECT COUNT({_q(col)}) FROM {_q(table)}") or 0)
+        if n == 0:
+            return None
+        virtual = min(max(n * q + (1 + q * -1) - 1, 0.0), n - 1.0)
+        lo = int(np.floor(virtual))
+        rows = self._conn().execute(
+            f"SELECT {_q(col)} FROM {_q(table)} WHERE {_q(col)} IS NOT NULL ORDER BY {_q(col)} LIMIT 2 OFFSET ?", (lo,)
+        ).fetchall()
+        a = float(rows[0][0])
+        b = float(rows[-1][0])
+        t = virtual - lo
+        return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+    def window_sum(self, table: str, dt_col: str, col: str, start_ts: pd.Timestamp, end_ts: pd.Timestamp) -> float:
+        total = self.scalar(
+            f"SELECT SUM(COALESCE({_q(col)}, 0)) FROM {_q(table)} WHERE {_q(dt_col)} BETWEEN ? AND ?",
+            (start_ts.strftime(_TS_FORMAT), end_ts.strftime(_TS_FORMAT)),
+        )
+        return total or 0.0
+
+    def window_last(self, table: str, dt_col: str, col: str, start_ts: pd.Timestamp, end_ts: pd.Timestamp) -> float:
+        last = self.scalar(
+            f"SELECT COALESCE({_q(col)}, 0) FROM {_q(table)} WHERE {_q(dt_col)} BETWEEN ? AND ? "
+            f"ORDER BY {_q(dt_col)} DESC, rowid DESC LIMIT 1",
+            (start_ts.strftime(_TS_FORMAT), end_ts.strftime(_TS_FORMAT)),
+        )
+        return last or 0.0
+
+    def head(self, table: str, cols: Optional[Sequence[str]] = None, n: Optional[int] = None) -> pd.DataFrame:
+        """The first ``n`` rows (all when None) in rowid order, only ``cols`` when given."""
+        select = ", ".join(map(_q, cols)) if cols else "*"
+        return self.frame(
+            f"SELECT {select} FROM {_q(table)} ORDER BY rowid LIMIT ?",
+            (-1 if n is None else int(n),),
+            dtypes_from=table,
+        )
+
+    def count(self, table: str) -> int:
+        return int(self.scalar(f"SELECT COUNT(*) FROM {_q(table)}") or 0)
+
+    def search(self, table: str, col: str, query: str) -> np.ndarray:
+        """0-based row numbers (rowid order) whose ``col`` contains ``query``, case-insensitively.
+
+        Like CourseSearchIndex: trigram FTS hits (for queries of three or more characters)
+        are candidates only, and every match is confirmed as a lowercased substring.
+        """
+        q = query.strip().lower()
+        if not q:
+            return np.arange(self.count(table), dtype=np.int64)
+        sql = f"SELECT rowid FROM {_q(table)} WHERE instr(py_lower({_q(col)}), ?) > 0"
+        params: Tuple = (q,)
+        fts = table + "__fts"
+        if len(q) >= 3 and self.has_fts and self.has_table(fts):
+            sql += f" AND rowid IN (SELECT rowid FROM {_q(fts)} WHERE {_q(fts)} MATCH ?)"
+            params += (_fts_phrase(q),)
+        ids = [r[0] - 1 for r in self._conn().execute(sql + " ORDER BY rowid", params)]
+        return np.asarray(ids, dtype=np.int64)
+
+    def rows(self, table: str, ids: np.ndarray) -> pd.DataFrame:
+        """Rows by 0-based row number, in the order given."""
+        ids = [int(i) + 1 for i in ids]
+        if not ids:
+            return self.frame(f"SELECT * FROM {_q(table)} LIMIT 0", dtypes_from=table)
+        marks = ", ".join("?" * len(ids))
+        df = self.frame(f"SELECT rowid AS _rid, * FROM {_q(table)} WHERE rowid IN ({marks})", ids, dtypes_from=table)
+        order = {rid: i for i, rid in enumerate(ids)}
+        df = df.iloc[np.argsort(df["_rid"].map(order).to_numpy(), kind="stable")]
+        return df.drop(columns=["_rid"]).reset_index(drop=True)
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from engine import build_bundle, compute_course_perf, prepare_sheet
+
+
+def test_unmatched_countries_report_blank_names():
+    df = prepare_sheet("Country", pd.DataFrame({
+        "Country": ["India", None, "Atlantis", None],
+        "Total Course Signups": [30, 20, 10, 5],
+    }))
+    bundle = build_bundle({"Country": df}, 0)
+    assert bundle.unmatched_countries == ["(blank)", "Atlantis"]
+    assert ", ".join(bundle.unmatched_countries) == "(blank), Atlantis"
+
+
+def test_course_search_with_a_course_with_no_name():
+    course = prepare_sheet("Course", pd.DataFrame({
+        "Course Name": ["Intro to SQL", None, "Advanced SQL"],
+        "Course Sign-Ups": [50, 40, 30],
+    }))
+    completion = prepare_sheet("Completion", pd.DataFrame({
+        "Course": ["Intro to SQL", "Advanced SQL"],
+        "Avg %": [80.0, 60.0],
+    }))
+    bundle = build_bundle({"Course": course, "Completion": completion}, 0)
+    index = bundle.course_search()
+    assert len(index) == 3
+    assert index.search("").tolist() == [0, 1, 2]
+    assert index.search("sql").tolist() == [0, 2]
+    assert index.search("nan").tolist() == []
+    assert pd.isna(index.rows(index.search("")).loc[1, "Course"])
+
+
+def course_frames(signups):
+    course = prepare_sheet("Course", pd.DataFrame({"Course Name": ["Intro", "Advanced"], "Course Sign-Ups": signups}))
+    completion = prepare_sheet("Completion", pd.DataFrame({"Course": ["Intro", "Advanced"], "Avg %": [80.0, 60.0]}))
+    return {"Course": course, "Completion": completion}
+
+
+def test_bundles_built_without_digests_do_not_share_cached_tables():
+    first = build_bundle(course_frames([50, 30]), 0)
+    second = build_bundle(course_frames([10, 90]), 0)
+    same = build_bundle(course_frames([50, 30]), 0)
+    assert first.sheet_version("Course") and first.sheet_version("Course") != second.sheet_version("Course")
+    assert first.sheet_version("Completion") == second.sheet_version("Completion")
+    assert same.sheet_digests == first.sheet_digests
+
+    assert first.course_perf()["Sign Ups"].tolist() == [50, 30]
+    assert second.course_perf()["Course"].tolist() == ["Advanced", "Intro"]
+    assert second.course_perf()["Sign Ups"].tolist() == [90, 10]
+
+
+def test_build_bundle_keeps_given_digests():
+    bundle = build_bundle(course_frames([50, 30]), 0, {"Course": "c1", "Completion": "p1"})
+    assert bundle.sheet_digests == {"Course": "c1", "Completion": "p1"}
+
+
+def test_empty_version_is_not_cached():
+    first, second = course_frames([50, 30]), course_frames([10, 90])
+    a = compute_course_perf(first["Course"], first["Completion"], "", "")
+    b = compute_course_perf(second["Course"], second["Completion"], "", "")
+    assert a["Sign Ups"].tolist() == [50, 30]
+    assert b["Sign Ups"].tolist() == [90, 10]
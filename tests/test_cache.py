@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+import engine
+from engine import FIGURE_BASE_BYTES, BudgetCache, estimate_nbytes
+
+
+def blob(n):
+    return np.zeros(n, dtype=np.uint8)  # estimate_nbytes == n
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(engine.time, "monotonic", lambda: now[0])
+    return now
+
+
+def keys(cache):
+    return [k for k in cache._entries]
+
+
+def test_lru_eviction_stays_under_budget():
+    cache = BudgetCache(max_bytes=300)
+    cache.put("a", 1, blob(100))
+    cache.put("a", 2, blob(100))
+    cache.put("b", 1, blob(100))
+    assert cache.used_bytes == 300
+
+    assert cache.get("a", 1)[0]  # touch: ("a", 2) is now least recently used
+    cache.put("b", 2, blob(150))
+    assert cache.used_bytes <= 300
+    assert keys(cache) == [("a", 1), ("b", 2)]
+    assert cache.used_bytes == 250
+
+    stats = cache.stats()
+    assert stats["a"].evictions == 1
+    assert stats["b"].evictions == 1
+    assert (stats["a"].entries, stats["a"].bytes) == (1, 100)
+    assert (stats["b"].entries, stats["b"].bytes) == (1, 150)
+
+
+def test_value_bigger_than_budget_is_returned_but_not_kept():
+    cache = BudgetCache(max_bytes=100)
+    cache.put("a", 1, blob(50))
+    big = cache.get_or_compute("a", 2, lambda: blob(500))
+    assert len(big) == 500
+    assert keys(cache) == [("a", 1)]
+    assert cache.used_bytes == 50
+    assert cache.stats()["a"].evictions == 0
+
+
+def test_put_replaces_existing_key():
+    cache = BudgetCache(max_bytes=1000)
+    cache.put("a", 1, blob(100))
+    cache.put("a", 1, blob(40))
+    assert cache.used_bytes == 40
+    assert (cache.stats()["a"].entries, cache.stats()["a"].bytes) == (1, 40)
+
+
+def test_ttl_expiry_counts_as_miss(clock):
+    cache = BudgetCache(max_bytes=1000, ttl_seconds=60)
+    cache.put("a", 1, blob(10))
+    clock[0] += 60
+    assert cache.get("a", 1)[0]
+    clock[0] += 1
+    assert cache.get("a", 1) == (False, None)
+    assert cache.used_bytes == 0
+
+    calls = []
+    cache.get_or_compute("a", 1, lambda: calls.append(1) or blob(10))
+    assert calls == [1]
+    stats = cache.stats()["a"]
+    assert (stats.hits, stats.misses, stats.evictions, stats.entries) == (1, 2, 0, 1)
+
+
+def test_no_ttl_never_expires(clock):
+    cache = BudgetCache(max_bytes=1000)
+    cache.put("a", 1, blob(10))
+    clock[0] += 10 ** 9
+    assert cache.get("a", 1)[0]
+
+
+def test_clear_one_namespace():
+    cache = BudgetCache(max_bytes=1000)
+    cache.put("a", 1, blob(10))
+    cache.put("a", 2, blob(20))
+    cache.put("b", 1, blob(30))
+    cache.clear("a")
+    assert keys(cache) == [("b", 1)]
+    assert cache.used_bytes == 30
+    stats = cache.stats()
+    assert (stats["a"].entries, stats["a"].bytes, stats["a"].evictions) == (0, 0, 0)
+
+    cache.clear()
+    assert keys(cache) == []
+    assert cache.used_bytes == 0
+
+
+def test_discard_evicts_failing_keys():
+    cache = BudgetCache(max_bytes=1000)
+    for v in ("v1", "v2", "v3"):
+        cache.put("a", (v, "x"), blob(10))
+    cache.put("b", ("v1", "x"), blob(10))
+    cache.discard("a", lambda key: key[0] == "v3")
+    assert keys(cache) == [("a", ("v3", "x")), ("b", ("v1", "x"))]
+    assert cache.stats()["a"].evictions == 2
+    assert cache.stats()["b"].evictions == 0
+
+
+def test_hit_and_miss_counters():
+    cache = BudgetCache(max_bytes=1000)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return blob(10)
+
+    for _ in range(3):
+        cache.get_or_compute("a", "k", compute)
+    cache.get("b", "missing")
+    stats = cache.stats()
+    assert len(calls) == 1
+    assert (stats["a"].hits, stats["a"].misses) == (2, 1)
+    assert (stats["b"].hits, stats["b"].misses) == (0, 1)
+
+    stats["a"].hits = 99  # a snapshot, not the live counters
+    assert cache.stats()["a"].hits == 2
+
+
+def test_figure_size_comes_from_trace_arrays(monkeypatch):
+    go = pytest.importorskip("plotly.graph_objects")
+    small = go.Figure(go.Scatter(x=np.arange(10.0), y=np.arange(10.0)))
+    big = go.Figure(go.Scatter(x=np.arange(10_000.0), y=np.arange(10_000.0), text=[f"row {i}" for i in range(10_000)]))
+    monkeypatch.setattr(go.Figure, "to_json", lambda self, *a, **k: pytest.fail("figure serialised"))
+
+    assert estimate_nbytes(go.Figure()) == FIGURE_BASE_BYTES
+    assert estimate_nbytes(small) == FIGURE_BASE_BYTES + 2 * 10 * 8
+    assert estimate_nbytes(big) > FIGURE_BASE_BYTES + 2 * 10_000 * 8 + 10_000 * len("row 9999")
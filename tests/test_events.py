@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import events
+from events import EventState, EventStore
+
+
+def write_partition(events_dir, kind, name, df):
+    folder = os.path.join(events_dir, kind)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    if name.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def partitions():
+    """Eight partitions per kind over ~8 months, mixing CSV and Parquet.
+
+    Enrollment timestamps are spread over the whole range in every partition, so a later
+    partition regularly holds a user's earliest enrollment (a late arrival that moves the
+    user to an earlier cohort). Segments are fixed per user.
+    """
+    rng = np.random.default_rng(11)
+    users = np.array([f"u{i}" for i in range(400)])
+    segment_of = dict(zip(users, np.array(["Business", "Generic", "Invalid"])[rng.integers(0, 3, len(users))]))
+
+    def stamps(n, lo, hi):
+        lo, hi = pd.Timestamp(lo).value // 10 ** 9, pd.Timestamp(hi).value // 10 ** 9
+        return pd.to_datetime(rng.integers(lo, hi, n), unit="s")
+
+    parts = []
+    for p in range(8):
+        ext = "parquet" if p % 2 else "csv"
+        enrolled = rng.choice(users, 120)
+        active = rng.choice(np.append(users, ["ghost1", "ghost2"]), 400)
+        parts.append((p, {
+            "enrollments": (f"p{p}.{ext}", pd.DataFrame({"user_id": enrolled, "ts": stamps(120, "2024-06-01", "2025-01-15"), "segment": [segment_of[u] for u in enrolled]})),
+            "activity": (f"p{p}.{ext}", pd.DataFrame({"user_id": active, "ts": stamps(400, "2024-05-15", "2025-02-01"), "segment": None})),
+            "badges": (f"p{p}.{ext}", pd.DataFrame({"user_id": rng.choice(users, 50), "ts": stamps(50, "2024-06-01", "2025-02-01"), "action": rng.choice(["issued", "claimed"], 50)})),
+        }))
+    return parts
+
+
+def write_all(events_dir, parts):
+    for _, kinds in parts:
+        for kind, (name, df) in kinds.items():
+            write_partition(events_dir, kind, name, df)
+
+
+def assert_same_sheets(a, b):
+    sheets_a, sheets_b = a.sheets(), b.sheets()
+    assert sorted(sheets_a) == sorted(sheets_b)
+    for key in sheets_a:
+        pd.testing.assert_frame_equal(sheets_a[key], sheets_b[key], check_dtype=False, obj=key)
+
+
+def test_incremental_ingest_matches_full_rebuild(tmp_path, partitions):
+    full = EventStore(str(tmp_path / "all"), str(tmp_path / "state_all"))
+    write_all(full.events_dir, partitions)
+    full.ingest()
+
+    inc = EventStore(str(tmp_path / "inc"), str(tmp_path / "state_inc"), chunk_rows=37)
+    for p in [5, 2, 7, 0, 3, 1, 6, 4]:
+        write_all(inc.events_dir, [partitions[p]])
+        report = inc.ingest()
+        assert len(report.processed) == 3
+
+    assert_same_sheets(full.state(), inc.state())
+    # The delta-maintained retention counts equal a recount from the full active table.
+    incremental = inc.state().retention.sort_index()
+    rebuilt = inc.state()
+    rebuilt.rebuild_retention()
+    pd.testing.assert_series_equal(incremental, rebuilt.retention.sort_index(), check_index_type=False)
+
+
+def test_reingest_is_noop(tmp_path, partitions):
+    store = EventStore(str(tmp_path / "events"), str(tmp_path / "state"))
+    write_all(store.events_dir, partitions[:3])
+    first = store.ingest()
+    assert len(first.processed) == 9
+    current = open(os.path.join(store.state_dir, "CURRENT")).read()
+    digest, before = store.digest(), store.state().sheets()
+
+    again = store.ingest()
+    assert again.processed == [] and again.rows == 0 and again.rewritten == []
+    assert open(os.path.join(store.state_dir, "CURRENT")).read() == current
+    assert store.digest() == digest
+    after = store.state().sheets()
+    for key in before:
+        pd.testing.assert_frame_equal(before[key], after[key])
+
+
+def test_rewritten_partition_is_reported_and_ignored(tmp_path, partitions):
+    store = EventStore(str(tmp_path / "events"), str(tmp_path / "state"))
+    write_all(store.events_dir, partitions[:2])
+    store.ingest()
+    before = store.state().sheets()["Monthly_Enroll"]
+
+    name, df = partitions[0][1]["enrollments"]
+    write_partition(store.events_dir, "enrollments", name, pd.concat([df, df]))
+    report = store.ingest()
+    assert report.processed == [] and report.rewritten == [f"enrollments/{name}"]
+    pd.testing.assert_frame_equal(store.state().sheets()["Monthly_Enroll"], before)
+
+
+def test_late_enrollment_moves_retention_to_earlier_cohort(tmp_path):
+    store = EventStore(str(tmp_path / "events"), str(tmp_path / "state"))
+    write_partition(store.events_dir, "enrollments", "p0.csv", pd.DataFrame({"user_id": ["a"], "ts": ["2025-02-10"], "segment": ["Business"]}))
+    write_partition(store.events_dir, "activity", "p0.csv", pd.DataFrame({"user_id": ["a", "a"], "ts": ["2025-02-11", "2025-03-05"]}))
+    store.ingest()
+    feb, jan = pd.Period("2025-02", "M"), pd.Period("2025-01", "M")
+    assert store.state().retention.to_dict() == {(feb, "Business", 0): 1, (feb, "Business", 1): 1}
+
+    write_partition(store.events_dir, "enrollments", "p1.csv", pd.DataFrame({"user_id": ["a"], "ts": ["2025-01-20"], "segment": ["Business"]}))
+    store.ingest()
+    state = store.state()
+    assert state.retention.to_dict() == {(jan, "Business", 1): 1, (jan, "Business", 2): 1}
+    assert state.users.loc["a", "signup_ts"] == pd.Timestamp("2025-01-20")
+
+
+def test_failed_ingest_keeps_previous_state_and_retries(tmp_path, partitions, monkeypatch):
+    store = EventStore(str(tmp_path / "events"), str(tmp_path / "state"))
+    write_all(store.events_dir, partitions[:1])
+    store.ingest()
+    current, manifest = open(os.path.join(store.state_dir, "CURRENT")).read(), store.manifest()
+
+    write_all(store.events_dir, partitions[1:2])
+    with monkeypatch.context() as m:
+        m.setattr(EventState, "save", lambda self, directory: (_ for _ in ()).throw(OSError("disk full")))
+        with pytest.raises(OSError):
+            store.ingest()
+    assert open(os.path.join(store.state_dir, "CURRENT")).read() == current
+    assert store.manifest() == manifest
+
+    assert len(store.ingest().processed) == 3
+
+
+def test_prune_keeps_only_recent_generations(tmp_path, partitions):
+    store = EventStore(str(tmp_path / "events"), str(tmp_path / "state"))
+    for part in partitions[:4]:
+        write_all(store.events_dir, [part])
+        store.ingest()
+    generations = sorted(n for n in os.listdir(store.state_dir) if n.startswith("state-"))
+    assert generations == ["state-3", "state-4"][-events.STATE_KEEP:]
+    assert open(os.path.join(store.state_dir, "CURRENT")).read() == "state-4"
+
+
+def test_concurrent_ingests_fold_each_partition_once(tmp_path, partitions, monkeypatch):
+    write_all(str(tmp_path / "events"), partitions)
+    save = EventState.save
+
+    def slow_save(self, directory):
+        time.sleep(0.3)  # hold the write open long enough for the other ingest to overlap
+        save(self, directory)
+
+    monkeypatch.setattr(EventState, "save", slow_save)
+    stores = [EventStore(str(tmp_path / "events"), str(tmp_path / "state")) for _ in range(2)]
+    reports = [None, None]
+
+    def run(i):
+        reports[i] = stores[i].ingest()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    processed = sorted(len(r.processed) for r in reports)
+    assert processed == [0, 3 * len(partitions)]
+    assert open(os.path.join(stores[0].state_dir, "CURRENT")).read() == "state-1"
+    assert not [n for n in os.listdir(stores[0].state_dir) if n.startswith(".state-")]
+
+    reference = EventStore(str(tmp_path / "events"), str(tmp_path / "state_ref"))
+    reference.ingest()
+    assert_same_sheets(stores[1].state(), reference.state())
+
+
+def test_missing_required_column_fails_without_publishing(tmp_path):
+    store = EventStore(str(tmp_path / "events"), str(tmp_path / "state"))
+    write_partition(store.events_dir, "badges", "p0.csv", pd.DataFrame({"user_id": ["a"], "ts": ["2025-01-01"]}))
+    with pytest.raises(ValueError, match="action"):
+        store.ingest()
+    assert store.manifest() == {}
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import COURSE_FUNNEL_COUNTS, FUNNEL_STAGE_ORDER, compute_course_funnels, compute_funnel, prepare_sheet
+
+
+def funnel_drops_by_row(df_split):
+    # The per-row loop compute_funnel's drop table replaced.
+    df_f = df_split[["Stage", "All Count"]]
+    rows = []
+    for i in range(1, len(df_f)):
+        prev_val = float(df_f.iloc[i - 1]["All Count"])
+        curr_val = float(df_f.iloc[i]["All Count"])
+        drop_abs = prev_val - curr_val
+        drop_pct = (drop_abs / prev_val * 100) if prev_val > 0 else 0.0
+        rows.append({
+            "From → To": f"{str(df_f.iloc[i - 1]['Stage'])} → {str(df_f.iloc[i]['Stage'])}",
+            "Drop (users)": int(round(drop_abs)),
+            "Drop (%)": round(drop_pct, 1),
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("stages", [
+    ["Enrolled", "Started", "In Progress", "Completed"],
+    ["Enrolled", None, "In Progress", "Completed"],
+    ["Signed up", "Opened", "Finished"],
+])
+def test_funnel_drops_match_row_loop(stages):
+    counts = [1000, 640, 0, 210][: len(stages)]
+    split = prepare_sheet("DropOff_Split", pd.DataFrame({"Stage": stages, "All Count": counts}))
+    funnel, warning, drops = compute_funnel(split, f"v-{stages}", tuple(FUNNEL_STAGE_ORDER))
+    assert (warning is None) == (stages == FUNNEL_STAGE_ORDER)
+    pd.testing.assert_frame_equal(drops, funnel_drops_by_row(funnel), check_dtype=False)
+
+
+def dropoff(rows, business=None):
+    """Course_DropOff from {course: exclusive counts per COURSE_FUNNEL_COUNTS}."""
+    df = pd.DataFrame([[course, *counts] for course, counts in rows.items()], columns=["Course"] + COURSE_FUNNEL_COUNTS)
+    if business is not None:
+        for i, col in enumerate(COURSE_FUNNEL_COUNTS):
+            df[f"Business {col}"] = [business[course][i] for course in df["Course"]]
+    return prepare_sheet("Course_DropOff", df)
+
+
+@pytest.fixture
+def courses():
+    return dropoff({
+        "A": [10, 20, 30, 40],   # reach 100/90/70/40: worst In Progress → Completed
+        "B": [50, 0, 0, 50],     # reach 100/50/50/50: worst Enrolled → Started, 50%
+        "C": [1, 1, 1, 1],       # 4 enrolled: low volume
+        "D": [0, 0, 0, 0],       # nobody enrolled
+        "E": [0, 0, 0, 20],      # no drop at all
+        "F": [30, 0, 0, 30],     # same worst drop as B, fewer enrolled
+    })
+
+
+def test_course_funnel_arithmetic(courses):
+    ranking, stages, note = compute_course_funnels(courses, "v-arith", "All")
+    assert note is None
+    a = ranking.set_index("Course").loc["A"]
+    assert [a[s] for s in FUNNEL_STAGE_ORDER] == [100, 90, 70, 40]
+    assert a["Enrolled → Started %"] == 90.0
+    assert a["Started → In Progress %"] == 77.8
+    assert a["In Progress → Completed %"] == 57.1
+    assert (a["Worst transition"], a["Worst drop %"], a["Completion %"]) == ("In Progress → Completed", 42.9, 40.0)
+
+    d = ranking.set_index("Course").loc["D"]
+    assert d["Worst transition"] == ""
+    assert np.isnan(d["Worst drop %"]) and np.isnan(d["Completion %"]) and np.isnan(d["Enrolled → Started %"])
+
+    e = ranking.set_index("Course").loc["E"]
+    assert (e["Worst drop %"], e["Completion %"]) == (0.0, 100.0)
+
+    b = stages.loc["B"]
+    assert b["Stage"].tolist() == FUNNEL_STAGE_ORDER
+    assert b["Count"].tolist() == [100, 50, 50, 50]
+    assert b["text_label"].tolist() == ["100 (100%)", "50 (50%)", "50 (50%)", "50 (50%)"]
+    assert stages.loc["D"]["pct_of_base"].tolist() == [0.0] * 4
+
+
+def test_course_funnel_order_puts_low_volume_last(courses):
+    ranking, _, _ = compute_course_funnels(courses, "v-order", "All")
+    # Worst drop % descending, ties by enrolled users; under COURSE_FUNNEL_MIN_ENROLLED last.
+    assert ranking["Course"].tolist() == ["B", "F", "A", "E", "C", "D"]
+
+
+def test_course_funnel_skips_rows_with_no_course():
+    df = dropoff({"A": [10, 20, 30, 40]})
+    df = pd.concat([df, df.assign(Course=None)], ignore_index=True)
+    ranking, stages, _ = compute_course_funnels(df, "v-blank", "All")
+    assert ranking["Course"].tolist() == ["A"]
+    assert len(stages) == len(FUNNEL_STAGE_ORDER)
+
+
+def test_course_funnel_segment_and_fallback_note():
+    df = dropoff({"A": [10, 20, 30, 40], "B": [5, 5, 5, 5]}, business={"A": [0, 0, 0, 12], "B": [6, 6, 0, 0]})
+    ranking, _, note = compute_course_funnels(df, "v-seg", "Business")
+    assert note is None
+    assert ranking.set_index("Course")["Enrolled"].to_dict() == {"A": 12, "B": 12}
+    assert ranking["Course"].tolist() == ["B", "A"]
+
+    ranking, _, note = compute_course_funnels(df, "v-seg", "Generic")
+    assert note == "The course drop-off sheet has no Generic counts; showing all users."
+    assert ranking.set_index("Course")["Enrolled"].to_dict() == {"A": 100, "B": 20}
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import types
+
+import pandas as pd
+import pytest
+
+import engine
+from engine import SHEET_MAP, parse_sheets, parse_sheets_parallel
+from events import EventStore
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    path = str(tmp_path / "stats.xlsx")
+    months = pd.period_range("2023-01", "2024-12", freq="M").strftime("%b %Y")
+    sheets = {
+        "Monthly_Enroll": pd.DataFrame({"Month": months, "Number of enrollments": range(100, 100 + len(months))}),
+        "MAU": pd.DataFrame({"Month": months, "MAU": range(len(months)), "Business MAU": range(0, 2 * len(months), 2)}),
+        "Course": pd.DataFrame({"Course Name": [f"Course {i}" for i in range(40)], "Course Sign-Ups": [i * 7 % 23 for i in range(40)]}),
+        "Country": pd.DataFrame({"Country": ["India", "Japan", "Brazil"], "Total Course Signups": [30, 10, 20]}),
+    }
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for key, df in sheets.items():
+            df.to_excel(writer, sheet_name=SHEET_MAP[key], index=False)
+    return path
+
+
+@pytest.mark.parametrize("xlsx_engine", ["stream", "openpyxl"])
+def test_parallel_matches_serial(workbook_path, xlsx_engine):
+    wanted = {key: SHEET_MAP[key] for key in ["Monthly_Enroll", "MAU", "Course", "Country"]}
+    serial, _, serial_mode = parse_sheets(workbook_path, wanted, mode="serial", engine=xlsx_engine)
+    parallel, timings, parallel_mode = parse_sheets(workbook_path, wanted, mode="parallel", engine=xlsx_engine)
+    assert (serial_mode, parallel_mode) == ("serial", "parallel")
+    assert set(timings) == set(wanted)
+    for key in wanted:
+        pd.testing.assert_frame_equal(parallel[key], serial[key])
+
+
+def test_workers_do_not_rerun_the_app_script(workbook_path, tmp_path, monkeypatch):
+    # Streamlit installs the app script as __main__; a worker must not execute it again.
+    marker = tmp_path / "ran"
+    script = tmp_path / "fake_app.py"
+    script.write_text(f"open({str(marker)!r}, 'w').close()\n")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+
+    assert parse_sheets_parallel(workbook_path, {"MAU": SHEET_MAP["MAU"]}, "stream") is not None
+    assert sys.modules["__main__"] is main
+    assert not marker.exists()
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs a named pipe")
+def test_stalled_pool_times_out_and_is_killed(tmp_path, monkeypatch):
+    # Opening a FIFO with no writer blocks, so the worker never returns.
+    fifo = str(tmp_path / "stalled.xlsx")
+    os.mkfifo(fifo)
+    pools = []
+    stop_pool = engine._stop_pool
+
+    def record(pool, kill):
+        processes = list(pool._processes.values())
+        pools.append((processes, kill))
+        stop_pool(pool, kill)
+
+    monkeypatch.setattr(engine, "_stop_pool", record)
+    t0 = time.monotonic()
+    assert parse_sheets_parallel(fifo, {"MAU": SHEET_MAP["MAU"]}, "stream", timeout=1) is None
+    assert time.monotonic() - t0 < 30
+
+    [(processes, kill)] = pools
+    assert kill and processes
+    for proc in processes:
+        proc.join(timeout=10)
+        assert not proc.is_alive()
+
+
+def test_nothing_wanted():
+    assert parse_sheets_parallel("unused.xlsx", {}, "stream") is None
+
+
+def test_text_columns_keep_missing_values():
+    df = pd.DataFrame({"Course Name": ["Intro", None, "Advanced"], "Course Sign-Ups": [5, 3, None]})
+    out = engine.prepare_sheet("Course", df)
+    assert out["Course"].isna().sum() == 1
+    assert "nan" not in set(out["Course"].dropna())
+
+
+def test_failed_event_ingest_keeps_serving(workbook_path, tmp_path, monkeypatch):
+    events_dir, state_dir = tmp_path / "events", tmp_path / "state"
+    monkeypatch.setattr(engine, "EVENTS_DIR", str(events_dir))
+    monkeypatch.setattr(engine, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(engine, "event_store", lambda: EventStore(str(events_dir), str(state_dir)))
+
+    def write(kind, name, df):
+        os.makedirs(events_dir / kind, exist_ok=True)
+        df.to_csv(events_dir / kind / name, index=False)
+
+    bad_badges = pd.DataFrame({"user_id": ["a"], "ts": ["2025-01-02"]})  # no "action" column
+
+    # Cold start with only a bad partition: no event state yet, so the workbook sheets serve.
+    write("badges", "p0.csv", bad_badges)
+    bundle = engine.load_raw(workbook_path, "cold", engine.CACHE_VERSION)
+    assert "action" in bundle.events_error
+    assert bundle.sheet_sources["Monthly_Enroll"] == "serial"
+    assert len(bundle.data["Monthly_Enroll"]) == 24
+
+    # Once good partitions are in, a later bad one leaves the published state in place.
+    os.remove(events_dir / "badges" / "p0.csv")
+    write("enrollments", "p0.csv", pd.DataFrame({"user_id": ["a", "b", "c"], "ts": ["2025-01-02", "2025-01-05", "2025-02-01"]}))
+    good = engine.load_raw(workbook_path, "good", engine.CACHE_VERSION)
+    assert good.events_error is None
+    assert good.data["Monthly_Enroll"]["Enrollments"].tolist() == [2, 1]
+
+    write("badges", "p1.csv", bad_badges)
+    write("enrollments", "p1.csv", pd.DataFrame({"user_id": ["d"], "ts": ["2025-03-01"]}))
+    bundle = engine.load_raw(workbook_path, "bad", engine.CACHE_VERSION)
+    assert "action" in bundle.events_error
+    pd.testing.assert_frame_equal(bundle.data["Monthly_Enroll"], good.data["Monthly_Enroll"])
+    assert EventStore(str(events_dir), str(state_dir)).manifest().keys() == {"enrollments/p0.csv"}
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+from engine import CACHE_VERSION, SHEET_MAP, budget_cache
+from sheetdb import SheetDatabase
+
+
+def write_workbook(path, n_courses=40, completion_rows=None):
+    months = pd.period_range("2023-01", "2024-12", freq="M").strftime("%b %Y").tolist()
+    months[5] = months[4]  # two rows for one month
+    names = [f"Course {i}" for i in range(n_courses)]
+    if n_courses > 7:
+        names[3], names[7] = None, "50% off_C# [intro]"  # a blank name, LIKE / FTS special characters
+    if completion_rows is None:
+        completion_rows = {
+            # Course 2 twice, an unmatched row, and a blank name (pandas joins it to the blank course)
+            "Course": names[::2] + ["Course 2", "Unlisted", None],
+            "Avg %": [(i * 13 % 97) / 1.3 for i in range(len(names[::2]))] + [11.0, 50.0, 3.0],
+        }
+    sheets = {
+        "Monthly_Enroll": pd.DataFrame({"Month": months, "Number of enrollments": [100 + i if i != 9 else None for i in range(len(months))]}),
+        "MAU": pd.DataFrame({"Month": months + ["TBD"], "MAU": list(range(len(months))) + [999], "Business MAU": list(range(0, 2 * len(months), 2)) + [9]}),
+        "Course": pd.DataFrame({"Course Name": names, "Course Sign-Ups": [i * 7 % 23 for i in range(n_courses)]}),
+        "Completion": pd.DataFrame(completion_rows),
+        "Country": pd.DataFrame({"Country": ["India", "Japan", "Brazil"], "Total Course Signups": [30, 10, 20]}),
+    }
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for key, df in sheets.items():
+            df.to_excel(writer, sheet_name=SHEET_MAP[key], index=False)
+
+
+@pytest.fixture
+def load(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(engine, "EVENTS_DIR", str(tmp_path / "no-events"))
+    database = SheetDatabase(str(tmp_path / "dashboard.sqlite3"))
+    monkeypatch.setattr(engine, "sheet_database", lambda: database)
+
+    def load(path, backend):
+        monkeypatch.setattr(engine, "BACKEND", backend)
+        budget_cache().clear()
+        return engine.load_raw(path, backend, CACHE_VERSION)
+
+    yield load
+    budget_cache().clear()
+
+
+@pytest.fixture
+def bundles(tmp_path, load):
+    path = str(tmp_path / "stats.xlsx")
+    write_workbook(path)
+    return load(path, "pandas"), load(path, "sqlite")
+
+
+def assert_same(got, want):
+    pd.testing.assert_frame_equal(got.reset_index(drop=True), want.reset_index(drop=True), check_categorical=False)
+
+
+def test_sqlite_bundle_keeps_course_sheets_out_of_memory(bundles):
+    pandas_bundle, sql_bundle = bundles
+    assert sql_bundle.database is not None
+    assert set(sql_bundle.sql_tables) == {"Course", "Completion", "Monthly_Enroll", "MAU"}
+    assert sql_bundle.data["Course"] is None and sql_bundle.data["Completion"] is None
+    assert set(sql_bundle.memory_report()["Sheet"]) == {"Monthly_Enroll", "MAU", "Country"}
+    assert sql_bundle.total_enrolls == pandas_bundle.total_enrolls
+
+
+def test_window_kpis_match(bundles):
+    pandas_bundle, sql_bundle = bundles
+    periods = pandas_bundle.month_periods + [pd.Period("2025-06", "M")]
+    for a in range(0, len(periods), 3):
+        for b in range(a, len(periods), 2):
+            for key, col in [("Monthly_Enroll", "Enrollments"), ("MAU", "MAU"), ("MAU", "Business MAU")]:
+                args = (key, col, periods[a], periods[b])
+                assert sql_bundle.window_sum(*args) == pandas_bundle.window_sum(*args)
+                assert sql_bundle.window_last(*args) == pandas_bundle.window_last(*args)
+
+
+def test_top_n_and_course_perf_match(bundles):
+    pandas_bundle, sql_bundle = bundles
+    for n in (1, 5, 100):
+        assert_same(sql_bundle.top_n("Course", n), pandas_bundle.top_n("Course", n))
+    assert_same(sql_bundle.course_perf(), pandas_bundle.course_perf())
+    assert_same(sql_bundle.course_perf(limit=7), pandas_bundle.course_perf().head(7))
+    assert sql_bundle.course_opportunity() == pandas_bundle.course_opportunity()
+    assert engine.key_insights(sql_bundle) == engine.key_insights(pandas_bundle)
+
+
+@pytest.mark.parametrize("query", ["", "  ", "course 1", "COURSE 1", "1", "e 3", "50%", "off_c", "c#", "[intro]", "%", "_", "zzz", '"x'])
+def test_course_search_matches(bundles, query):
+    pandas_bundle, sql_bundle = bundles
+    want, got = pandas_bundle.course_search(), sql_bundle.course_search()
+    assert len(got) == len(want)
+    matches = want.search(query)
+    np.testing.assert_array_equal(got.search(query), matches)
+    for page in (matches[:5], matches[5:12], matches[:0]):
+        assert_same(got.rows(page), want.rows(page))
+
+
+@pytest.mark.parametrize("n_courses", [1, 2, 5, 9, 10, 11, 16, 21, 26, 37])
+def test_opportunity_cutoff_matches_pandas_quantile(tmp_path, load, n_courses):
+    path = str(tmp_path / "stats.xlsx")
+    names = [f"Course {i}" for i in range(n_courses)]
+    write_workbook(path, n_courses, {"Course": names, "Avg %": [float(i % 4) for i in range(n_courses)]})
+    assert load(path, "sqlite").course_opportunity() == load(path, "pandas").course_opportunity()
+
+
+def test_restart_reads_course_tables_without_loading_the_sheets(tmp_path, load, monkeypatch):
+    path = str(tmp_path / "stats.xlsx")
+    write_workbook(path)
+    first = load(path, "sqlite")
+    parsed = []
+    parse_sheets = engine.parse_sheets
+    monkeypatch.setattr(engine, "parse_sheets", lambda file_path, wanted: parsed.extend(wanted) or parse_sheets(file_path, wanted))
+    monkeypatch.setattr(engine, "read_sheet_snapshot", lambda key, digest: None)
+
+    again = load(path, "sqlite")
+    assert "Course" not in parsed and "Completion" not in parsed
+    assert again.sheet_sources["Course"] == again.sheet_sources["Completion"] == "sqlite"
+    assert_same(again.course_perf(), first.course_perf())
+    assert again.total_enrolls == first.total_enrolls
+
+
+def test_unwritable_database_falls_back_to_pandas(tmp_path, load, monkeypatch):
+    path = str(tmp_path / "stats.xlsx")
+    write_workbook(path)
+
+    def broken():
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(engine, "sheet_database", broken)
+    bundle = load(path, "sqlite")
+    assert bundle.database is None and bundle.sql_tables == {}
+    assert engine.is_valid_df(bundle.data["Course"])
+    assert engine.is_valid_df(bundle.course_perf())
+
+
+def test_old_versions_are_pruned(tmp_path):
+    database = SheetDatabase(str(tmp_path / "db.sqlite3"), keep=2)
+    for i in range(4):
+        df = pd.DataFrame({"Course": [f"c{i}"], "Sign Ups": pd.array([i], dtype="Int32")})
+        database.sync({"Course": df}, {"Course": f"d{i}"}, {})
+        database.ensure_view(f"course_perf__d{i}_x", 'SELECT * FROM "Course__d%d"' % i, {"Course": "str"}, search_col="Course")
+    tables = {r[0] for r in database._conn().execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {t for t in tables if t.startswith("Course__")} == {"Course__d2", "Course__d3"}
+    assert {t for t in tables if t.startswith("course_perf__") and "__fts" not in t} == {"course_perf__d2_x", "course_perf__d3_x"}
+    assert database.head("Course__d3")["Sign Ups"].dtype == "Int32"
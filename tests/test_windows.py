@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import MonthSeries, build_bundle, filter_range, is_valid_df, prepare_sheet, to_num_series
+
+
+def month_end(p: pd.Period) -> pd.Timestamp:
+    return (p.to_timestamp(how="end")).normalize() + pd.offsets.MonthEnd(0)
+
+
+# The KPI arithmetic the dashboard used before MonthSeries: mask the sheet, then sum / take
+# the last row.
+def sum_in_window(df, dt_col, val_col, s_dt, e_dt) -> float:
+    if not is_valid_df(df) or dt_col not in df.columns or val_col not in df.columns:
+        return 0.0
+    dfw = filter_range(df, dt_col, s_dt, e_dt)
+    if not is_valid_df(dfw):
+        return 0.0
+    return float(to_num_series(dfw[val_col], 0).sum())
+
+def last_in_window(df, dt_col, val_col, s_dt, e_dt) -> float:
+    if not is_valid_df(df) or dt_col not in df.columns or val_col not in df.columns:
+        return 0.0
+    dfw = filter_range(df, dt_col, s_dt, e_dt)
+    if not is_valid_df(dfw):
+        return 0.0
+    return float(to_num_series(dfw[val_col], 0).iloc[-1])
+
+
+@pytest.fixture
+def mau():
+    """An MAU sheet with a gap (Apr-May 2024), two rows for Feb 2024, missing values and an
+    undated row, run through the loader like a workbook sheet."""
+    raw = pd.DataFrame({
+        "Month": ["Jan 2024", "Feb 2024", "Mar 2024", "Feb 2024", "Jun 2024", "TBD", "Jul 2024", "Aug 2024"],
+        "MAU": [100, 120, None, 130, 160, 999, 170, 180],
+        "Business MAU": [10, 12, 13, None, 16, 99, 17, None],
+    })
+    return prepare_sheet("MAU", raw)
+
+
+WINDOWS = [
+    ("2024-01", "2024-08"),  # everything
+    ("2024-02", "2024-02"),  # one month with two rows
+    ("2024-03", "2024-03"),  # one month, missing value
+    ("2024-04", "2024-05"),  # inside the gap
+    ("2024-03", "2024-05"),  # ends in the gap
+    ("2024-04", "2024-07"),  # starts in the gap
+    ("2023-06", "2023-12"),  # before the data
+    ("2024-09", "2025-03"),  # after the data
+    ("2023-11", "2024-02"),  # starts before the data
+    ("2024-07", "2025-01"),  # ends after the data
+    ("2024-06", "2024-03"),  # reversed
+]
+
+
+@pytest.mark.parametrize("col", ["MAU", "Business MAU"])
+@pytest.mark.parametrize("start,end", WINDOWS)
+def test_window_sum_and_last_match_filter(mau, col, start, end):
+    series = MonthSeries(mau, "Month_dt", ["MAU", "Business MAU"])
+    start_p, end_p = pd.Period(start, "M"), pd.Period(end, "M")
+    s_dt, e_dt = month_end(start_p), month_end(end_p)
+    assert series.window_sum(col, start_p, end_p) == sum_in_window(mau, "Month_dt", col, s_dt, e_dt)
+    assert series.window_last(col, start_p, end_p) == last_in_window(mau, "Month_dt", col, s_dt, e_dt)
+
+
+def test_later_row_wins_within_a_month(mau):
+    series = MonthSeries(mau, "Month_dt", ["MAU", "Business MAU"])
+    feb = pd.Period("2024-02", "M")
+    assert series.window_last("MAU", feb, feb) == 130.0
+    assert series.window_last("Business MAU", feb, feb) == 0.0  # the later row is missing
+    assert series.window_sum("MAU", feb, feb) == 250.0
+
+
+def test_later_row_wins_in_unsorted_input():
+    df = pd.DataFrame({
+        "Month_dt": pd.to_datetime(["2024-03-31", "2024-01-31", "2024-03-31", "2024-02-29", "2024-01-31"]),
+        "v": [3.0, 1.0, 4.0, 2.0, 5.0],
+    })
+    series = MonthSeries(df, "Month_dt", ["v"])
+    jan, mar = pd.Period("2024-01", "M"), pd.Period("2024-03", "M")
+    assert series.window_last("v", jan, jan) == 5.0
+    assert series.window_last("v", jan, mar) == 4.0
+    assert series.window_sum("v", jan, mar) == 15.0
+
+
+def test_rows_dated_mid_month_count_in_their_month():
+    df = pd.DataFrame({"Month_dt": pd.to_datetime(["2024-01-05", "2024-01-20", "2024-02-10"]), "v": [1.0, 2.0, 4.0]})
+    series = MonthSeries(df, "Month_dt", ["v"])
+    jan = pd.Period("2024-01", "M")
+    assert series.window_sum("v", jan, jan) == 3.0
+    assert series.window_last("v", jan, jan) == 2.0
+    assert series.window_sum("v", jan, pd.Period("2024-02", "M")) == 7.0
+
+
+def test_no_dated_rows_or_unknown_column():
+    df = pd.DataFrame({"Month_dt": pd.to_datetime([None, None]), "v": [1.0, 2.0]})
+    series = MonthSeries(df, "Month_dt", ["v"])
+    p = pd.Period("2024-01", "M")
+    assert series.window_sum("v", p, p) == 0.0
+    assert series.window_last("v", p, p) == 0.0
+    assert series.window_sum("missing", p, p) == 0.0
+    assert "missing" not in series
+
+
+def test_bundle_windows_match_filter(mau):
+    bundle = build_bundle({"MAU": mau}, 0)
+    rng = np.random.default_rng(3)
+    periods = pd.period_range("2023-10", "2024-11", freq="M")
+    for _ in range(50):
+        a, b = sorted(rng.integers(0, len(periods), 2))
+        start_p, end_p = periods[a], periods[b]
+        s_dt, e_dt = month_end(start_p), month_end(end_p)
+        for col in ["MAU", "Business MAU"]:
+            assert bundle.window_sum("MAU", col, start_p, end_p) == sum_in_window(mau, "Month_dt", col, s_dt, e_dt)
+            assert bundle.window_last("MAU", col, start_p, end_p) == last_in_window(mau, "Month_dt", col, s_dt, e_dt)
+    assert bundle.window_sum("MAU", "MAU", None, periods[-1]) == 0.0
+    assert bundle.window_sum("Monthly_Enroll", "Enrollments", periods[0], periods[-1]) == 0.0
+
+
+SLICES = [
+    ("2024-01-31", "2024-08-31"),  # everything
+    ("2024-02-01", "2024-02-29"),  # one month with two rows
+    ("2024-01-31", "2024-03-15"),  # ends mid-month, before that month's row
+    ("2024-02-15", "2024-06-30"),  # starts mid-month
+    ("2024-04-01", "2024-05-31"),  # inside the gap
+    ("2023-01-01", "2023-12-31"),  # before the data
+    ("2024-09-01", "2025-12-31"),  # after the data
+    ("2024-06-30", "2024-06-30"),  # a single instant on a row
+    ("2024-06-30", "2024-02-29"),  # reversed
+]
+
+
+@pytest.mark.parametrize("start,end", SLICES)
+def test_time_slice_matches_filter_range(mau, start, end):
+    bundle = build_bundle({"MAU": mau}, 0)
+    assert "MAU" in bundle.time_index
+    s_dt, e_dt = pd.Timestamp(start), pd.Timestamp(end)
+    got = bundle.time_slice("MAU", s_dt, e_dt)
+    want = filter_range(mau, "Month_dt", s_dt, e_dt)
+    pd.testing.assert_frame_equal(got, want)
+
+
+def test_time_slice_keeps_file_order_within_a_month(mau):
+    bundle = build_bundle({"MAU": mau}, 0)
+    feb = bundle.time_slice("MAU", pd.Timestamp("2024-02-01"), pd.Timestamp("2024-02-29"))
+    assert feb["MAU"].tolist() == [120, 130]
+
+
+def test_time_slice_falls_back_to_filter_when_unsorted():
+    df = pd.DataFrame({
+        "Month_dt": pd.to_datetime(["2024-03-31", "2024-01-31", None, "2024-02-29"]),
+        "MAU": [3, 1, 9, 2],
+    })
+    bundle = build_bundle({"MAU": df}, 0)
+    assert "MAU" not in bundle.time_index
+    s_dt, e_dt = pd.Timestamp("2024-01-15"), pd.Timestamp("2024-03-15")
+    pd.testing.assert_frame_equal(bundle.time_slice("MAU", s_dt, e_dt), filter_range(df, "Month_dt", s_dt, e_dt))
+    assert bundle.time_slice("Monthly_Enroll", s_dt, e_dt) is None
@@ -0,0 +1,302 @@
+"""Workbook parsing helpers that run outside the Streamlit script.
+
+Process-pool workers are pickled by qualified name, and Streamlit installs the
+script as a fresh ``__main__`` module on every run, so any function handed to a
+worker process has to live in an importable module like this one.
+
+An xlsx file is a zip archive with one XML member per worksheet. The helpers
+below read that layout directly, both for change detection and for the
+"stream" parser engine, which never builds openpyxl cell objects.
+"""
+import datetime as dt
+import hashlib
+import posixpath
+import re
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple, Union
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+ENGINES = ("openpyxl", "stream")
+
+
+def read_sheet_timed(
+    source: Union[str, pd.ExcelFile, "StreamWorkbook"],
+    sheet_name: str,
+    columns: Optional[FrozenSet[str]] = None,
+    engine: str = "openpyxl",
+) -> Tuple[pd.DataFrame, float]:
+    """Parse one sheet, keeping only ``columns`` (by header) when given.
+
+    ``source`` may be a path or an already-open reader matching ``engine``. The stream
+    engine falls back to openpyxl for a sheet whose XML it cannot read.
+    """
+    t0 = time.perf_counter()
+    usecols = columns.__contains__ if columns is not None else None
+    df = None
+    if engine == "stream":
+        try:
+            reader = source if isinstance(source, StreamWorkbook) else StreamWorkbook(source)
+            df = reader.read_sheet(sheet_name, usecols=usecols)
+            source = reader.path
+        except (KeyError, ValueError, ET.ParseError, zipfile.BadZipFile):
+            source = source.path if isinstance(source, StreamWorkbook) else source
+    if df is None:
+        df = pd.read_excel(source, sheet_name=sheet_name, usecols=usecols)
+    return df, time.perf_counter() - t0
+
+
+# Cells holding a shared-string index: <c r="A1" t="s"><v>12</v></c> (optionally prefixed).
+_SHARED_REF = re.compile(rb'<(?:\w+:)?c\b[^>]*\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)</(?:\w+:)?v>')
+_SHARED_CELL = re.compile(rb'<(?:\w+:)?c\b[^>]*\bt="s"')
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def workbook_stamp(file_path: str) -> str:
+    """Content stamp from the zip central directory (member CRCs), without decompressing."""
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            h = hashlib.sha256()
+            for info in zf.infolist():
+                h.update(f"{info.filename}:{info.CRC}:{info.file_size};".encode("utf-8"))
+            return h.hexdigest()[:16]
+    except (OSError, zipfile.BadZipFile):
+        return ""
+
+
+def sheet_members(zf: zipfile.ZipFile) -> Dict[str, str]:
+    """Map worksheet names to their XML member paths, in workbook order."""
+    rels_root = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets: Dict[str, str] = {}
+    for rel in rels_root:
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            targets[rel.get("Id", "")] = target.lstrip("/")
+        else:
+            targets[rel.get("Id", "")] = posixpath.normpath(posixpath.join("xl", target))
+
+    members: Dict[str, str] = {}
+    wb_root = ET.fromstring(zf.read("xl/workbook.xml"))
+    for sheet in wb_root.iterfind(".//{*}sheet"):
+        rid = next((v for k, v in sheet.attrib.items() if _local(k) == "id"), None)
+        if rid in targets:
+            members[sheet.get("name", "")] = targets[rid]
+    return members
+
+
+def read_shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    try:
+        fh = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings: List[str] = []
+    with fh:
+        for _, elem in ET.iterparse(fh, events=("end",)):
+            if _local(elem.tag) != "si":
+                continue
+            # Rich-text runs are concatenated; phonetic (rPh) runs are not part of the value.
+            parts = []
+            for node in elem.iter():
+                tag = _local(node.tag)
+                if tag == "rPh":
+                    break
+                if tag == "t" and node.text:
+                    parts.append(node.text)
+            strings.append("".join(parts))
+            elem.clear()
+    return strings
+
+
+def sheet_digests(file_path: str, salt: str = "") -> Dict[str, str]:
+    """Per-sheet content digests: the sheet XML, the shared strings it references and the styles.
+
+    A sheet whose digest is unchanged parses to the same frame, so it can be reused.
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        members = sheet_members(zf)
+        strings = read_shared_strings(zf)
+        names = set(zf.namelist())
+        common = hashlib.sha256(salt.encode("utf-8"))
+        if "xl/styles.xml" in names:
+            common.update(zf.read("xl/styles.xml"))
+        shared_all = None
+
+        out: Dict[str, str] = {}
+        for name, member in members.items():
+            if member not in names:
+                continue
+            xml = zf.read(member)
+            h = common.copy()
+            h.update(xml)
+            refs = _SHARED_REF.findall(xml)
+            if len(refs) == len(_SHARED_CELL.findall(xml)) and all(int(i) < len(strings) for i in refs):
+                for i in refs:
+                    h.update(strings[int(i)].encode("utf-8"))
+                    h.update(b"\0")
+            else:
+                # Layout the regex doesn't recognise: depend on the whole string table instead.
+                if shared_all is None:
+                    shared_all = hashlib.sha256("\0".join(strings).encode("utf-8")).digest()
+                h.update(shared_all)
+            out[name] = h.hexdigest()[:16]
+        return out
+
+
+# =========================
+# "stream" engine
+# =========================
+# Built-in number formats that render as dates/times (ECMA-376 18.8.30, incl. CJK variants).
+_BUILTIN_DATE_FMTS = set(range(14, 23)) | set(range(27, 37)) | {45, 46, 47} | set(range(50, 59))
+_FMT_LITERALS = re.compile(r'"[^"]*"|\\.|\[[^\]]*\]')
+_FMT_DATE_CHARS = re.compile(r"[dmyhsDMYHS]")
+_CELL_COL = re.compile(r"[A-Z]+")
+_ROOT_TAG = re.compile(rb"<(?:(\w+):)?worksheet\b([^>]*)>")
+
+
+def _col_index(ref: str) -> int:
+    letters = _CELL_COL.match(ref)
+    idx = 0
+    for ch in letters.group(0) if letters else "":
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx - 1
+
+
+def _root_namespace(zf: zipfile.ZipFile, member: str) -> str:
+    """``{uri}`` prefix of the worksheet element, read from the head of the member."""
+    with zf.open(member) as fh:
+        head = fh.read(4096)
+    m = _ROOT_TAG.search(head)
+    if not m:
+        return ""
+    prefix = m.group(1)
+    decl = re.search(rb'xmlns' + (b":" + prefix if prefix else b"") + rb'="([^"]*)"', m.group(2))
+    return "{" + decl.group(1).decode("utf-8") + "}" if decl else ""
+
+
+def _is_date_format(code: str) -> bool:
+    return bool(_FMT_DATE_CHARS.search(_FMT_LITERALS.sub("", code)))
+
+
+class StreamWorkbook:
+    """Reads worksheet XML with a single iterparse pass per sheet.
+
+    Rows come out exactly as pandas' openpyxl reader shapes them (integral floats as int,
+    errors as NaN, trailing blanks trimmed) and go through the same TextParser that
+    ``pd.read_excel`` uses, so header handling, NA strings and dtype inference match.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with zipfile.ZipFile(path) as zf:
+            self.members = sheet_members(zf)
+            self.strings = read_shared_strings(zf)
+            self.date_styles = self._read_date_styles(zf)
+            wb_root = ET.fromstring(zf.read("xl/workbook.xml"))
+        pr = wb_root.find("{*}workbookPr")
+        self.epoch_1904 = pr is not None and pr.get("date1904", "0").lower() in ("1", "true")
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self.members)
+
+    @staticmethod
+    def _read_date_styles(zf: zipfile.ZipFile) -> Set[int]:
+        try:
+            root = ET.fromstring(zf.read("xl/styles.xml"))
+        except KeyError:
+            return set()
+        custom = {int(f.get("numFmtId", "0")): f.get("formatCode", "") for f in root.iterfind("{*}numFmts/{*}numFmt")}
+        styles: Set[int] = set()
+        for i, xf in enumerate(root.iterfind("{*}cellXfs/{*}xf")):
+            fmt_id = int(xf.get("numFmtId", "0"))
+            if fmt_id in _BUILTIN_DATE_FMTS or (fmt_id in custom and _is_date_format(custom[fmt_id])):
+                styles.add(i)
+        return styles
+
+    def _to_datetime(self, serial: float) -> dt.datetime:
+        if self.epoch_1904:
+            base = dt.datetime(1904, 1, 1)
+        else:
+            # Excel's 1900 system counts a non-existent 1900-02-29 (serial 60).
+            base = dt.datetime(1899, 12, 30) if serial >= 61 else dt.datetime(1899, 12, 31)
+        return base + dt.timedelta(days=serial)
+
+    def _cell_value(self, cell: ET.Element, ns: str) -> Any:
+        kind = cell.get("t", "n")
+        if kind == "inlineStr":
+            return "".join(t.text or "" for t in cell.iter(ns + "t"))
+        v = cell.find(ns + "v")
+        if v is None or v.text is None:
+            return ""
+        text = v.text
+        if kind == "s":
+            return self.strings[int(text)]
+        if kind in ("str", "d"):
+            return text
+        if kind == "b":
+            return text.strip() in ("1", "true")
+        if kind == "e":
+            return float("nan")
+        num = float(text)
+        style = cell.get("s")
+        if style is not None and int(style) in self.date_styles:
+            return self._to_datetime(num)
+        as_int = int(num)
+        return as_int if as_int == num else num
+
+    def sheet_rows(self, sheet_name: str) -> List[List[Any]]:
+        """Sheet contents as ragged rows, shaped like pandas' openpyxl ``get_sheet_data``."""
+        member = self.members[sheet_name]
+        rows: List[List[Any]] = []
+        last_with_data = -1
+        next_row = 1
+        col_of: Dict[str, int] = {}  # "AB" -> 27, memoised across rows
+        with zipfile.ZipFile(self.path) as zf:
+            ns = _root_namespace(zf, member)
+            row_tag = ns + "row"
+            with zf.open(member) as fh:
+                for _, elem in ET.iterparse(fh, events=("end",)):
+                    if elem.tag != row_tag:
+                        continue
+                    r = int(elem.get("r", next_row))
+                    while next_row < r:  # rows Excel omitted because they are empty
+                        rows.append([])
+                        next_row += 1
+                    values: List[Any] = []
+                    for pos, cell in enumerate(elem):
+                        ref = cell.get("r")
+                        if ref is None:
+                            col = pos
+                        else:
+                            letters = ref.rstrip("0123456789")
+                            col = col_of.get(letters)
+                            if col is None:
+                                col = col_of[letters] = _col_index(letters)
+                        if col >= len(values):
+                            values.extend([""] * (col - len(values) + 1))
+                        values[col] = self._cell_value(cell, ns)
+                    while values and values[-1] == "":
+                        values.pop()
+                    if values:
+                        last_with_data = len(rows)
+                    rows.append(values)
+                    next_row = r + 1
+                    elem.clear()
+
+        rows = rows[: last_with_data + 1]
+        if rows:
+            width = max(len(row) for row in rows)
+            rows = [row + [""] * (width - len(row)) for row in rows]
+        return rows
+
+    def read_sheet(self, sheet_name: str, usecols=None) -> pd.DataFrame:
+        rows = self.sheet_rows(sheet_name)
+        if not rows:
+            return pd.DataFrame()
+        return TextParser(rows, header=0, skip_blank_lines=False, usecols=usecols).read()